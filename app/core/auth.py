@@ -1,9 +1,11 @@
 from typing import Dict, Any
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.core.config import settings
 from app.core.security import decode_access_token
+from app.core.tracing import get_tracer
 from app.models.user import user_service
-from app.utils.exceptions import UnauthorizedException
+from app.utils.exceptions import ForbiddenException, UnauthorizedException
 from app.utils.objectid import convert_object_id
 
 # HTTPBearer for Authorization: Bearer <token> header
@@ -15,12 +17,22 @@ security = HTTPBearer(
 )
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+async def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> Dict[str, Any]:
     """Get current authenticated user from JWT token in Authorization header"""
+    # AuthMiddleware has already resolved the user for this request
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+
     token = credentials.credentials
+    tracer = get_tracer()
     
     # Decode token
-    payload = decode_access_token(token)
+    with tracer.start_as_current_span("auth.decode_token"):
+        payload = decode_access_token(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -37,8 +49,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get user from database
-    user = await user_service.get_user_by_email(email)
+    # Get user from the shared cache, falling back to the database
+    with tracer.start_as_current_span("auth.user_lookup"):
+        user = await user_service.get_user_for_auth(email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -54,6 +67,20 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return user
 
 
+def is_admin(user: Dict[str, Any]) -> bool:
+    """Admins are the users listed in settings.ADMIN_EMAILS"""
+    return user.get("email") in settings.ADMIN_EMAILS
+
+
+async def get_current_admin(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Ensure current user is an admin"""
+    if not is_admin(current_user):
+        raise ForbiddenException("Admin access required")
+    return current_user
+
+
 async def get_current_active_user(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ) -> Dict[str, Any]:
@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+from bson import json_util
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Minimal key/value cache interface shared by all backends.
+
+    Values must be treated as immutable by callers: the in-memory backend
+    hands out the stored object itself rather than a copy.
+    """
+
+    # Whether every process (API workers, scripts, background workers) sees
+    # the same entries, so a delete in one process reaches all of them
+    shared = False
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """Set key only if it is absent. Returns True if the value was stored."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 10000, default_ttl: Optional[int] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expiry(self, ttl: Optional[int]) -> Optional[float]:
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.monotonic() + ttl if ttl else None
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key: str, value: Any, ttl: Optional[int]) -> None:
+        self._entries[key] = (value, self._expiry(ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class NullCache(CacheBackend):
+    """Stores nothing; every lookup misses"""
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        pass
+
+    def add(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        return True
+
+    def delete(self, key: str) -> None:
+        pass
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by every worker through a Redis-protocol server.
+
+    Each worker keeps a small near-cache in front of Redis. Writes and deletes
+    are broadcast on a pub/sub channel so the other workers drop their local
+    copy of the key instead of serving it until it expires.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        url: str,
+        default_ttl: Optional[int] = None,
+        prefix: str = "cache:",
+        channel: str = "cache:invalidate",
+        local_entries: int = 1000,
+        local_ttl: int = 30,
+        client=None
+    ):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.channel = channel
+        self.instance_id = uuid.uuid4().hex
+        self.local = MemoryCache(local_entries, local_ttl) if local_entries else None
+        self._listener = None
+
+        if self.local is not None:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.channel: self._on_invalidate})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_invalidate(self, message: dict) -> None:
+        data = message.get("data")
+        if isinstance(data, bytes):
+            data = data.decode()
+        sender, _, key = data.partition(" ")
+        if sender != self.instance_id:
+            self.local.delete(key)
+
+    def _broadcast(self, key: str) -> None:
+        if self.local is not None:
+            self.client.publish(self.channel, f"{self.instance_id} {key}")
+
+    def _ttl(self, ttl: Optional[int]) -> Optional[int]:
+        return self.default_ttl if ttl is None else ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        value = json_util.loads(raw)
+        if self.local is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self.client.set(self.prefix + key, json_util.dumps(value), ex=self._ttl(ttl) or None)
+        if self.local is not None:
+            self.local.set(key, value)
+        self._broadcast(key)
+
+    def add(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        stored = self.client.set(
+            self.prefix + key, json_util.dumps(value), ex=self._ttl(ttl) or None, nx=True
+        )
+        return bool(stored)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+        if self.local is not None:
+            self.local.delete(key)
+        self._broadcast(key)
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self.client.close()
+
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+
+def create_cache() -> CacheBackend:
+    """Build the cache backend selected by settings.CACHE_BACKEND"""
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(
+            settings.REDIS_URL,
+            default_ttl=settings.CACHE_DEFAULT_TTL,
+            local_entries=settings.CACHE_LOCAL_ENTRIES,
+            local_ttl=settings.CACHE_LOCAL_TTL
+        )
+    if settings.CACHE_BACKEND != "memory":
+        raise ValueError(f"Unknown cache backend: {settings.CACHE_BACKEND}")
+    return MemoryCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_DEFAULT_TTL)
+
+
+def get_cache() -> CacheBackend:
+    """Get the process-wide cache instance, creating it on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+                logger.info("Cache backend: %s", type(_cache).__name__)
+    return _cache
+
+
+_null_cache = NullCache()
+
+
+def get_shared_cache() -> CacheBackend:
+    """
+    The cache for values other processes change (users, their currency and
+    storage mode, the archive cutoff): the cache itself when all processes
+    share it, otherwise one that caches nothing. A process-local copy would
+    outlive the other process's invalidation for its whole TTL.
+    """
+    cache = get_cache()
+    return cache if cache.shared else _null_cache
+
+
+def close_cache() -> None:
+    """Close the cache backend"""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def get_generation(namespace: str) -> str:
+    """
+    Get the current generation token for a group of cache keys.
+
+    Embedding the token in keys lets a whole group be invalidated with a
+    single write (see bump_generation). A fresh random token is used when the
+    generation is missing, so an evicted generation can never resurrect
+    entries written under an older one.
+    """
+    cache = get_cache()
+    key = f"gen:{namespace}"
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, ttl=0)
+        generation = cache.get(key) or uuid.uuid4().hex
+    return generation
+
+
+def bump_generation(namespace: str) -> None:
+    """Invalidate every key built from the namespace's current generation"""
+    get_cache().set(f"gen:{namespace}", uuid.uuid4().hex, ttl=0)
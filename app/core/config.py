@@ -8,15 +8,129 @@ class Settings:
     # Database
     MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
     DATABASE_NAME = os.getenv("DATABASE_NAME", "expense_tracker")
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    
+    # Startup: connections opened before reporting ready, and the /readyz ping timeout
+    WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "10"))
+    READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", "2"))
     
     # Security
     SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 30
     
+    # Money: amounts are stored as integer minor units of their currency; this is
+    # the base currency of users who did not choose one
+    DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "USD")
+    
+    # FX rates for reports in users' base currencies: a daily rates file in the
+    # ECB layout, quoted against FX_REFERENCE_CURRENCY (scripts/update_fx_rates.py)
+    FX_RATES_FILE = os.getenv("FX_RATES_FILE", "data/fx_rates.csv")
+    FX_REFERENCE_CURRENCY = os.getenv("FX_REFERENCE_CURRENCY", "EUR")
+    
+    # Bucket storage mode (per-user-per-month expense documents)
+    BUCKET_MAX_EXPENSES = int(os.getenv("BUCKET_MAX_EXPENSES", "1000"))
+    BUCKET_WRITE_RETRIES = int(os.getenv("BUCKET_WRITE_RETRIES", "5"))
+    
+    # Largest number of expenses one batch request may address
+    BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "100"))
+    
+    # Cache
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory" or "redis"
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "300"))
+    CACHE_LOCAL_ENTRIES = int(os.getenv("CACHE_LOCAL_ENTRIES", "1000"))
+    CACHE_LOCAL_TTL = int(os.getenv("CACHE_LOCAL_TTL", "30"))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+    REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", "300"))
+    
+    # Rate limits per route class as "<requests>/<seconds>" (empty disables the class);
+    # "redis" shares the buckets between workers
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis"
+    RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "10/60")
+    RATE_LIMIT_CRUD = os.getenv("RATE_LIMIT_CRUD", "120/60")
+    RATE_LIMIT_REPORTS = os.getenv("RATE_LIMIT_REPORTS", "30/60")
+    RATE_LIMIT_EXPORT = os.getenv("RATE_LIMIT_EXPORT", "5/60")
+    RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "False").lower() == "true"
+    # Peers whose X-Forwarded-For the server uses as the client address
+    # (comma-separated, "*" for any); only list the proxies in front of it
+    FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+    
+    # Response compression: smaller responses are sent as-is
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+    COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+    
+    # Live summary streams: "redis" shares events between workers through REDIS_URL
+    EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")  # "memory" or "redis"
+    SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+    SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+    
+    # Tracing: "file" appends OTLP/JSON batches to TRACING_FILE, "otlp" posts them
+    # to an OpenTelemetry collector's /v1/traces endpoint
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "off")  # "off", "file" or "otlp"
+    TRACING_FILE = os.getenv("TRACING_FILE", "traces/spans.jsonl")
+    TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+    TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "expense-tracker-api")
+    
+    # Profiling: admins (comma-separated emails) can profile single requests;
+    # ROUTE_PROFILING samples every route continuously at a low rate
+    ADMIN_EMAILS = [email.strip() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()]
+    PROFILE_REQUEST_INTERVAL = float(os.getenv("PROFILE_REQUEST_INTERVAL", "0.005"))
+    PROFILE_TTL_HOURS = int(os.getenv("PROFILE_TTL_HOURS", "72"))
+    PROFILE_TRIGGER_REFRESH_SECONDS = float(os.getenv("PROFILE_TRIGGER_REFRESH_SECONDS", "5"))
+    ROUTE_PROFILING = os.getenv("ROUTE_PROFILING", "False").lower() == "true"
+    ROUTE_PROFILING_INTERVAL = float(os.getenv("ROUTE_PROFILING_INTERVAL", "0.05"))
+    ROUTE_PROFILING_FLUSH_SECONDS = int(os.getenv("ROUTE_PROFILING_FLUSH_SECONDS", "60"))
+    
+    # Idempotency keys
+    IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5"))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+    
+    # Export jobs
+    EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+    EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+    EXPORT_LEASE_SECONDS = int(os.getenv("EXPORT_LEASE_SECONDS", "120"))
+    
+    # Derived data: "off" maintains it inline on each write, "embedded" runs the
+    # change stream worker in the API process holding its lease, "external"
+    # expects worker.py (which needs CACHE_BACKEND=redis)
+    CHANGE_STREAM_WORKER = os.getenv("CHANGE_STREAM_WORKER", "off")
+    CHANGE_STREAM_LEASE_SECONDS = int(os.getenv("CHANGE_STREAM_LEASE_SECONDS", "30"))
+    
+    # Recurring expenses: "embedded" runs the scheduler in the API process
+    # holding its lease, "off" expects scripts/materialize_recurring.py to be
+    # run (e.g. from cron)
+    RECURRING_SCHEDULER = os.getenv("RECURRING_SCHEDULER", "embedded")
+    RECURRING_INTERVAL_SECONDS = int(os.getenv("RECURRING_INTERVAL_SECONDS", "300"))
+    RECURRING_BATCH_SIZE = int(os.getenv("RECURRING_BATCH_SIZE", "500"))
+    RECURRING_LEASE_SECONDS = int(os.getenv("RECURRING_LEASE_SECONDS", "120"))
+    RECURRING_MAX_CATCHUP = int(os.getenv("RECURRING_MAX_CATCHUP", "400"))
+    
+    # Spending forecasts: history used when fitting, and how often parameters are refitted
+    FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "365"))
+    FORECAST_REFIT_DAYS = int(os.getenv("FORECAST_REFIT_DAYS", "7"))
+    
+    # Expenses older than this are moved to the compressed archive by scripts/archive_expenses.py
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
+    
     # External APIs
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
     
+    # Server: WEB_CONCURRENCY=0 runs one worker per available CPU (one while
+    # the cache, rate limit or events backend is "memory")
+    HOST = os.getenv("HOST", "0.0.0.0")
+    PORT = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+    KEEPALIVE_SECONDS = int(os.getenv("KEEPALIVE_SECONDS", "5"))
+    GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+    
     # Application
     APP_NAME = "Expense Tracker API"
     VERSION = "1.0.0"
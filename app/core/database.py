@@ -1,5 +1,14 @@
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
 from app.core.config import settings
+from app.core.tracing import MongoCommandTracer, tracing_enabled
+
+# Marker written once no stored amount is in major units (scripts/migrate_money.py)
+MONEY_MIGRATION = "money-minor-units"
+# Collections whose documents hold one expense amount each
+AMOUNT_COLLECTIONS = ("expenses", "expenses_archive")
 
 # Simple global database connection
 client: MongoClient = None
@@ -13,18 +22,118 @@ def get_database():
     return database
 
 
-def connect_to_mongo():
-    """Connect to MongoDB"""
+def connect_to_mongo(create_indexes: bool = True):
+    """Connect to MongoDB; the API builds indexes separately, in the background"""
     global client, database
-    client = MongoClient(settings.MONGODB_URL)
+    client = MongoClient(
+        settings.MONGODB_URL,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        event_listeners=[MongoCommandTracer()] if tracing_enabled() else []
+    )
     database = client[settings.DATABASE_NAME]
+    if create_indexes:
+        ensure_indexes()
     
-    # Create indexes
+    print(f"Connected to MongoDB: {settings.DATABASE_NAME}")
+
+
+def check_money_migrated() -> None:
+    """
+    Refuse to run while amounts are still stored as major-unit doubles:
+    MongoDB would add them up together with integer minor units. Only
+    scans until the marker is written, by the migration or by the first
+    check that finds no such amount.
+    """
+    if database["migrations"].find_one({"_id": MONEY_MIGRATION}):
+        return
+    for name in AMOUNT_COLLECTIONS:
+        if database[name].find_one({"amount": {"$type": "double"}}, {"_id": 1}):
+            raise RuntimeError(
+                f"{name} holds amounts in major units; run python -m scripts.migrate_money first"
+            )
+    database["migrations"].update_one(
+        {"_id": MONEY_MIGRATION}, {"$set": {"completed_at": datetime.utcnow()}}, upsert=True
+    )
+
+
+def ensure_indexes():
+    """Create collections and indexes that do not exist yet"""
+    ensure_unique_indexes()
+    ensure_query_indexes()
+
+
+def ensure_unique_indexes():
+    """Create the unique indexes that writes rely on to reject duplicates"""
     database["users"].create_index("email", unique=True)
+    # Unique indexes of sharded collections must start with the shard key
+    database["expenses"].create_index(
+        [("user_id", 1), ("occurrence_key", 1)], unique=True,
+        partialFilterExpression={"occurrence_key": {"$exists": True}}
+    )
+    database["expense_daily_rollups"].create_index(
+        [("user_id", 1), ("day", 1), ("category", 1)], unique=True
+    )
+    database["idempotency_keys"].create_index([("user_id", 1), ("key", 1)], unique=True)
+    database["expense_anomalies"].create_index("user_id", unique=True)
+    database["forecast_models"].create_index("user_id", unique=True)
+    database["monthly_statements"].create_index([("user_id", 1), ("year", 1), ("month", 1)], unique=True)
+    database["budgets"].create_index([("user_id", 1), ("category", 1)], unique=True)
+    database["budget_totals"].create_index([("user_id", 1), ("month", 1), ("category", 1)], unique=True)
+    database["expense_monthly_summaries"].create_index([("user_id", 1), ("month", 1)], unique=True)
+
+
+def ensure_query_indexes():
+    """Create the indexes that only speed up queries"""
     database["expenses"].create_index([("user_id", 1), ("date", -1)])
     database["expenses"].create_index("category")
+    database["expenses"].create_index([("user_id", 1), ("seq", 1)])
+    database["expenses"].create_index([("user_id", 1), ("terms", 1)])
+    database["expense_buckets"].create_index([("user_id", 1), ("month", 1)])
+    database["expense_buckets"].create_index([("user_id", 1), ("expenses._id", 1)])
+    database["expense_buckets"].create_index([("user_id", 1), ("max_seq", 1)])
+    database["expense_buckets"].create_index([("user_id", 1), ("expenses.terms", 1)])
+    database["expense_tombstones"].create_index([("user_id", 1), ("seq", 1)])
+    database["expense_tombstones"].create_index("expense_id")
+    database["idempotency_keys"].create_index(
+        "created_at", expireAfterSeconds=settings.IDEMPOTENCY_TTL_HOURS * 3600
+    )
+    database["export_jobs"].create_index([("user_id", 1), ("created_at", -1)])
+    database["export_jobs"].create_index("status")
+    database["recurring_rules"].create_index([("user_id", 1), ("created_at", -1)])
+    database["request_profiles"].create_index(
+        "created_at", expireAfterSeconds=settings.PROFILE_TTL_HOURS * 3600
+    )
+    database["profile_triggers"].create_index("expires_at", expireAfterSeconds=0)
+    database["route_profiles"].create_index("route")
+    database["budget_alerts"].create_index([("user_id", 1), ("created_at", -1)])
+    database["budget_alerts"].create_index([("status", 1), ("created_at", 1)])
+    database["recurring_rules"].create_index([("active", 1), ("next_run", 1)])
     
-    print(f"Connected to MongoDB: {settings.DATABASE_NAME}")
+    # Cold storage for old expenses, compressed harder than the default snappy
+    if "expenses_archive" not in database.list_collection_names():
+        database.create_collection(
+            "expenses_archive",
+            storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+        )
+    database["expenses_archive"].create_index([("user_id", 1), ("date", -1)])
+    database["expenses_archive"].create_index([("user_id", 1), ("seq", 1)])
+    database["expenses_archive"].create_index([("user_id", 1), ("terms", 1)])
+
+
+def ping_mongo() -> float:
+    """Round trip a ping to MongoDB; returns the latency in milliseconds"""
+    started = time.perf_counter()
+    get_database().command("ping")
+    return (time.perf_counter() - started) * 1000
+
+
+def warm_connection_pool(connections: int) -> None:
+    """Open pool connections up front by running that many pings concurrently"""
+    if connections < 1:
+        return
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        list(pool.map(lambda _: ping_mongo(), range(connections)))
 
 
 def close_mongo_connection():
@@ -0,0 +1,17 @@
+"""
+Gunicorn worker class running uvicorn with the production options.
+
+Only imported by gunicorn (see gunicorn.conf.py), so the API does not
+depend on gunicorn being installed.
+"""
+from uvicorn_worker import UvicornWorker as BaseUvicornWorker
+
+from app.core.server import uvicorn_options
+
+
+class UvicornWorker(BaseUvicornWorker):
+    # Keep-alive, proxy headers and request limits come from the gunicorn config
+    CONFIG_KWARGS = {
+        option: value for option, value in uvicorn_options().items()
+        if option in ("loop", "http", "lifespan", "timeout_graceful_shutdown", "server_header")
+    }
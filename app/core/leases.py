@@ -0,0 +1,52 @@
+"""
+Leases that elect one process out of many to run a background job.
+
+A lease is a document in the leases collection naming its holder and when
+it expires. A process holds it until it stops renewing: when the holder
+dies, another process takes the lease over once it has expired. The
+holder must renew well within the lease time, and check that it still
+holds the lease before any write another holder could conflict with.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core.database import get_database
+
+
+class Lease:
+    """A named lease held by at most one process at a time"""
+
+    def __init__(self, name: str, seconds: float):
+        self.name = name
+        self.seconds = seconds
+
+    @property
+    def collection(self):
+        """Get leases collection"""
+        return get_database()["leases"]
+
+    @property
+    def holder(self) -> str:
+        # Computed on each use: forked workers must not share their parent's identity
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it; returns whether this process holds it"""
+        now = datetime.utcnow()
+        try:
+            self.collection.update_one(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.seconds)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease exists and another process holds it
+            return False
+        return True
+
+    def release(self) -> None:
+        """Give the lease up so another process can take it without waiting for it to expire"""
+        self.collection.delete_one({"_id": self.name, "holder": self.holder})
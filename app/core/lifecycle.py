@@ -0,0 +1,150 @@
+"""
+API process startup, readiness and shutdown.
+
+Startup does not block serving: the lifespan schedules it as a background
+task and returns, so /livez answers immediately. The task connects to
+MongoDB (retrying until it is reachable), checks that amounts are
+migrated to minor units, creates the unique indexes,
+starts creating the other indexes in a task of its own, starts the embedded
+background workers and warms up the connection pool and caches. /readyz
+reports ready only once warmup has finished, so orchestrators route traffic
+to a worker only when its first requests will not pay for connection setup.
+
+Workers and requests rely on the unique indexes to reject duplicates
+(idempotency claims, recurring occurrences, emails), so those are awaited.
+The query indexes are reported but do not gate readiness: on a large
+collection they can take minutes, and only make queries faster.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.cache import close_cache, get_cache
+from app.core.config import settings
+from app.core import database
+from app.core.tracing import close_tracer
+from app.models.expense_store import get_archive_cutoff
+from app.services.change_stream import check_external_worker, expense_change_worker
+from app.services.events import close_event_broker
+from app.services.exports import export_manager
+from app.services.profiling import route_profiler
+from app.services.recurring import recurring_scheduler
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECT_BACKOFF_SECONDS = 30
+
+
+class Lifecycle:
+    def __init__(self):
+        self.stage = "starting"
+        self.indexes = "pending"
+        self._startup: Optional[asyncio.Task] = None
+        self._indexes: Optional[asyncio.Task] = None
+        self._workers = []
+
+    async def _connect(self) -> None:
+        backoff = 1
+        while True:
+            try:
+                await asyncio.to_thread(database.connect_to_mongo, create_indexes=False)
+                await asyncio.to_thread(database.ping_mongo)
+                return
+            except Exception as exc:
+                logger.warning("MongoDB not reachable, retrying in %ss: %s", backoff, exc)
+                await asyncio.to_thread(database.close_mongo_connection)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_CONNECT_BACKOFF_SECONDS)
+
+    async def _build_unique_indexes(self) -> None:
+        self.indexes = "building unique"
+        try:
+            await asyncio.to_thread(database.ensure_unique_indexes)
+        except Exception:
+            self.indexes = "failed"
+            raise
+
+    async def _build_query_indexes(self) -> None:
+        self.indexes = "building"
+        try:
+            await asyncio.to_thread(database.ensure_query_indexes)
+            self.indexes = "ready"
+        except Exception:
+            logger.exception("Index creation failed")
+            self.indexes = "failed"
+
+    def _warm_up(self) -> None:
+        database.warm_connection_pool(settings.WARMUP_CONNECTIONS)
+        get_cache()
+        get_archive_cutoff()
+
+    async def _start(self) -> None:
+        self.stage = "connecting"
+        await self._connect()
+        # Never ready on a database whose sums would mix units
+        await asyncio.to_thread(database.check_money_migrated)
+
+        self.stage = "indexing"
+        await self._build_unique_indexes()
+        self._indexes = asyncio.create_task(self._build_query_indexes())
+        if settings.CHANGE_STREAM_WORKER == "embedded":
+            expense_change_worker.start()
+            self._workers.append(expense_change_worker)
+        await asyncio.to_thread(export_manager.resume_pending)
+        if settings.RECURRING_SCHEDULER == "embedded":
+            recurring_scheduler.start()
+            self._workers.append(recurring_scheduler)
+        if settings.ROUTE_PROFILING:
+            route_profiler.start()
+            self._workers.append(route_profiler)
+
+        self.stage = "warming"
+        await asyncio.to_thread(self._warm_up)
+        self.stage = "ready"
+        logger.info("Ready to serve")
+
+    def _on_started(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Startup failed", exc_info=task.exception())
+            self.stage = "failed"
+
+    async def startup(self) -> None:
+        """Begin startup in the background and return immediately"""
+        if settings.CHANGE_STREAM_WORKER == "external":
+            # Fails the server's startup rather than serving stale reports
+            check_external_worker()
+        self._startup = asyncio.create_task(self._start())
+        self._startup.add_done_callback(self._on_started)
+
+    async def shutdown(self) -> None:
+        self.stage = "stopping"
+        for task in (self._startup, self._indexes):
+            if task is not None and not task.done():
+                task.cancel()
+        export_manager.shutdown()
+        for worker in reversed(self._workers):
+            await asyncio.to_thread(worker.stop)
+        self._workers.clear()
+        database.close_mongo_connection()
+        close_event_broker()
+        close_cache()
+        close_tracer()
+
+    async def readiness(self) -> Dict[str, Any]:
+        """Readiness report; `ready` is true only when warm and MongoDB answers a ping in time"""
+        report: Dict[str, Any] = {"ready": False, "stage": self.stage, "indexes": self.indexes}
+        if self.stage != "ready":
+            return report
+        try:
+            latency = await asyncio.wait_for(
+                asyncio.to_thread(database.ping_mongo), settings.READINESS_TIMEOUT_SECONDS
+            )
+        except Exception as exc:
+            report["mongo"] = {"ok": False, "error": str(exc) or type(exc).__name__}
+            return report
+        report["mongo"] = {"ok": True, "latency_ms": round(latency, 2)}
+        report["ready"] = True
+        return report
+
+
+lifecycle = Lifecycle()
@@ -0,0 +1,77 @@
+"""
+Production server settings shared by serve.py and gunicorn.conf.py.
+
+Each worker is a separate process with its own event loop (uvloop) and
+HTTP parser (httptools), so throughput scales with the cores available
+to the container rather than to the host.
+
+Workers only agree on cached data, rate limits and live events through
+Redis. With any of those backends left in memory, the default worker count
+falls back to one, and an explicit WEB_CONCURRENCY above one is refused.
+"""
+import logging
+import os
+from typing import Any, Dict, List
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honouring affinity and a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # Containers are usually limited by quota rather than affinity
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def process_local_backends() -> List[str]:
+    """Settings selecting a backend that each worker process keeps to itself"""
+    return [
+        name for name in ("CACHE_BACKEND", "RATE_LIMIT_BACKEND", "EVENTS_BACKEND")
+        if getattr(settings, name) == "memory"
+    ]
+
+
+def worker_count() -> int:
+    """
+    WEB_CONCURRENCY when set, otherwise one worker per available CPU; one
+    worker while any backend is process-local
+    """
+    local = process_local_backends()
+    if settings.WEB_CONCURRENCY:
+        if settings.WEB_CONCURRENCY > 1 and local:
+            raise RuntimeError(
+                f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} needs shared backends: "
+                f"set {', '.join(f'{name}=redis' for name in local)}"
+            )
+        return settings.WEB_CONCURRENCY
+    if local:
+        logger.warning("Running one worker; these backends are process-local: %s", ", ".join(local))
+        return 1
+    return available_cpus()
+
+
+def uvicorn_options() -> Dict[str, Any]:
+    """Event loop, parser and shutdown options for every uvicorn worker"""
+    return {
+        "loop": "uvloop",
+        "http": "httptools",
+        "lifespan": "on",
+        "timeout_keep_alive": settings.KEEPALIVE_SECONDS,
+        "timeout_graceful_shutdown": settings.GRACEFUL_TIMEOUT_SECONDS,
+        "proxy_headers": True,
+        "forwarded_allow_ips": settings.FORWARDED_ALLOW_IPS,
+        "server_header": False,
+    }
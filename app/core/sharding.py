@@ -0,0 +1,105 @@
+"""
+Shard-targeted access to the expense collections.
+
+The expense collections are sharded on user_id (scripts/setup_sharding.py).
+mongos can only route an operation to the one shard holding a user's data
+when its filter pins user_id to a single value; anything else is broadcast
+to every shard (scatter-gather) and gets slower as shards are added. This
+holds for hashed and ranged keys alike.
+
+user_collection() wraps a sharded collection so that code serving requests
+cannot issue an untargeted operation: filters, pipelines and documents
+without a single user_id raise UntargetedQuery before reaching MongoDB.
+Maintenance jobs that scan every user on purpose (archiving, migrations,
+statements, the change stream worker) use get_database() directly.
+scripts/check_shard_targeting.py verifies the routing on a real cluster.
+"""
+from typing import Any, Dict, Iterable, List
+
+from app.core.database import get_database
+
+SHARD_KEY = "user_id"
+
+# Shard key of each sharded collection, per strategy:
+# - hashed: spreads users evenly over shards, including new users' writes
+# - ranged: keeps neighbouring user ids together and allows zone sharding,
+#   but new (higher) ObjectIds all land on the last chunk until it splits
+SHARD_KEYS = {
+    "hashed": {SHARD_KEY: "hashed"},
+    "ranged": {SHARD_KEY: 1},
+}
+SHARDED_COLLECTIONS = ["expenses", "expenses_archive", "expense_buckets", "expense_tombstones"]
+
+
+class UntargetedQuery(ValueError):
+    """An operation on a sharded collection that mongos would broadcast to every shard"""
+
+
+def targets_user(filter: Any) -> bool:
+    """Whether a filter or document pins the shard key to a single user"""
+    return isinstance(filter, dict) and isinstance(filter.get(SHARD_KEY), str)
+
+
+def _filtered(name: str):
+    def method(self, filter, *args, **kwargs):
+        self._check(name, filter)
+        return getattr(self.collection, name)(filter, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+class UserCollection:
+    """
+    A sharded collection that only accepts operations targeting one user.
+    Attributes other than the checked operations pass through.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def _check(self, operation: str, filter: Any) -> None:
+        if not targets_user(filter):
+            raise UntargetedQuery(
+                f"{operation} on {self.collection.name} must filter on a single {SHARD_KEY}"
+            )
+
+    find = _filtered("find")
+    find_one = _filtered("find_one")
+    find_one_and_update = _filtered("find_one_and_update")
+    find_one_and_replace = _filtered("find_one_and_replace")
+    find_one_and_delete = _filtered("find_one_and_delete")
+    update_one = _filtered("update_one")
+    update_many = _filtered("update_many")
+    replace_one = _filtered("replace_one")
+    delete_one = _filtered("delete_one")
+    delete_many = _filtered("delete_many")
+    count_documents = _filtered("count_documents")
+    insert_one = _filtered("insert_one")
+
+    def distinct(self, key: str, filter: Dict[str, Any], *args, **kwargs):
+        self._check("distinct", filter)
+        return self.collection.distinct(key, filter, *args, **kwargs)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], *args, **kwargs):
+        self._check("aggregate", pipeline[0].get("$match") if pipeline else None)
+        return self.collection.aggregate(pipeline, *args, **kwargs)
+
+    def insert_many(self, documents: Iterable[Dict[str, Any]], *args, **kwargs):
+        documents = list(documents)
+        for document in documents:
+            self._check("insert_many", document)
+        return self.collection.insert_many(documents, *args, **kwargs)
+
+    def bulk_write(self, requests: List[Any], *args, **kwargs):
+        for request in requests:
+            # InsertOne holds a document, the other operations a filter
+            self._check("bulk_write", getattr(request, "_filter", getattr(request, "_doc", None)))
+        return self.collection.bulk_write(requests, *args, **kwargs)
+
+
+def user_collection(name: str) -> UserCollection:
+    """A sharded expense collection, guarded against untargeted operations"""
+    return UserCollection(get_database()[name])
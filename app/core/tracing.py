@@ -0,0 +1,435 @@
+"""
+Request tracing with OpenTelemetry-compatible spans.
+
+A trace is a tree of spans: the HTTP request (app/middleware/tracing.py),
+and inside it token decoding, the user lookup, every MongoDB command
+(through PyMongo command monitoring), report building and response
+serialization. The current span is held in a context variable, so it
+follows the request into the threads that sync routes and
+asyncio.to_thread run in.
+
+Trace context is propagated with the W3C `traceparent` header: a request
+that carries one continues the caller's trace and keeps its sampling
+decision; otherwise TRACING_SAMPLE_RATIO of requests start a sampled trace.
+Spans that are not sampled cost a context variable lookup and nothing else.
+
+Finished spans are batched by a background thread and exported as OTLP/JSON
+(ExportTraceServiceRequest), to:
+- file: one JSON document per line appended to TRACING_FILE
+- otlp: POSTed to TRACING_OTLP_ENDPOINT (an OpenTelemetry collector's
+  /v1/traces), or any stand-in accepting the same payload
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+
+class SpanContext:
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: int, span_id: int, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id:032x}-{self.span_id:016x}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parse a W3C traceparent header; None when absent or malformed"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    if len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        trace_id, span_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if not trace_id or not span_id:
+        return None
+    return SpanContext(trace_id, span_id, bool(flags & 1))
+
+
+class Span:
+    """A timed operation; spans that are not sampled record nothing"""
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        context: SpanContext,
+        parent_id: Optional[int] = None,
+        kind: int = INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.recording = context.sampled
+        self.attributes: Dict[str, Any] = dict(attributes) if attributes and self.recording else {}
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.recording:
+            self.attributes[key] = value
+
+    def set_status(self, code: int, message: str = "") -> None:
+        if self.recording:
+            self.status = code
+            self.status_message = message
+
+    def record_exception(self, exc: BaseException) -> None:
+        if self.recording:
+            self.events.append((time.time_ns(), "exception", {
+                "exception.type": type(exc).__name__,
+                "exception.message": str(exc)
+            }))
+            self.set_status(STATUS_ERROR, str(exc) or type(exc).__name__)
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.recording:
+            self.tracer.processor.on_end(self)
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """The active span of this request, if any"""
+    return _current.get()
+
+
+def _random_id(bits: int) -> int:
+    value = 0
+    while not value:
+        value = random.getrandbits(bits)
+    return value
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items()]
+
+
+def otlp_payload(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """An OTLP/JSON ExportTraceServiceRequest for finished spans"""
+    encoded = []
+    for span in spans:
+        item = {
+            "traceId": f"{span.context.trace_id:032x}",
+            "spanId": f"{span.context.span_id:016x}",
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _attributes(span.attributes),
+            "status": {"code": span.status, "message": span.status_message}
+        }
+        if span.parent_id is not None:
+            item["parentSpanId"] = f"{span.parent_id:016x}"
+        if span.events:
+            item["events"] = [
+                {"timeUnixNano": str(at), "name": name, "attributes": _attributes(attributes)}
+                for at, name, attributes in span.events
+            ]
+        encoded.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _attributes({
+                "service.name": service_name,
+                "service.version": settings.VERSION,
+                "process.pid": os.getpid()
+            })},
+            "scopeSpans": [{"scope": {"name": "expense-tracker"}, "spans": encoded}]
+        }]
+    }
+
+
+class FileSpanExporter:
+    """Appends each batch as one OTLP/JSON line to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, payload: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+
+class OtlpHttpSpanExporter:
+    """POSTs each batch as OTLP/JSON to a collector's /v1/traces endpoint"""
+
+    def __init__(self, endpoint: str, timeout: float = 5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, payload: Dict[str, Any]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(payload, separators=(",", ":")).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class BatchSpanProcessor:
+    """
+    Hands finished spans to an exporter from a background thread, in batches
+    of up to `batch_size` or every `interval` seconds. When the queue is full
+    spans are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, exporter, service_name: str, batch_size: int = 512, interval: float = 2, max_queue: int = 8192):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                self._export(batch)
+
+    def _export(self, batch: List[Span]) -> None:
+        try:
+            self.exporter.export(otlp_payload(batch, self.service_name))
+        except Exception as exc:
+            logger.warning("Could not export %s spans: %s", len(batch), exc)
+
+    def shutdown(self) -> None:
+        """Export what is queued and stop the thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+
+class Tracer:
+    def __init__(self, processor: Optional[BatchSpanProcessor], sample_ratio: float = 1.0):
+        self.processor = processor
+        self.sample_ratio = sample_ratio
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+        root: bool = False
+    ) -> Optional[Span]:
+        """
+        Start a span without making it current. Its parent is `parent`, else
+        the current span. Returns None when tracing is off, or when there is
+        no parent and `root` is not set (work outside a traced request).
+        """
+        if self.processor is None:
+            return None
+        if parent is None:
+            span = _current.get()
+            parent = span.context if span is not None else None
+        if parent is not None:
+            context = SpanContext(parent.trace_id, _random_id(64), parent.sampled)
+            return Span(self, name, context, parent.span_id, kind, attributes)
+        if not root:
+            return None
+        sampled = random.random() < self.sample_ratio
+        return Span(self, name, SpanContext(_random_id(128), _random_id(64), sampled), None, kind, attributes)
+
+    @contextmanager
+    def start_as_current_span(
+        self,
+        name: str,
+        kind: int = INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+        root: bool = False
+    ) -> Iterator[Optional[Span]]:
+        """Run a block inside a new current span, ending it (and recording any exception) on exit"""
+        span = self.start_span(name, kind, attributes, parent, root)
+        if span is None:
+            yield None
+            return
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def shutdown(self) -> None:
+        if self.processor is not None:
+            self.processor.shutdown()
+
+
+def traced(name: str):
+    """Decorator: run the (sync) function inside a span named `name`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_tracer().start_as_current_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """A client span for every MongoDB command issued inside a traced request"""
+
+    def __init__(self):
+        self._spans: Dict[Tuple[Any, int], Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        span = get_tracer().start_span(f"mongodb.{event.command_name}", CLIENT)
+        if span is None or not span.recording:
+            return
+        collection = event.command.get(event.command_name)
+        span.set_attribute("db.system", "mongodb")
+        span.set_attribute("db.name", event.database_name)
+        span.set_attribute("db.operation", event.command_name)
+        if isinstance(collection, str):
+            span.set_attribute("db.mongodb.collection", collection)
+        host, port = event.connection_id
+        span.set_attribute("server.address", host)
+        if port is not None:
+            span.set_attribute("server.port", port)
+        with self._lock:
+            self._spans[(event.connection_id, event.request_id)] = span
+
+    def _finish(self, event) -> Optional[Span]:
+        with self._lock:
+            return self._spans.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event) -> None:
+        span = self._finish(event)
+        if span is not None:
+            span.end()
+
+    def failed(self, event) -> None:
+        span = self._finish(event)
+        if span is not None:
+            failure = event.failure or {}
+            span.set_status(STATUS_ERROR, str(failure.get("errmsg", "command failed")))
+            span.end()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def tracing_enabled() -> bool:
+    return settings.TRACING_EXPORTER != "off"
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer configured by settings.TRACING_EXPORTER"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                if settings.TRACING_EXPORTER == "off":
+                    processor = None
+                elif settings.TRACING_EXPORTER == "file":
+                    processor = BatchSpanProcessor(
+                        FileSpanExporter(settings.TRACING_FILE), settings.TRACING_SERVICE_NAME
+                    )
+                elif settings.TRACING_EXPORTER == "otlp":
+                    processor = BatchSpanProcessor(
+                        OtlpHttpSpanExporter(settings.TRACING_OTLP_ENDPOINT), settings.TRACING_SERVICE_NAME
+                    )
+                else:
+                    raise ValueError(f"Unknown tracing exporter: {settings.TRACING_EXPORTER}")
+                _tracer = Tracer(processor, settings.TRACING_SAMPLE_RATIO)
+    return _tracer
+
+
+def close_tracer() -> None:
+    """Export finished spans and stop the exporter thread"""
+    global _tracer
+    if _tracer is not None:
+        _tracer.shutdown()
+        _tracer = None
@@ -1,3 +1,10 @@
 from .auth import AuthMiddleware
+from .compression import CompressionMiddleware, no_compression
+from .profiling import ProfilingMiddleware
+from .rate_limit import RateLimitMiddleware
+from .tracing import TracingMiddleware
 
-__all__ = ["AuthMiddleware"]
\ No newline at end of file
+__all__ = [
+    "AuthMiddleware", "CompressionMiddleware", "ProfilingMiddleware", "RateLimitMiddleware", "TracingMiddleware",
+    "no_compression"
+]
\ No newline at end of file
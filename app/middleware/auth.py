@@ -1,88 +1,128 @@
-from typing import Optional, Callable
-from fastapi import Request, HTTPException, status
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple
+from fastapi import status
 from fastapi.security.utils import get_authorization_scheme_param
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
 
 from app.core.security import decode_access_token
+from app.core.tracing import get_tracer
 from app.models.user import user_service
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
+class AuthError(Exception):
+    def __init__(self, status_code: int, detail: str, headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers or {}
+
+
+class RouteTable:
+    """Public route matcher: exact paths in a set, prefixes checked only on a path boundary"""
+
+    def __init__(self, exact: Iterable[str], prefixes: Iterable[str] = ()):
+        self.exact = frozenset(exact)
+        self.prefixes: Tuple[str, ...] = tuple(prefix.rstrip("/") for prefix in prefixes)
+
+    def __contains__(self, path: str) -> bool:
+        if path in self.exact:
+            return True
+        for prefix in self.prefixes:
+            if path.startswith(prefix) and (len(path) == len(prefix) or path[len(prefix)] == "/"):
+                return True
+        return False
+
+
+class AuthMiddleware:
     """
-    Authentication middleware that validates Bearer tokens for protected routes.
-    
+    Pure ASGI authentication middleware that validates Bearer tokens for protected routes.
+
     This middleware:
     - Skips authentication for public routes (auth endpoints, root, health, docs)
-    - Validates Bearer tokens for all other routes
-    - Attaches user information to the request state
+    - Validates Bearer tokens for all other routes, reusing the claims
+      RateLimitMiddleware decoded (scope["state"]["token_claims"]) if any
+    - Resolves the user once and stores it in scope["state"]["user"], where
+      `get_current_user` (request.state.user) picks it up without a second lookup
     """
-    
+
     # Routes that don't require authentication
-    PUBLIC_ROUTES = [
-        "/",
-        "/health",
-        "/docs",
-        "/redoc",
-        "/openapi.json",
-        "/api/v1/auth/login",
-        "/api/v1/auth/token",
-        "/api/v1/auth/register",
-    ]
-    
-    async def dispatch(
-        self, request: Request, call_next: Callable
-    ) -> Response:
-        # Skip authentication for public routes
-        if any(request.url.path.startswith(route) for route in self.PUBLIC_ROUTES):
-            return await call_next(request)
-        
-        # Extract token from Authorization header
-        authorization = request.headers.get("Authorization")
+    PUBLIC_ROUTES = RouteTable(
+        exact=[
+            "/",
+            "/health",
+            "/livez",
+            "/readyz",
+            "/openapi.json",
+            "/api/v1/auth/login",
+            "/api/v1/auth/token",
+            "/api/v1/auth/register",
+        ],
+        prefixes=["/docs", "/redoc"]
+    )
+
+    def __init__(self, app, public_routes: Optional[RouteTable] = None):
+        self.app = app
+        self.public_routes = public_routes if public_routes is not None else self.PUBLIC_ROUTES
+
+    async def authenticate(self, scope) -> Dict[str, Any]:
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+                break
         scheme, token = get_authorization_scheme_param(authorization)
-        
         if not authorization or scheme.lower() != "bearer":
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated",
-                headers={"WWW-Authenticate": "Bearer"},
+            raise AuthError(
+                status.HTTP_401_UNAUTHORIZED, "Not authenticated", {"WWW-Authenticate": "Bearer"}
             )
-        
-        # Validate token
-        payload = decode_access_token(token)
-        if payload is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # Get user from token
-        email = payload.get("sub")
+
+        tracer = get_tracer()
+
+        # Validate token, unless the rate limiter already did
+        state = scope.get("state", {})
+        if "token_claims" in state:
+            payload = state["token_claims"]
+        else:
+            with tracer.start_as_current_span("auth.decode_token"):
+                payload = decode_access_token(token)
+        email = payload.get("sub") if payload else None
         if not email:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
+            raise AuthError(
+                status.HTTP_401_UNAUTHORIZED, "Could not validate credentials", {"WWW-Authenticate": "Bearer"}
             )
-        
-        # Fetch user from database
-        user = await user_service.get_user_by_email(email)
+
+        # Get user from the shared cache, falling back to the database
+        with tracer.start_as_current_span("auth.user_lookup"):
+            user = await user_service.get_user_for_auth(email)
         if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
+            raise AuthError(status.HTTP_404_NOT_FOUND, "User not found")
         if not user.get("is_active", True):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Inactive user"
-            )
-        
-        # Attach user to request state
-        request.state.user = user
-        
-        # Process request
-        response = await call_next(request)
-        return response
\ No newline at end of file
+            raise AuthError(status.HTTP_400_BAD_REQUEST, "Inactive user")
+        return user
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.public_routes:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            user = await self.authenticate(scope)
+        except AuthError as exc:
+            await self.reject(send, exc)
+            return
+
+        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
+
+    async def reject(self, send, exc: AuthError) -> None:
+        """Send an error response in the same shape as the HTTP exception handler"""
+        body = json.dumps({
+            "success": False,
+            "message": exc.detail,
+            "status_code": exc.status_code
+        }).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        headers.extend((name.lower().encode(), value.encode()) for name, value in exc.headers.items())
+        await send({"type": "http.response.start", "status": exc.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
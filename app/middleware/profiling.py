@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import Optional
+from urllib.parse import parse_qs
+
+from pymongo.errors import PyMongoError
+
+from app.core.auth import is_admin
+from app.core.config import settings
+from app.middleware.tracing import route_template
+from app.services.profiling import RequestProfile, profile_service, route_profiler
+
+logger = logging.getLogger(__name__)
+
+TRUE_VALUES = {"1", "true", "yes"}
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware profiling requests on demand.
+
+    A request is profiled when its user is an admin and it carries
+    `X-Profile: 1` or `?profile=1`, or when an admin has armed a trigger for
+    its user and path. The response gets an `X-Profile-Id` header naming the
+    stored profile (GET /api/v1/admin/profiles/{id}). With ROUTE_PROFILING
+    on, it also tells the route sampler which route each endpoint serves.
+    Runs inside AuthMiddleware, which resolves the user.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def requested(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return value.decode("latin-1").lower() in TRUE_VALUES
+        if b"profile=" in scope["query_string"]:
+            values = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [])
+            return bool(values) and values[-1].lower() in TRUE_VALUES
+        return False
+
+    async def requested_by(self, scope, user) -> Optional[str]:
+        """Email of the admin who asked for this request to be profiled, if any"""
+        if is_admin(user) and self.requested(scope):
+            return user["email"]
+        # Most requests only look up the loaded triggers; reloading them and
+        # claiming a matching one query MongoDB, in a thread off the event loop
+        if profile_service.triggers_due():
+            await asyncio.to_thread(profile_service.load_triggers)
+        trigger = profile_service.armed_trigger(user["email"], scope["path"])
+        if trigger is None:
+            return None
+        try:
+            return await asyncio.to_thread(profile_service.claim_trigger, user["email"], trigger)
+        except (PyMongoError, RuntimeError) as exc:
+            logger.warning("Could not check profiling triggers: %s", exc)
+            return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        user = scope.get("state", {}).get("user")
+        requested_by = await self.requested_by(scope, user) if user is not None else None
+        if requested_by is None:
+            await self.app(scope, receive, send)
+            if settings.ROUTE_PROFILING:
+                route = route_template(scope)
+                if route is not None:
+                    route_profiler.register(scope, route)
+            return
+
+        # A private copy of the user tells this request's endpoint frame apart
+        # from concurrent requests of the same user
+        user = dict(user)
+        scope["state"]["user"] = user
+        profile = RequestProfile(scope, user, settings.PROFILE_REQUEST_INTERVAL)
+        status_code = None
+
+        async def send_profiled(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            await asyncio.to_thread(profile.stop)
+            try:
+                await asyncio.to_thread(
+                    profile_service.save_profile, profile, requested_by, status_code, route_template(scope)
+                )
+            except PyMongoError as exc:
+                logger.warning("Could not store profile %s: %s", profile.id, exc)
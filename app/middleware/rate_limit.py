@@ -0,0 +1,231 @@
+"""
+Token bucket rate limiting.
+
+Each client gets one bucket per route class (auth, crud, reports, export).
+The auth class covers the routes that take credentials: register, login
+and token. Other auth routes, such as /auth/me, are crud. The export class
+covers the CSV export and starting export jobs; polling and downloading
+a job are crud.
+A bucket holds up to `capacity` tokens, refills continuously at
+`capacity / period` tokens per second, and each request takes one token;
+requests finding the bucket empty get 429 with a Retry-After header.
+
+Clients are identified by the `sub` claim of a valid bearer token, or by IP
+address when there is none. The auth class is always keyed by IP, since its
+routes are used before a token exists. The middleware runs before
+AuthMiddleware, so requests failing authentication count too and cannot
+make the user lookup run unthrottled. The decoded claims are left in
+scope["state"]["token_claims"] for AuthMiddleware, so the token is decoded
+once per request.
+
+Buckets live in process memory, or in Redis when several workers must
+share limits; the Redis check-and-take runs as one Lua script, so
+concurrent workers cannot both spend the last token.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi.security.utils import get_authorization_scheme_param
+
+from app.core.config import settings
+from app.core.security import decode_access_token
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v1"
+
+# (method, path) of single routes with a class of their own
+ROUTES = {
+    # Only starting an export job; polling and downloading it are crud
+    ("POST", f"{API_PREFIX}/reports/exports"): "export",
+}
+# (path prefix, route class), first match wins; other API paths are "crud"
+ROUTE_CLASSES = (
+    (f"{API_PREFIX}/auth/register", "auth"),
+    (f"{API_PREFIX}/auth/login", "auth"),
+    (f"{API_PREFIX}/auth/token", "auth"),
+    (f"{API_PREFIX}/reports/export/", "export"),
+    (f"{API_PREFIX}/reports/exports", "crud"),
+    (f"{API_PREFIX}/reports/", "reports"),
+    (f"{API_PREFIX}/expenses/anomalies", "reports"),
+)
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parse "<requests>/<seconds>" into bucket capacity and refill rate per second"""
+    requests, _, seconds = rate.partition("/")
+    capacity = int(requests)
+    return capacity, capacity / float(seconds or 1)
+
+
+def route_class(path: str, method: str = "GET") -> Optional[str]:
+    """The rate limit class of a request, or None when it is not limited"""
+    if not path.startswith(API_PREFIX):
+        return None
+    name = ROUTES.get((method, path.rstrip("/")))
+    if name is not None:
+        return name
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "crud"
+
+
+class MemoryRateLimitStore:
+    """Buckets in process memory; limits apply per worker process"""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take one token; returns 0 if allowed, otherwise seconds until a token is available"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # Evicting a bucket only resets that client to a full bucket
+                bucket = self._buckets[key] = [float(capacity), now]
+                while len(self._buckets) > self.max_entries:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate
+
+
+# KEYS[1] bucket; ARGV capacity, rate per second. Uses the server clock so
+# workers with skewed clocks agree. Returns milliseconds to wait (0 = allowed).
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + (now - tonumber(bucket[2])) * rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return wait
+"""
+
+
+class RedisRateLimitStore:
+    """Buckets in a Redis-protocol server, shared by every worker"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:", client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take one token; returns 0 if allowed, otherwise seconds until a token is available"""
+        return int(self._take(keys=[self.prefix + key], args=[capacity, rate])) / 1000
+
+
+def create_store():
+    """Build the bucket store selected by settings.RATE_LIMIT_BACKEND"""
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitStore(settings.REDIS_URL)
+    if settings.RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"Unknown rate limit backend: {settings.RATE_LIMIT_BACKEND}")
+    return MemoryRateLimitStore()
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware rejecting requests over their route class's rate"""
+
+    def __init__(self, app, store=None, limits: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.store = store if store is not None else create_store()
+        limits = limits if limits is not None else {
+            "auth": settings.RATE_LIMIT_AUTH,
+            "crud": settings.RATE_LIMIT_CRUD,
+            "reports": settings.RATE_LIMIT_REPORTS,
+            "export": settings.RATE_LIMIT_EXPORT,
+        }
+        self.limits = {name: parse_rate(rate) for name, rate in limits.items() if rate}
+
+    def client_ip(self, scope) -> str:
+        if settings.RATE_LIMIT_TRUST_FORWARDED:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def client_key(self, scope, name: str) -> str:
+        if name != "auth":
+            for header, value in scope["headers"]:
+                if header == b"authorization":
+                    scheme, token = get_authorization_scheme_param(value.decode("latin-1"))
+                    payload = None
+                    if scheme.lower() == "bearer":
+                        payload = decode_access_token(token)
+                        scope.setdefault("state", {})["token_claims"] = payload
+                    if payload and payload.get("sub"):
+                        return f"user:{payload['sub']}"
+                    break
+        return f"ip:{self.client_ip(scope)}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        name = route_class(scope["path"], scope["method"])
+        limit = self.limits.get(name)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            wait = self.store.take(f"{name}:{self.client_key(scope, name)}", *limit)
+        except Exception as exc:
+            # Fail open: a store outage must not take the API down with it
+            logger.warning("Rate limit store unavailable: %s", exc)
+            wait = 0
+
+        if not wait:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({
+            "success": False,
+            "message": "Too many requests",
+            "status_code": 429
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,77 @@
+from typing import Optional
+
+from app.core.tracing import SERVER, STATUS_ERROR, get_tracer, parse_traceparent
+
+
+def route_template(scope) -> Optional[str]:
+    """
+    Full path template of the matched route, e.g. /api/v1/expenses/{expense_id}.
+    The route may only know its path relative to the router it was included
+    in, so the prefix is taken from the request path.
+    """
+    path_format = getattr(scope.get("route"), "path_format", None)
+    if not path_format:
+        return None
+    rendered = path_format
+    for name, value in scope.get("path_params", {}).items():
+        rendered = rendered.replace("{" + name + "}", str(value))
+    path = scope["path"]
+    if path.endswith(rendered):
+        return path[:len(path) - len(rendered)] + path_format
+    return path_format
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening a server span for each HTTP request.
+
+    The span continues the caller's trace when the request has a W3C
+    `traceparent` header, is named after the matched route template once
+    routing has run, and is returned to the client in a `traceresponse`
+    header so a slow response can be looked up in the trace store.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        tracer = get_tracer()
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with tracer.start_as_current_span(
+            scope["method"],
+            kind=SERVER,
+            attributes={
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+                "url.scheme": scope.get("scheme", "http"),
+            },
+            parent=parse_traceparent(traceparent),
+            root=True
+        ) as span:
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    span.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        span.set_status(STATUS_ERROR)
+                    message["headers"] = [
+                        *message.get("headers", []), (b"traceresponse", span.context.traceparent.encode())
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                template = route_template(scope)
+                if template is not None:
+                    span.name = f"{scope['method']} {template}"
+                    span.set_attribute("http.route", template)
@@ -0,0 +1,218 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pymongo import ReturnDocument, UpdateOne
+from app.core.cache import get_cache
+from app.core.config import settings
+from app.core.database import get_database
+from app.models.expense_store import month_start
+from app.services.fx import get_base_currency
+from app.utils.money import from_minor, to_minor
+from app.utils.objectid import convert_object_id
+from app.utils.exceptions import BadRequestException
+
+
+class BudgetService:
+    """
+    Monthly per-category budgets.
+
+    Spending is tracked in `budget_totals`, one document per (user, category,
+    month) adjusted with $inc on every expense write, so checking a budget
+    costs one small atomic update rather than an aggregation. When a write
+    pushes the current month's total across one of the budget's thresholds,
+    an alert is queued in `budget_alerts`, once per threshold and month.
+    """
+
+    @property
+    def collection(self):
+        """Get budgets collection"""
+        return get_database()["budgets"]
+
+    @property
+    def totals(self):
+        """Get per-month spending totals collection"""
+        return get_database()["budget_totals"]
+
+    @property
+    def alerts(self):
+        """Get budget alerts queue collection"""
+        return get_database()["budget_alerts"]
+
+    def _user_budgets(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """A user's budgets by category, cached so the write path rarely reads them"""
+        cache = get_cache()
+        key = f"budgets:{user_id}"
+        budgets = cache.get(key)
+        if budgets is None:
+            budgets = {
+                budget["category"]: {"amount": budget["amount"], "thresholds": budget["thresholds"]}
+                for budget in self.collection.find({"user_id": user_id})
+            }
+            cache.set(key, budgets, ttl=settings.USER_CACHE_TTL)
+        return budgets
+
+    def record(
+        self,
+        user_id: str,
+        added: Iterable[Dict[str, Any]] = (),
+        removed: Iterable[Dict[str, Any]] = ()
+    ) -> None:
+        """Apply written (added) and deleted or overwritten (removed) expenses to the totals"""
+        deltas: Dict[Tuple[str, datetime], Dict[str, int]] = defaultdict(lambda: {"total": 0, "count": 0})
+        for expense in added:
+            delta = deltas[(expense["category"], month_start(expense["date"]))]
+            delta["total"] += expense["amount"]
+            delta["count"] += 1
+        for expense in removed:
+            delta = deltas[(expense["category"], month_start(expense["date"]))]
+            delta["total"] -= expense["amount"]
+            delta["count"] -= 1
+
+        deltas = {key: delta for key, delta in deltas.items() if delta["total"] or delta["count"]}
+        if not deltas:
+            return
+
+        budgets = self._user_budgets(user_id)
+        current_month = month_start(datetime.utcnow())
+        operations = []
+        for (category, month), delta in deltas.items():
+            key = {"user_id": user_id, "category": category, "month": month}
+            budget = budgets.get(category)
+            if budget is None or month != current_month or delta["total"] <= 0:
+                operations.append(UpdateOne(key, {"$inc": delta}, upsert=True))
+                continue
+
+            totals = self.totals.find_one_and_update(
+                key, {"$inc": delta}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+            self._check_thresholds(user_id, category, month, budget, totals, delta["total"])
+
+        if operations:
+            self.totals.bulk_write(operations, ordered=False)
+
+    def _check_thresholds(
+        self,
+        user_id: str,
+        category: str,
+        month: datetime,
+        budget: Dict[str, Any],
+        totals: Dict[str, Any],
+        increase: int
+    ) -> None:
+        """Queue an alert for each threshold the increase crossed"""
+        after = totals["total"]
+        before = after - increase
+        for threshold in budget["thresholds"]:
+            limit = budget["amount"] * threshold
+            if not before < limit <= after:
+                continue
+            # Only the first write crossing a threshold in a month alerts
+            claimed = self.totals.update_one(
+                {"_id": totals["_id"], "alerted": {"$ne": threshold}},
+                {"$addToSet": {"alerted": threshold}}
+            )
+            if claimed.modified_count:
+                self.alerts.insert_one({
+                    "user_id": user_id,
+                    "category": category,
+                    "month": month,
+                    "threshold": threshold,
+                    "spent": after,
+                    "limit": budget["amount"],
+                    "status": "pending",
+                    "created_at": datetime.utcnow()
+                })
+
+    async def set_budget(self, user_id: str, category: str, amount: float, thresholds: List[float]) -> Dict[str, Any]:
+        """Create or replace the monthly budget of a category"""
+        if not thresholds or any(threshold <= 0 for threshold in thresholds):
+            raise BadRequestException("Thresholds must be positive fractions of the budget")
+        # Spending totals are kept in the user's base currency, so budgets are too
+        currency = get_base_currency(user_id)
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {"user_id": user_id, "category": category},
+            {
+                "$set": {
+                    "amount": to_minor(amount, currency),
+                    "currency": currency,
+                    "thresholds": sorted(set(thresholds)),
+                    "updated_at": now
+                },
+                "$setOnInsert": {"created_at": now}
+            },
+            upsert=True
+        )
+        get_cache().delete(f"budgets:{user_id}")
+        return (await self.get_budgets(user_id, category))[0]
+
+    async def get_budgets(self, user_id: str, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get a user's budgets with this month's spending against them"""
+        query = {"user_id": user_id}
+        if category:
+            query["category"] = category
+        budgets = list(self.collection.find(query).sort("category", 1))
+        month = month_start(datetime.utcnow())
+        spent = {
+            totals["category"]: totals["total"]
+            for totals in self.totals.find({
+                "user_id": user_id,
+                "month": month,
+                "category": {"$in": [budget["category"] for budget in budgets]}
+            })
+        }
+
+        results = []
+        for budget in budgets:
+            amount = budget["amount"]
+            used = spent.get(budget["category"], 0)
+            results.append({
+                "category": budget["category"],
+                "amount": from_minor(amount, budget.get("currency")),
+                "thresholds": budget["thresholds"],
+                "month": month.strftime("%Y-%m"),
+                "spent": from_minor(used, budget.get("currency")),
+                "remaining": from_minor(amount - used, budget.get("currency")),
+                "percent_used": used / amount * 100 if amount else 0,
+                "created_at": budget["created_at"],
+                "updated_at": budget.get("updated_at")
+            })
+        return results
+
+    async def delete_budget(self, user_id: str, category: str) -> bool:
+        """Delete the budget of a category; spending totals are kept"""
+        result = self.collection.delete_one({"user_id": user_id, "category": category})
+        get_cache().delete(f"budgets:{user_id}")
+        return result.deleted_count > 0
+
+    async def get_alerts(self, user_id: str, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get a user's budget alerts, newest first"""
+        alerts = self.alerts.find({"user_id": user_id}).sort("created_at", -1).skip(skip).limit(limit)
+        currency = get_base_currency(user_id)
+        return [
+            {
+                **convert_object_id(alert),
+                "month": alert["month"].strftime("%Y-%m"),
+                "spent": from_minor(alert["spent"], currency),
+                "limit": from_minor(alert["limit"], currency)
+            }
+            for alert in alerts
+        ]
+
+    def claim_pending_alerts(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Take pending alerts off the queue for delivery (e.g. by a notification sender)"""
+        claimed = []
+        for _ in range(limit):
+            alert = self.alerts.find_one_and_update(
+                {"status": "pending"},
+                {"$set": {"status": "sent", "sent_at": datetime.utcnow()}},
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if alert is None:
+                break
+            claimed.append(alert)
+        return claimed
+
+
+budget_service = BudgetService()
@@ -1,40 +1,231 @@
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+import re
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.config import settings
 from app.core.database import get_database
+from app.core.sharding import user_collection
+from app.models.budget import budget_service
+from app.models.expense_store import ARCHIVE_COLLECTION, BUCKET, aggregate_expenses, bucket_store, get_storage_mode
+from app.utils.money import from_minor, to_minor
 from app.utils.objectid import convert_object_id, prepare_mongo_doc
+from app.utils.search import MAX_QUERY_TERMS, decode_cursor, encode_cursor, tokenize
 from app.schemas.expense import ExpenseCreate, ExpenseUpdate, ExpenseType
+from app.services.archive import get_archived_summary, restore_expense
+from app.services.events import publish_summary_delta
+from app.services.fx import get_base_currency, get_user_currency, note_currencies, set_base_amounts, to_base
+from app.services.reports import aggregate_totals, invalidate_user_reports
+
+
+# How long a batch delete may hold expenses it is about to delete
+DELETE_CLAIM_SECONDS = 60
+# Fields an expense's amount in the base currency depends on
+BASE_AMOUNT_FIELDS = ("amount", "currency", "date")
+# Fields of removed expenses needed to take them out of budget totals and summaries
+REMOVED_PROJECTION = {"amount": 1, "currency": 1, "base_amount": 1, "category": 1, "date": 1}
+# Reserved change sequence values not written within this long are
+# assumed abandoned (by a crashed writer) and stop holding back sync
+SEQ_IN_FLIGHT_SECONDS = 30
+# Summary reads retried to find a moment with no write in flight
+SNAPSHOT_ATTEMPTS = 3
+
+
+def not_claimed_for_delete() -> Dict[str, Any]:
+    """Filter excluding expenses a batch delete is in the middle of deleting"""
+    return {"pending_delete.until": {"$not": {"$gt": datetime.utcnow()}}}
+
+
+def expense_from_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored expense to its API form (string id, amount in major units)"""
+    expense = convert_object_id(doc)
+    expense["amount"] = from_minor(expense["amount"], expense.get("currency"))
+    return expense
 
 
 class ExpenseService:
     @property
     def collection(self):
-        """Get expenses collection"""
-        return get_database()["expenses"]
+        """Get expenses collection; every operation must target one user"""
+        return user_collection("expenses")
+    
+    @property
+    def tombstones(self):
+        """Get tombstones collection (records of deleted expenses for delta sync)"""
+        return user_collection("expense_tombstones")
+    
+    @property
+    def counters(self):
+        return get_database()["counters"]
+    
+    def _next_seq(self, user_id: str, count: int = 1) -> int:
+        """
+        Reserve `count` values of the user's monotonic change sequence.
+        Returns the last reserved value; the range is (last - count, last].
+        
+        Writers commit in any order, so the range is recorded as in flight
+        until _commit_seq() and holds back the sync watermark meanwhile;
+        use _seq_range() rather than calling both.
+        """
+        now = datetime.utcnow()
+        previous = {"$ifNull": ["$seq", 0]}
+        counter = self.counters.find_one_and_update(
+            {"_id": f"expenses:{user_id}"},
+            [{"$set": {
+                "seq": {"$add": [previous, count]},
+                "in_flight": {"$concatArrays": [
+                    # Drop ranges abandoned by writers that died
+                    {"$filter": {
+                        "input": {"$ifNull": ["$in_flight", []]},
+                        "cond": {"$gt": ["$$this.at", now - timedelta(seconds=SEQ_IN_FLIGHT_SECONDS)]}
+                    }},
+                    [{"first": {"$add": [previous, 1]}, "at": now}]
+                ]}
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["seq"]
+    
+    def _commit_seq(self, user_id: str, first: int) -> None:
+        """Mark the range reserved from `first` as written (or given up)"""
+        self.counters.update_one({"_id": f"expenses:{user_id}"}, {"$pull": {"in_flight": {"first": first}}})
+    
+    @contextmanager
+    def _seq_range(self, user_id: str, count: int = 1) -> Iterator[int]:
+        """Reserve `count` seq values for the writes done in the block; yields the last one"""
+        last = self._next_seq(user_id, count)
+        try:
+            yield last
+        finally:
+            self._commit_seq(user_id, last - count + 1)
+    
+    def _seq_state(self, user_id: str) -> Tuple[int, List[int]]:
+        """The last reserved seq and the first seq of each range still in flight"""
+        counter = self.counters.find_one({"_id": f"expenses:{user_id}"}) or {}
+        cutoff = datetime.utcnow() - timedelta(seconds=SEQ_IN_FLIGHT_SECONDS)
+        in_flight = sorted(entry["first"] for entry in counter.get("in_flight", []) if entry["at"] > cutoff)
+        return counter.get("seq", 0), in_flight
+    
+    def _seq_watermark(self, user_id: str) -> int:
+        """The highest seq at or below which every reserved value is written"""
+        seq, in_flight = self._seq_state(user_id)
+        return in_flight[0] - 1 if in_flight else seq
+    
+    def _record(
+        self, user_id: str, seq: int, added: List[Dict[str, Any]] = (), removed: List[Dict[str, Any]] = ()
+    ) -> None:
+        """Apply written and removed expenses to budget totals and live summary streams"""
+        # Both are kept in the user's base currency, at each expense's date's rate
+        added, removed = to_base(user_id, list(added)), to_base(user_id, list(removed))
+        budget_service.record(user_id, added=added, removed=removed)
+        publish_summary_delta(
+            user_id, added=added, removed=removed, currency=get_base_currency(user_id), seq=seq
+        )
+    
+    def _after_write(self, user_id: str) -> None:
+        """Refresh derived data inline unless the change stream worker maintains it"""
+        if settings.CHANGE_STREAM_WORKER == "off":
+            invalidate_user_reports(user_id)
     
     async def create_expense(self, user_id: str, expense_data: ExpenseCreate) -> Dict[str, Any]:
         """Create a new expense"""
+        # Amounts are stored as integer minor units of their own currency;
+        # unset fields are omitted rather than stored as null to keep
+        # documents compact
+        currency = expense_data.currency or get_base_currency(user_id)
+        note_currencies(user_id, [currency])
         expense_dict = {
             "user_id": user_id,
-            "amount": expense_data.amount,
+            "amount": to_minor(expense_data.amount, currency),
+            "currency": currency,
             "category": expense_data.category.value,
             "description": expense_data.description,
+            "terms": tokenize(expense_data.description),
             "date": expense_data.date,
-            "created_at": datetime.utcnow(),
-            "updated_at": None
+            "created_at": datetime.utcnow()
         }
+        set_base_amounts(user_id, [expense_dict])
+        
+        with self._seq_range(user_id) as seq:
+            expense_dict["seq"] = seq
+            if get_storage_mode(user_id) == BUCKET:
+                expense_dict["_id"] = ObjectId()
+                bucket_store.insert_many(user_id, [{k: v for k, v in expense_dict.items() if k != "user_id"}])
+            else:
+                self.collection.insert_one(expense_dict)
+        self._record(user_id, seq, added=[expense_dict])
+        self._after_write(user_id)
+        return expense_from_doc(expense_dict)
+    
+    def insert_expenses(self, expenses_by_user: Dict[str, List[Dict[str, Any]]]) -> int:
+        """
+        Write prepared expenses (storage form, without user_id) of several
+        users at once; returns how many were written.
         
-        result = self.collection.insert_one(expense_dict)
-        created_expense = self.collection.find_one({"_id": result.inserted_id})
-        return convert_object_id(created_expense)
+        Documents of all users go in one insert_many. Expenses hitting a
+        unique index (such as one already written by a crashed run) are
+        skipped. Each user's seq range stays in flight until their expenses
+        are written.
+        """
+        created = 0
+        documents = []
+        with ExitStack() as seq_ranges:
+            for user_id, expenses in expenses_by_user.items():
+                if not expenses:
+                    continue
+                set_base_amounts(user_id, expenses)
+                last = seq_ranges.enter_context(self._seq_range(user_id, len(expenses)))
+                for offset, expense in enumerate(expenses):
+                    expense["seq"] = last - len(expenses) + 1 + offset
+                
+                if get_storage_mode(user_id) == BUCKET:
+                    for expense in expenses:
+                        expense["_id"] = ObjectId()
+                    bucket_store.insert_many(user_id, expenses)
+                    self._record(user_id, last, added=expenses)
+                    created += len(expenses)
+                else:
+                    documents += [{**expense, "user_id": user_id} for expense in expenses]
+            
+            if documents:
+                duplicates = set()
+                try:
+                    self.collection.insert_many(documents, ordered=False)
+                except BulkWriteError as exc:
+                    if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+                        raise
+                    duplicates = {error["index"] for error in exc.details["writeErrors"]}
+                inserted = defaultdict(list)
+                for index, document in enumerate(documents):
+                    if index not in duplicates:
+                        inserted[document["user_id"]].append(document)
+                for user_id, written in inserted.items():
+                    self._record(user_id, max(expense["seq"] for expense in written), added=written)
+                    created += len(written)
+        
+        for user_id, expenses in expenses_by_user.items():
+            if expenses:
+                self._after_write(user_id)
+        return created
+    
+    def _find_stored(self, expense_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """An expense in storage form, wherever it is stored"""
+        if get_storage_mode(user_id) == BUCKET:
+            found = bucket_store.find(user_id, ObjectId(expense_id))
+            if found:
+                return {**found[1], "user_id": user_id}
+        
+        query = {"_id": ObjectId(expense_id), "user_id": user_id}
+        return self.collection.find_one(query) or user_collection(ARCHIVE_COLLECTION).find_one(query)
     
     async def get_expense_by_id(self, expense_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Get expense by ID for a specific user"""
-        expense = self.collection.find_one({
-            "_id": ObjectId(expense_id),
-            "user_id": user_id
-        })
-        return convert_object_id(expense) if expense else None
+        expense = self._find_stored(expense_id, user_id)
+        return expense_from_doc(expense) if expense else None
     
     async def get_user_expenses(
         self, 
@@ -59,8 +250,88 @@ class ExpenseService:
                 date_filter["$lte"] = end_date
             query["date"] = date_filter
         
-        expenses = self.collection.find(query).sort("date", -1).skip(skip).limit(limit)
-        return [convert_object_id(expense) for expense in expenses]
+        expenses = aggregate_expenses([
+            {"$match": query},
+            {"$sort": {"date": -1}},
+            {"$skip": skip},
+            {"$limit": limit}
+        ])
+        return [expense_from_doc(expense) for expense in expenses]
+    
+    async def search_expenses(
+        self,
+        user_id: str,
+        q: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        category: Optional[ExpenseType] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Search a user's expenses by description.
+        
+        Every query word must prefix-match a word of the description (so partial
+        input autocompletes). Results are ranked by the number of exactly
+        matched words, then newest first, and paginated with an opaque cursor.
+        """
+        tokens = tokenize(q, MAX_QUERY_TERMS)
+        if not tokens:
+            return {"expenses": [], "next_cursor": None}
+        
+        query = {
+            "user_id": user_id,
+            "terms": {"$all": [re.compile(f"^{re.escape(token)}") for token in tokens]}
+        }
+        if category:
+            query["category"] = category.value
+        if start_date or end_date:
+            query["date"] = {}
+            if start_date:
+                query["date"]["$gte"] = start_date
+            if end_date:
+                query["date"]["$lte"] = end_date
+        
+        pipeline = [
+            {"$match": query},
+            # An exact word match scores 2, a prefix match 1
+            {"$addFields": {"score": {"$add": [
+                {"$cond": [{"$in": [token, "$terms"]}, 2, 1]} for token in tokens
+            ]}}}
+        ]
+        if cursor:
+            score, date, expense_id = decode_cursor(cursor)
+            pipeline.append({"$match": {"$or": [
+                {"score": {"$lt": score}},
+                {"score": score, "date": {"$lt": date}},
+                {"score": score, "date": date, "_id": {"$lt": ObjectId(expense_id)}}
+            ]}})
+        pipeline += [
+            {"$sort": {"score": -1, "date": -1, "_id": -1}},
+            {"$limit": limit + 1}
+        ]
+        
+        results = list(aggregate_expenses(pipeline))
+        page = results[:limit]
+        next_cursor = None
+        if len(results) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(last["score"], last["date"], str(last["_id"]))
+        return {"expenses": [expense_from_doc(doc) for doc in page], "next_cursor": next_cursor}
+    
+    def _update_fields(self, update_data: ExpenseUpdate, currency: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stored fields set by an update, in storage form. A new amount is in the
+        update's currency if it has one, else in `currency`, the expense's own.
+        """
+        update_dict = update_data.model_dump(exclude_none=True)
+        if "amount" in update_dict:
+            update_dict["amount"] = to_minor(update_dict["amount"], update_dict.get("currency", currency))
+        if "category" in update_dict:
+            update_dict["category"] = update_dict["category"].value
+        if "description" in update_dict:
+            update_dict["terms"] = tokenize(update_dict["description"])
+        return update_dict
     
     async def update_expense(
         self, 
@@ -69,30 +340,257 @@ class ExpenseService:
         update_data: ExpenseUpdate
     ) -> Optional[Dict[str, Any]]:
         """Update an expense"""
-        update_dict = update_data.model_dump(exclude_none=True)
+        if update_data.currency is not None:
+            note_currencies(user_id, [update_data.currency])
+        current = None
+        if any(getattr(update_data, field) is not None for field in BASE_AMOUNT_FIELDS):
+            # New amounts without a currency are in the expense's current one,
+            # and the base amount is recomputed from the updated fields
+            current = self._find_stored(expense_id, user_id)
+            if current is None:
+                return None
+        update_dict = self._update_fields(update_data, current.get("currency") if current else None)
+        if current is not None:
+            updated = {**current, **update_dict}
+            set_base_amounts(user_id, [updated])
+            if "base_amount" in updated:
+                update_dict["base_amount"] = updated["base_amount"]
         if update_dict:
             update_dict["updated_at"] = datetime.utcnow()
+            with self._seq_range(user_id) as seq:
+                update_dict["seq"] = seq
+                previous = None
+                if get_storage_mode(user_id) == BUCKET:
+                    result = bucket_store.update(user_id, ObjectId(expense_id), update_dict)
+                    if result:
+                        previous, updated = result
+                        self._record(user_id, seq, added=[updated], removed=[previous])
+                        self._after_write(user_id)
+                        return expense_from_doc({**updated, "user_id": user_id})
+                
+                query = {"_id": ObjectId(expense_id), "user_id": user_id, **not_claimed_for_delete()}
+                previous = self.collection.find_one_and_update(query, {"$set": update_dict})
+                if previous is None and restore_expense(user_id, expense_id):
+                    # Archived expenses become hot again when they are edited
+                    previous = self.collection.find_one_and_update(query, {"$set": update_dict})
             
-            result = self.collection.update_one(
-                {"_id": ObjectId(expense_id), "user_id": user_id},
-                {"$set": update_dict}
-            )
-            
-            if result.modified_count:
-                return await self.get_expense_by_id(expense_id, user_id)
+            if previous is not None:
+                updated = {**previous, **update_dict}
+                self._record(user_id, seq, added=[updated], removed=[previous])
+                self._after_write(user_id)
+                return expense_from_doc(updated)
         return None
     
     async def delete_expense(self, expense_id: str, user_id: str) -> bool:
-        """Delete an expense"""
-        result = self.collection.delete_one({
-            "_id": ObjectId(expense_id),
-            "user_id": user_id
-        })
-        return result.deleted_count > 0
+        """Delete an expense, leaving a tombstone for delta sync clients"""
+        # The seq is reserved before the delete, like any other write, so
+        # summary snapshots can tell whether they include it
+        with self._seq_range(user_id) as seq:
+            deleted = None
+            if get_storage_mode(user_id) == BUCKET:
+                deleted = bucket_store.delete(user_id, ObjectId(expense_id))
+            query = {"_id": ObjectId(expense_id), "user_id": user_id, **not_claimed_for_delete()}
+            if not deleted:
+                deleted = self.collection.find_one_and_delete(query, projection=REMOVED_PROJECTION)
+            if not deleted and restore_expense(user_id, expense_id):
+                deleted = self.collection.find_one_and_delete(query, projection=REMOVED_PROJECTION)
+            if not deleted:
+                return False
+            
+            self.tombstones.insert_one({
+                "user_id": user_id,
+                "expense_id": expense_id,
+                "seq": seq,
+                "deleted_at": datetime.utcnow()
+            })
+        self._record(user_id, seq, removed=[deleted])
+        self._after_write(user_id)
+        return True
+    
+    async def get_expenses_by_ids(self, user_id: str, expense_ids: List[ObjectId]) -> Dict[ObjectId, Dict[str, Any]]:
+        """Get a user's expenses by id in one query; missing ids are absent from the result"""
+        expenses = aggregate_expenses([{"$match": {"user_id": user_id, "_id": {"$in": expense_ids}}}])
+        return {expense["_id"]: expense_from_doc(expense) for expense in expenses}
+    
+    async def update_expenses(
+        self,
+        user_id: str,
+        updates: Dict[ObjectId, ExpenseUpdate]
+    ) -> Dict[ObjectId, Optional[Dict[str, Any]]]:
+        """
+        Update several expenses; returns each updated expense, or None when not found.
+        
+        Document-stored expenses are read with one $in query and written with one
+        bulk_write, each update guarded by the seq it was read at. Expenses not
+        updated that way (bucket-stored, archived, or changed in between) go
+        through update_expense one by one.
+        """
+        pending = [expense_id for expense_id, update in updates.items() if update.model_dump(exclude_none=True)]
+        results: Dict[ObjectId, Optional[Dict[str, Any]]] = {}
+        note_currencies(user_id, [update.currency for update in updates.values() if update.currency])
+        
+        previous = {
+            doc["_id"]: doc for doc in self.collection.find(
+                {"_id": {"$in": pending}, "user_id": user_id, **not_claimed_for_delete()}
+            )
+        } if pending else {}
+        # New amounts without a currency are in the expense's current one
+        changes = {
+            expense_id: self._update_fields(updates[expense_id], previous[expense_id].get("currency"))
+            for expense_id in previous
+        }
+        repriced = {
+            expense_id: {**previous[expense_id], **change} for expense_id, change in changes.items()
+            if any(field in change for field in BASE_AMOUNT_FIELDS)
+        }
+        set_base_amounts(user_id, list(repriced.values()))
+        for expense_id, expense in repriced.items():
+            if "base_amount" in expense:
+                changes[expense_id]["base_amount"] = expense["base_amount"]
+        if previous:
+            now = datetime.utcnow()
+            with self._seq_range(user_id, len(previous)) as last:
+                first = last - len(previous) + 1
+                operations = []
+                for offset, expense_id in enumerate(previous):
+                    changes[expense_id].update({"updated_at": now, "seq": first + offset})
+                    operations.append(UpdateOne(
+                        {"_id": expense_id, "user_id": user_id, "seq": previous[expense_id].get("seq"),
+                         **not_claimed_for_delete()},
+                        {"$set": changes[expense_id]}
+                    ))
+                result = self.collection.bulk_write(operations, ordered=False)
+            applied = set(previous)
+            if result.matched_count < len(operations):
+                # Find which updates won by the unique seq each one set
+                applied = {doc["_id"] for doc in self.collection.find(
+                    {"_id": {"$in": list(previous)}, "user_id": user_id,
+                     "seq": {"$gte": first, "$lt": first + len(previous)}},
+                    {"_id": 1}
+                )}
+            
+            updated = [{**previous[expense_id], **changes[expense_id]} for expense_id in applied]
+            if updated:
+                self._record(
+                    user_id, last, added=updated, removed=[previous[expense_id] for expense_id in applied]
+                )
+                self._after_write(user_id)
+            results.update({expense["_id"]: expense_from_doc(expense) for expense in updated})
+        
+        for expense_id in pending:
+            if expense_id not in results:
+                results[expense_id] = await self.update_expense(str(expense_id), user_id, updates[expense_id])
+        
+        # Empty updates change nothing; return the expenses as they are
+        unchanged = [expense_id for expense_id in updates if expense_id not in results]
+        if unchanged:
+            current = await self.get_expenses_by_ids(user_id, unchanged)
+            results.update({expense_id: current.get(expense_id) for expense_id in unchanged})
+        return results
+    
+    async def delete_expenses(self, user_id: str, expense_ids: List[ObjectId]) -> Dict[ObjectId, bool]:
+        """
+        Delete several expenses; returns whether each one was found and deleted.
+        
+        Document-stored expenses are first claimed with one update, so their
+        values can be read and deleted without another request changing or
+        deleting them in between. The rest (bucket-stored, archived) go through
+        delete_expense one by one.
+        """
+        now = datetime.utcnow()
+        token = ObjectId()
+        self.collection.update_many(
+            {"_id": {"$in": expense_ids}, "user_id": user_id, **not_claimed_for_delete()},
+            {"$set": {"pending_delete": {
+                "token": token, "until": now + timedelta(seconds=DELETE_CLAIM_SECONDS)
+            }}}
+        )
+        claimed_query = {"_id": {"$in": expense_ids}, "user_id": user_id, "pending_delete.token": token}
+        claimed = list(self.collection.find(claimed_query, REMOVED_PROJECTION))
+        
+        results = {expense_id: False for expense_id in expense_ids}
+        if claimed:
+            with self._seq_range(user_id, len(claimed)) as last:
+                self.collection.delete_many(claimed_query)
+                first = last - len(claimed) + 1
+                self.tombstones.insert_many([
+                    {
+                        "user_id": user_id,
+                        "expense_id": str(expense["_id"]),
+                        "seq": first + offset,
+                        "deleted_at": now
+                    }
+                    for offset, expense in enumerate(claimed)
+                ])
+            self._record(user_id, last, removed=claimed)
+            self._after_write(user_id)
+            results.update({expense["_id"]: True for expense in claimed})
+        
+        for expense_id in expense_ids:
+            if not results[expense_id]:
+                results[expense_id] = await self.delete_expense(str(expense_id), user_id)
+        return results
+    
+    def _backfill_seq(self, user_id: str) -> None:
+        """Assign change sequence numbers to expenses written before delta sync existed"""
+        missing = list(self.collection.find({"user_id": user_id, "seq": None}, {"_id": 1}))
+        if not missing:
+            return
+        
+        with self._seq_range(user_id, len(missing)) as last:
+            first = last - len(missing) + 1
+            self.collection.bulk_write([
+                UpdateOne({"_id": doc["_id"], "user_id": user_id, "seq": None}, {"$set": {"seq": first + i}})
+                for i, doc in enumerate(missing)
+            ], ordered=False)
+    
+    async def get_changes(self, user_id: str, since: int = 0, limit: int = 500) -> Dict[str, Any]:
+        """
+        Get expenses inserted, updated or deleted after change sequence `since`.
+        
+        Returns the changed expenses, the ids of deleted expenses and the
+        cursor to pass as `since` on the next call. Changes are only returned
+        up to the watermark below which no write is still in flight, so one
+        committing late with a lower seq is never skipped.
+        """
+        if since == 0:
+            self._backfill_seq(user_id)
+        
+        watermark = self._seq_watermark(user_id)
+        if watermark <= since:
+            return {"changes": [], "deleted": [], "cursor": since, "has_more": False}
+        seq_range = {"$gt": since, "$lte": watermark}
+        changed = list(aggregate_expenses([
+            {"$match": {"user_id": user_id, "seq": seq_range}},
+            {"$sort": {"seq": 1}},
+            {"$limit": limit + 1}
+        ]))
+        deleted = list(
+            self.tombstones.find({"user_id": user_id, "seq": seq_range}, {"expense_id": 1, "seq": 1})
+            .sort("seq", 1).limit(limit + 1)
+        )
+        
+        # Merge both streams in sequence order and keep the first `limit` entries
+        merged = sorted(
+            [("changed", doc) for doc in changed] + [("deleted", doc) for doc in deleted],
+            key=lambda entry: entry[1]["seq"]
+        )
+        page = merged[:limit]
+        
+        return {
+            "changes": [expense_from_doc(doc) for kind, doc in page if kind == "changed"],
+            "deleted": [doc["expense_id"] for kind, doc in page if kind == "deleted"],
+            "cursor": page[-1][1]["seq"] if page else since,
+            "has_more": len(merged) > limit
+        }
     
     async def get_expense_count(self, user_id: str) -> int:
         """Get total count of expenses for a user"""
-        return self.collection.count_documents({"user_id": user_id})
+        count = self.collection.count_documents({"user_id": user_id})
+        count += get_archived_summary(user_id)["count"]
+        if get_storage_mode(user_id) == BUCKET:
+            count += bucket_store.summary(user_id)["count"]
+        return count
     
     async def get_total_amount(self, user_id: str) -> float:
         """Get total amount spent by a user"""
@@ -101,7 +599,63 @@ class ExpenseService:
             {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
         ]
         result = list(self.collection.aggregate(pipeline))
-        return result[0]["total"] if result else 0.0
+        total = result[0]["total"] if result else 0
+        total += get_archived_summary(user_id)["total"]
+        if get_storage_mode(user_id) == BUCKET:
+            total += bucket_store.summary(user_id)["total"]
+        return from_minor(total, get_base_currency(user_id))
+    
+    async def get_summary(self, user_id: str) -> Dict[str, Any]:
+        """Get expense summary statistics: totals, average and per-category breakdown"""
+        total_count = await self.get_expense_count(user_id)
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": "$category",
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        
+        currency = get_user_currency(user_id)
+        if currency["foreign"]:
+            # Amounts in several currencies can only be added up once converted
+            category_stats, _ = aggregate_totals(user_id, pipeline)
+            category_stats.sort(key=lambda stat: -stat["total"])
+            total_amount = from_minor(sum(stat["total"] for stat in category_stats), currency["base"])
+        else:
+            total_amount = await self.get_total_amount(user_id)
+            category_stats = list(aggregate_expenses([*pipeline, {"$sort": {"total": -1}}]))
+        
+        return {
+            "total_amount": total_amount,
+            "total_expenses": total_count,
+            "average_expense": total_amount / total_count if total_count > 0 else 0,
+            "categories": {
+                stat["_id"]: {
+                    "total": from_minor(stat["total"], currency["base"]),
+                    "count": stat["count"],
+                    "percentage": (from_minor(stat["total"], currency["base"]) / total_amount * 100) if total_amount > 0 else 0
+                }
+                for stat in category_stats
+            }
+        }
+    
+    async def get_summary_snapshot(self, user_id: str) -> Dict[str, Any]:
+        """
+        The summary with the seq of the last write it includes.
+        
+        A summary read while no write is in flight, and with no seq reserved
+        meanwhile, includes exactly the writes up to the last reserved seq.
+        When writes keep overlapping the read, the seq falls back to the
+        watermark before it: writes above it may then be counted twice.
+        """
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            seq, in_flight = before = self._seq_state(user_id)
+            summary = await self.get_summary(user_id)
+            if not in_flight and self._seq_state(user_id) == before:
+                break
+        return {**summary, "seq": in_flight[0] - 1 if in_flight else seq}
 
 
 expense_service = ExpenseService()
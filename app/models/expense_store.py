@@ -0,0 +1,353 @@
+"""
+Physical storage of expenses.
+
+Expenses are stored in one of two layouts, chosen per user:
+
+- "document" (default): one document per expense in the `expenses` collection
+- "bucket": expenses embedded in per-user-per-month documents in the
+  `expense_buckets` collection, each carrying precomputed totals. This keeps
+  index size and report cost proportional to months rather than expenses
+  for high-volume users.
+
+Reads go through aggregate_expenses(), which presents both layouts as a
+stream of flat expense documents. Bucket users' reads also include any
+documents still in `expenses`, so a user can be migrated while live
+(see scripts/migrate_buckets.py). Reads whose date range starts before the
+archive cutoff also include `expenses_archive` (see app/services/archive.py).
+Newest-first listings of bucket users only unwind the newest buckets that
+hold enough expenses, found from the buckets' counts.
+
+All three collections are sharded on user_id and only accessed through
+user_collection(), so every read and write is routed to a single shard
+(see app/core/sharding.py).
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from app.core.cache import get_cache, get_shared_cache
+from app.core.config import settings
+from app.core.database import get_database
+from app.core.sharding import user_collection
+from app.utils.exceptions import ConflictException
+
+DOCUMENT = "document"
+BUCKET = "bucket"
+
+ARCHIVE_COLLECTION = "expenses_archive"
+ARCHIVE_STATE_ID = "expense-archive"
+ARCHIVE_CUTOFF_KEY = "archive:cutoff"
+
+# Stages turning bucket documents into flat expense documents
+FLATTEN_BUCKETS = [
+    {"$unwind": "$expenses"},
+    {"$addFields": {"expenses.user_id": "$user_id"}},
+    {"$replaceRoot": {"newRoot": "$expenses"}}
+]
+
+
+def month_start(value: datetime) -> datetime:
+    """Truncate a datetime to the first day of its month"""
+    return datetime(value.year, value.month, 1)
+
+
+def get_storage_mode(user_id: str) -> str:
+    """Get the storage layout used for a user's expenses"""
+    cache = get_shared_cache()
+    key = f"user:storage:{user_id}"
+    mode = cache.get(key)
+    if mode is None:
+        user = None
+        if ObjectId.is_valid(user_id):
+            user = get_database().users.find_one({"_id": ObjectId(user_id)}, {"expense_storage": 1})
+        mode = (user or {}).get("expense_storage") or DOCUMENT
+        cache.set(key, mode, ttl=settings.USER_CACHE_TTL)
+    return mode
+
+
+def set_storage_mode(user_id: str, mode: str) -> None:
+    """Switch the storage layout used for new writes of a user"""
+    get_database().users.update_one({"_id": ObjectId(user_id)}, {"$set": {"expense_storage": mode}})
+    get_cache().delete(f"user:storage:{user_id}")
+
+
+def get_archive_cutoff() -> Optional[datetime]:
+    """Expenses dated before this month boundary may be archived (None if nothing was)"""
+    cache = get_shared_cache()
+    cutoff = cache.get(ARCHIVE_CUTOFF_KEY)
+    if cutoff is None:
+        state = get_database().worker_state.find_one({"_id": ARCHIVE_STATE_ID})
+        # Cache "no archive" as an empty string so it isn't looked up on every read
+        cutoff = (state or {}).get("cutoff") or ""
+        cache.set(ARCHIVE_CUTOFF_KEY, cutoff, ttl=settings.USER_CACHE_TTL)
+    return cutoff or None
+
+
+def _reads_archive(match: Dict[str, Any]) -> bool:
+    """Whether an expense filter can match archived expenses"""
+    cutoff = get_archive_cutoff()
+    if cutoff is None:
+        return False
+    date = match.get("date")
+    if isinstance(date, dict):
+        lower = date.get("$gte", date.get("$gt"))
+        return lower is None or lower < cutoff
+    if isinstance(date, datetime):
+        return date < cutoff
+    return True
+
+
+def _top_n(stages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The leading $sort/$skip/$limit of a pipeline as a [$sort, $limit] that can be
+    applied to each merged source first, so only the top rows are merged
+    """
+    if not stages or "$sort" not in stages[0]:
+        return []
+    skip = 0
+    for stage in stages[1:]:
+        if "$skip" in stage:
+            skip += stage["$skip"]
+        elif "$limit" in stage:
+            return [stages[0], {"$limit": skip + stage["$limit"]}]
+        else:
+            break
+    return []
+
+
+def _bucket_filter(user_id: str, match: Dict[str, Any]) -> Dict[str, Any]:
+    """Narrow the buckets scanned using the date, seq, search and id conditions of an expense filter"""
+    bucket_filter: Dict[str, Any] = {"user_id": user_id}
+
+    date = match.get("date")
+    if isinstance(date, dict):
+        month = {}
+        for op in ("$gte", "$gt"):
+            if op in date:
+                month["$gte"] = month_start(date[op])
+        for op in ("$lte", "$lt"):
+            if op in date:
+                month["$lte"] = month_start(date[op])
+        if month:
+            bucket_filter["month"] = month
+
+    seq = match.get("seq")
+    if isinstance(seq, dict) and "$gt" in seq:
+        bucket_filter["max_seq"] = {"$gt": seq["$gt"]}
+
+    if "terms" in match:
+        bucket_filter["expenses.terms"] = match["terms"]
+
+    if "_id" in match:
+        bucket_filter["expenses._id"] = match["_id"]
+
+    return bucket_filter
+
+
+def _newest_buckets(user_id: str, match: Dict[str, Any], top_n: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    For a newest-first top N over whole buckets (no condition but an optional
+    category), the stages keeping only the newest months holding N expenses,
+    found from the bucket counts, so the older buckets are never unwound
+    """
+    if not top_n or top_n[0]["$sort"] != {"date": -1} or set(match) - {"category"}:
+        return []
+    category = match.get("category")
+    if category is not None and not isinstance(category, str):
+        return []
+
+    wanted = top_n[1]["$limit"]
+    buckets = user_collection("expense_buckets").find(
+        {"user_id": user_id}, {"month": 1, "count": 1, "categories": 1}
+    )
+    for bucket in buckets.sort("month", -1):
+        if category is None:
+            wanted -= bucket.get("count", 0)
+        else:
+            wanted -= bucket.get("categories", {}).get(category, {}).get("count", 0)
+        if wanted <= 0:
+            # Every bucket of that month is kept: any of them may hold its newest expenses
+            return [{"$match": {"month": {"$gte": bucket["month"]}}}, {"$sort": {"month": -1}}]
+    return []
+
+
+def aggregate_expenses(pipeline: List[Dict[str, Any]], **kwargs):
+    """
+    Run an aggregation over one user's expenses, whatever their storage layout.
+
+    The pipeline must start with a $match on user_id, written against flat
+    expense documents exactly as for the `expenses` collection.
+    """
+    match = pipeline[0].get("$match", {}) if pipeline else {}
+    user_id = match.get("user_id")
+    if not isinstance(user_id, str):
+        raise ValueError("Expense pipelines must start with a $match on user_id")
+
+    top_n = _top_n(pipeline[1:])
+    merged = []
+    if _reads_archive(match):
+        merged.append({"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [pipeline[0], *top_n]}})
+
+    if get_storage_mode(user_id) != BUCKET:
+        if not merged:
+            return user_collection("expenses").aggregate(pipeline, **kwargs)
+        return user_collection("expenses").aggregate([pipeline[0], *top_n, *merged, *pipeline[1:]], **kwargs)
+
+    expense_match = {key: value for key, value in match.items() if key != "user_id"}
+    bucket_pipeline = [
+        {"$match": _bucket_filter(user_id, expense_match)},
+        *_newest_buckets(user_id, expense_match, top_n),
+        *FLATTEN_BUCKETS,
+        {"$match": expense_match},
+        *top_n,
+        # Expenses not migrated into buckets yet
+        {"$unionWith": {"coll": "expenses", "pipeline": [pipeline[0], *top_n]}},
+        *merged,
+        *pipeline[1:]
+    ]
+    return user_collection("expense_buckets").aggregate(bucket_pipeline, **kwargs)
+
+
+class BucketStore:
+    """CRUD operations on expenses embedded in per-user-per-month buckets"""
+
+    @property
+    def collection(self):
+        """Get expense buckets collection; every operation must target one user"""
+        return user_collection("expense_buckets")
+
+    def _totals(self, expenses: Iterable[Dict[str, Any]], sign: int = 1) -> Dict[str, int]:
+        """$inc document applying (sign=1) or removing (sign=-1) expenses from bucket totals"""
+        inc: Dict[str, int] = defaultdict(int)
+        for expense in expenses:
+            amount = sign * expense["amount"]
+            category = expense["category"]
+            inc["count"] += sign
+            inc["total"] += amount
+            inc[f"categories.{category}.total"] += amount
+            inc[f"categories.{category}.count"] += sign
+        return dict(inc)
+
+    def insert_many(self, user_id: str, expenses: List[Dict[str, Any]]) -> None:
+        """Append expenses (with _id set, without user_id) to the user's monthly buckets"""
+        by_month: Dict[datetime, List[Dict[str, Any]]] = defaultdict(list)
+        for expense in expenses:
+            by_month[month_start(expense["date"])].append(expense)
+
+        for month, month_expenses in by_month.items():
+            # A full bucket is left alone and a new one is started for the month
+            self.collection.update_one(
+                {"user_id": user_id, "month": month, "count": {"$lt": settings.BUCKET_MAX_EXPENSES}},
+                {
+                    "$push": {"expenses": {"$each": month_expenses}},
+                    "$inc": self._totals(month_expenses),
+                    "$max": {"max_seq": max(expense.get("seq") or 0 for expense in month_expenses)}
+                },
+                upsert=True
+            )
+
+    def find(self, user_id: str, expense_id: ObjectId) -> Optional[Tuple[ObjectId, Dict[str, Any]]]:
+        """Find an expense, returning its bucket id and the embedded expense"""
+        bucket = self.collection.find_one(
+            {"user_id": user_id, "expenses._id": expense_id},
+            {"expenses": {"$elemMatch": {"_id": expense_id}}}
+        )
+        if not bucket:
+            return None
+        return bucket["_id"], bucket["expenses"][0]
+
+    def _guard(self, user_id: str, bucket_id: ObjectId, expense: Dict[str, Any]) -> Dict[str, Any]:
+        """Filter matching the bucket only if the expense is unchanged since it was read"""
+        return {
+            "_id": bucket_id,
+            "user_id": user_id,
+            "expenses": {"$elemMatch": {"_id": expense["_id"], "seq": expense.get("seq")}}
+        }
+
+    def update(self, user_id: str, expense_id: ObjectId, changes: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Apply field changes to an expense, keeping bucket totals consistent.
+        Returns the expense before and after the change.
+        """
+        for _ in range(settings.BUCKET_WRITE_RETRIES):
+            found = self.find(user_id, expense_id)
+            if not found:
+                return None
+            bucket_id, current = found
+            updated = {**current, **changes}
+
+            if month_start(updated["date"]) == month_start(current["date"]):
+                inc = self._totals([current], -1)
+                for key, value in self._totals([updated]).items():
+                    inc[key] = inc.get(key, 0) + value
+                result = self.collection.update_one(
+                    self._guard(user_id, bucket_id, current),
+                    {
+                        "$set": {f"expenses.$.{field}": value for field, value in changes.items()},
+                        "$inc": inc,
+                        "$max": {"max_seq": updated.get("seq") or 0}
+                    }
+                )
+                if result.modified_count:
+                    return current, updated
+            else:
+                # The expense moved to another month: move it to that month's bucket
+                result = self.collection.update_one(
+                    self._guard(user_id, bucket_id, current),
+                    {"$pull": {"expenses": {"_id": expense_id}}, "$inc": self._totals([current], -1)}
+                )
+                if result.modified_count:
+                    self.insert_many(user_id, [updated])
+                    return current, updated
+
+        raise ConflictException("Expense was modified concurrently, please retry")
+
+    def delete(self, user_id: str, expense_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """Remove an expense from its bucket, keeping bucket totals consistent; returns the removed expense"""
+        for _ in range(settings.BUCKET_WRITE_RETRIES):
+            found = self.find(user_id, expense_id)
+            if not found:
+                return None
+            bucket_id, current = found
+            result = self.collection.update_one(
+                self._guard(user_id, bucket_id, current),
+                {"$pull": {"expenses": {"_id": expense_id}}, "$inc": self._totals([current], -1)}
+            )
+            if result.modified_count:
+                return current
+
+        raise ConflictException("Expense was modified concurrently, please retry")
+
+    def summary(self, user_id: str, start_month: Optional[datetime] = None, end_month: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Totals per category from the precomputed bucket totals, without unwinding expenses.
+        The range is inclusive of both months.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if start_month or end_month:
+            query["month"] = {}
+            if start_month:
+                query["month"]["$gte"] = start_month
+            if end_month:
+                query["month"]["$lte"] = end_month
+
+        count = 0
+        total = 0
+        categories: Dict[str, Dict[str, int]] = defaultdict(lambda: {"total": 0, "count": 0})
+        for bucket in self.collection.find(query, {"count": 1, "total": 1, "categories": 1}):
+            count += bucket.get("count", 0)
+            total += bucket.get("total", 0)
+            for category, totals in (bucket.get("categories") or {}).items():
+                categories[category]["total"] += totals["total"]
+                categories[category]["count"] += totals["count"]
+
+        return {
+            "count": count,
+            "total": total,
+            "categories": {
+                category: totals for category, totals in categories.items() if totals["count"]
+            }
+        }
+
+
+bucket_store = BucketStore()
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.database import get_database
+from app.utils.exceptions import ConflictException, UnprocessableEntityException
+
+
+def request_fingerprint(payload: str) -> str:
+    """Hash a request body so a reused key with a different payload can be detected"""
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyService:
+    """
+    Stores the outcome of requests sent with an Idempotency-Key header.
+
+    A key is claimed by inserting an "in_progress" record (unique per user and
+    key) holding a claim token; only the holder of the current token can
+    complete or release it, so a request whose claim was taken over cannot
+    overwrite the response or drop the new claim. Repeats of a completed request get the stored response back without
+    re-executing it; concurrent repeats wait briefly for the first request to
+    finish. Records expire through a TTL index on created_at.
+    """
+
+    @property
+    def collection(self):
+        """Get idempotency keys collection"""
+        return get_database()["idempotency_keys"]
+
+    async def claim(self, user_id: str, key: str, fingerprint: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Claim a key for a new request.
+
+        Returns the claim token if the caller should execute the request (to
+        pass to complete or release), or the stored response if the same
+        request has already completed.
+        """
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        try:
+            self.collection.insert_one({
+                "user_id": user_id,
+                "key": key,
+                "fingerprint": fingerprint,
+                "status": "in_progress",
+                "token": token,
+                "created_at": now,
+                "locked_at": now
+            })
+            return token, None
+        except DuplicateKeyError:
+            pass
+
+        deadline = now + timedelta(seconds=settings.IDEMPOTENCY_WAIT_SECONDS)
+        while True:
+            record = self.collection.find_one({"user_id": user_id, "key": key})
+            if record is None:
+                # Expired or released between our insert and read: try again
+                return await self.claim(user_id, key, fingerprint)
+
+            if record["fingerprint"] != fingerprint:
+                raise UnprocessableEntityException(
+                    "Idempotency-Key was already used with a different request payload"
+                )
+
+            if record["status"] == "completed":
+                return None, record["response"]
+
+            # Take over a claim left behind by a request that died mid-flight
+            lock_expiry = datetime.utcnow() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+            if record["locked_at"] < lock_expiry:
+                taken = self.collection.find_one_and_update(
+                    {"_id": record["_id"], "status": "in_progress", "locked_at": record["locked_at"]},
+                    {"$set": {"locked_at": datetime.utcnow(), "token": token}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if taken:
+                    return token, None
+
+            if datetime.utcnow() >= deadline:
+                raise ConflictException(
+                    "A request with this Idempotency-Key is still being processed"
+                )
+            await asyncio.sleep(0.1)
+
+    async def complete(self, user_id: str, key: str, token: str, response: Dict[str, Any]) -> None:
+        """Store the response of a finished request, unless its claim was taken over"""
+        self.collection.update_one(
+            {"user_id": user_id, "key": key, "status": "in_progress", "token": token},
+            {"$set": {"status": "completed", "response": response}}
+        )
+
+    async def release(self, user_id: str, key: str, token: str) -> None:
+        """Release a claim after a failed request so the client can retry"""
+        self.collection.delete_one({"user_id": user_id, "key": key, "status": "in_progress", "token": token})
+
+
+idempotency_service = IdempotencyService()
@@ -0,0 +1,135 @@
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.core.database import get_database
+from app.schemas.recurring import RecurringRuleCreate, RecurringRuleUpdate
+from app.services.fx import get_base_currency
+from app.utils.exceptions import BadRequestException
+from app.utils.money import from_minor, to_minor
+from app.utils.objectid import convert_object_id
+from app.utils.recurrence import next_occurrence
+
+SCHEDULE_FIELDS = ("frequency", "interval", "by_weekday", "by_month_day", "until", "count")
+
+
+def rule_from_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored rule to its API form (string id, amount in major units)"""
+    rule = convert_object_id(doc)
+    rule["amount"] = from_minor(rule["amount"], rule.get("currency"))
+    return rule
+
+
+def _validate_schedule(rule: Dict[str, Any]) -> None:
+    """Reject schedule options that don't apply to the rule's frequency"""
+    if rule.get("by_weekday") is not None:
+        if rule["frequency"] != "WEEKLY":
+            raise BadRequestException("by_weekday only applies to WEEKLY rules")
+        if not rule["by_weekday"] or any(day not in range(7) for day in rule["by_weekday"]):
+            raise BadRequestException("by_weekday must list weekdays from 0 (Monday) to 6 (Sunday)")
+    if rule.get("by_month_day") is not None:
+        if rule["frequency"] != "MONTHLY":
+            raise BadRequestException("by_month_day only applies to MONTHLY rules")
+        if rule["by_month_day"] == 0:
+            raise BadRequestException("by_month_day must be 1-31 or -1 for the last day")
+
+
+class RecurringRuleService:
+    """
+    Recurring expense rules. Due occurrences are turned into expenses by the
+    scheduler in app/services/recurring.py, which advances `next_run`.
+    """
+
+    @property
+    def collection(self):
+        """Get recurring rules collection"""
+        return get_database()["recurring_rules"]
+
+    async def create_rule(self, user_id: str, rule_data: RecurringRuleCreate) -> Dict[str, Any]:
+        """Create a recurring rule"""
+        rule = rule_data.model_dump()
+        rule["category"] = rule["category"].value
+        rule["frequency"] = rule["frequency"].value
+        currency = get_base_currency(user_id)
+        rule["amount"] = to_minor(rule["amount"], currency)
+        _validate_schedule(rule)
+
+        rule.update({
+            "user_id": user_id,
+            "currency": currency,
+            "next_run": next_occurrence(rule),
+            "last_occurrence": None,
+            "created_at": datetime.utcnow()
+        })
+        if rule["next_run"] is None:
+            raise BadRequestException("Schedule has no occurrences")
+        rule["active"] = True
+
+        self.collection.insert_one(rule)
+        return rule_from_doc(rule)
+
+    async def get_rule(self, rule_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a recurring rule by ID for a specific user"""
+        rule = self.collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
+        return rule_from_doc(rule) if rule else None
+
+    async def get_user_rules(self, user_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get a user's recurring rules, newest first"""
+        rules = self.collection.find({"user_id": user_id}).sort("created_at", -1).skip(skip).limit(limit)
+        return [rule_from_doc(rule) for rule in rules]
+
+    async def get_rule_count(self, user_id: str) -> int:
+        """Get total count of recurring rules for a user"""
+        return self.collection.count_documents({"user_id": user_id})
+
+    async def update_rule(
+        self,
+        rule_id: str,
+        user_id: str,
+        update_data: RecurringRuleUpdate
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update a recurring rule. Schedule changes apply to occurrences after
+        the last materialized one; resuming a paused rule skips the
+        occurrences missed while it was paused.
+        """
+        current = self.collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
+        if not current:
+            return None
+
+        update_dict = update_data.model_dump(exclude_unset=True)
+        if update_dict.get("amount") is not None:
+            update_dict["amount"] = to_minor(update_dict["amount"], current.get("currency"))
+        for field in ("category", "frequency"):
+            if update_dict.get(field) is not None:
+                update_dict[field] = update_dict[field].value
+        if not update_dict:
+            return rule_from_doc(current)
+
+        rule = {**current, **update_dict}
+        _validate_schedule(rule)
+        resuming = update_dict.get("active") and not current.get("active")
+        if resuming or any(field in update_dict for field in SCHEDULE_FIELDS):
+            after = rule.get("last_occurrence")
+            if resuming:
+                now = datetime.utcnow()
+                after = max(after, now) if after else now
+            update_dict["next_run"] = next_occurrence(rule, after)
+            if update_dict["next_run"] is None:
+                update_dict["active"] = False
+        update_dict["updated_at"] = datetime.utcnow()
+
+        updated = self.collection.find_one_and_update(
+            {"_id": current["_id"], "user_id": user_id},
+            {"$set": update_dict},
+            return_document=ReturnDocument.AFTER
+        )
+        return rule_from_doc(updated) if updated else None
+
+    async def delete_rule(self, rule_id: str, user_id: str) -> bool:
+        """Delete a recurring rule; expenses it already created are kept"""
+        result = self.collection.delete_one({"_id": ObjectId(rule_id), "user_id": user_id})
+        return result.deleted_count > 0
+
+
+recurring_rule_service = RecurringRuleService()
@@ -1,8 +1,11 @@
 from typing import Optional, Dict, Any
 from datetime import datetime
+from app.core.cache import get_cache, get_shared_cache
+from app.core.config import settings
 from app.core.database import get_database
 from app.utils.objectid import convert_object_id, prepare_mongo_doc
 from app.core.security import get_password_hash, verify_password
+from app.core.tracing import current_span
 from app.schemas.user import UserCreate, UserInDB
 
 
@@ -18,6 +21,7 @@ class UserService:
             "email": user_data.email,
             "hashed_password": get_password_hash(user_data.password),
             "full_name": user_data.full_name,
+            "base_currency": user_data.base_currency or settings.DEFAULT_CURRENCY,
             "is_active": True,
             "created_at": datetime.utcnow()
         }
@@ -31,6 +35,26 @@ class UserService:
         user = self.collection.find_one({"email": email})
         return convert_object_id(user) if user else None
     
+    async def get_user_for_auth(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email for request authentication, served from the shared cache"""
+        cache = get_shared_cache()
+        key = f"user:email:{email}"
+        user = cache.get(key)
+        span = current_span()
+        if span is not None:
+            span.set_attribute("cache.hit", user is not None)
+        if user is None:
+            user = self.collection.find_one({"email": email}, {"hashed_password": 0})
+            if user is None:
+                return None
+            user = convert_object_id(user)
+            cache.set(key, user, ttl=settings.USER_CACHE_TTL)
+        return user
+    
+    def invalidate_cached_user(self, email: str) -> None:
+        """Drop a user from the shared auth cache"""
+        get_cache().delete(f"user:email:{email}")
+    
     async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         from bson import ObjectId
@@ -55,7 +79,10 @@ class UserService:
         )
         
         if result.modified_count:
-            return await self.get_user_by_id(user_id)
+            updated_user = await self.get_user_by_id(user_id)
+            if updated_user:
+                self.invalidate_cached_user(updated_user["email"])
+            return updated_user
         return None
 
 
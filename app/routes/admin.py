@@ -0,0 +1,87 @@
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import PlainTextResponse
+from app.core.auth import get_current_admin
+from app.schemas.profile import (
+    ProfileTriggerCreate, ProfileTriggerResponse, RequestProfileResponse, RouteProfileResponse
+)
+from app.services.profiling import profile_service
+from app.utils.exceptions import NotFoundException
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/profiles", response_model=List[RequestProfileResponse])
+def list_profiles(
+    limit: int = Query(50, ge=1, le=200, description="Max number of profiles to return"),
+    current_admin: Dict[str, Any] = Depends(get_current_admin)
+):
+    """Stored request profiles, newest first"""
+    return [RequestProfileResponse(**profile) for profile in profile_service.list_profiles(limit)]
+
+
+@router.get("/profiles/routes", response_model=List[RouteProfileResponse])
+def list_route_profiles(current_admin: Dict[str, Any] = Depends(get_current_admin)):
+    """Routes sampled by the route profiler, most sampled first"""
+    return [RouteProfileResponse(**route) for route in profile_service.route_summaries()]
+
+
+@router.get("/profiles/routes/stacks", response_class=PlainTextResponse)
+def get_route_stacks(
+    route: str = Query(..., description="Route template, e.g. /api/v1/reports/weekly"),
+    current_admin: Dict[str, Any] = Depends(get_current_admin)
+):
+    """Sampled stacks of a route in folded format, for flamegraph.pl or speedscope"""
+    stacks = profile_service.route_stacks(route)
+    if stacks is None:
+        raise NotFoundException("Route profile")
+    return stacks
+
+
+@router.delete("/profiles/routes", status_code=status.HTTP_204_NO_CONTENT)
+def reset_route_profiles(
+    route: Optional[str] = Query(None, description="Only reset this route"),
+    current_admin: Dict[str, Any] = Depends(get_current_admin)
+):
+    """Discard sampled route stacks, e.g. after deploying a fix"""
+    profile_service.reset_route_stacks(route)
+
+
+@router.get("/profiles/triggers", response_model=List[ProfileTriggerResponse])
+def list_profile_triggers(current_admin: Dict[str, Any] = Depends(get_current_admin)):
+    """Armed profiling triggers"""
+    return [ProfileTriggerResponse(**trigger) for trigger in profile_service.list_triggers()]
+
+
+@router.post("/profiles/triggers", response_model=ProfileTriggerResponse, status_code=status.HTTP_201_CREATED)
+def create_profile_trigger(
+    trigger: ProfileTriggerCreate,
+    current_admin: Dict[str, Any] = Depends(get_current_admin)
+):
+    """Profile a user's next requests, as they make them"""
+    created = profile_service.create_trigger(
+        trigger.email, trigger.path_prefix, trigger.count, trigger.ttl_minutes, current_admin["email"]
+    )
+    return ProfileTriggerResponse(**created)
+
+
+@router.delete("/profiles/triggers/{trigger_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_profile_trigger(
+    trigger_id: str,
+    current_admin: Dict[str, Any] = Depends(get_current_admin)
+):
+    """Disarm a profiling trigger"""
+    if not profile_service.delete_trigger(trigger_id):
+        raise NotFoundException("Profiling trigger")
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile(
+    profile_id: str,
+    current_admin: Dict[str, Any] = Depends(get_current_admin)
+):
+    """A request profile's stacks in folded format, for flamegraph.pl or speedscope"""
+    profile = profile_service.get_profile(profile_id)
+    if profile is None:
+        raise NotFoundException("Profile")
+    return profile["stacks"]
@@ -0,0 +1,52 @@
+from typing import Dict, Any, List
+from fastapi import APIRouter, Depends, Query, status
+from app.core.auth import get_current_user
+from app.schemas.budget import BudgetSet, BudgetResponse, BudgetAlertResponse
+from app.schemas.expense import ExpenseType
+from app.models.budget import budget_service
+from app.utils.exceptions import NotFoundException
+
+router = APIRouter(prefix="/budgets", tags=["Budgets"])
+
+
+@router.get("/", response_model=List[BudgetResponse])
+async def get_budgets(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Get user's budgets with this month's spending"""
+    budgets = await budget_service.get_budgets(current_user["id"])
+    return [BudgetResponse(**budget) for budget in budgets]
+
+
+@router.get("/alerts", response_model=List[BudgetAlertResponse])
+async def get_budget_alerts(
+    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    limit: int = Query(20, ge=1, le=100, description="Max number of records to return"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get alerts raised when spending crossed a budget threshold, newest first"""
+    alerts = await budget_service.get_alerts(current_user["id"], skip=skip, limit=limit)
+    return [BudgetAlertResponse(**alert) for alert in alerts]
+
+
+@router.put("/{category}", response_model=BudgetResponse)
+async def set_budget(
+    category: ExpenseType,
+    budget_data: BudgetSet,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Create or replace the monthly budget of a category"""
+    budget = await budget_service.set_budget(
+        current_user["id"], category.value, budget_data.amount, budget_data.thresholds
+    )
+    return BudgetResponse(**budget)
+
+
+@router.delete("/{category}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_budget(
+    category: ExpenseType,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Delete the budget of a category"""
+    deleted = await budget_service.delete_budget(current_user["id"], category.value)
+    if not deleted:
+        raise NotFoundException("Budget")
+    return None
@@ -1,12 +1,20 @@
+import json
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, Query, status
-from datetime import datetime
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta
 from app.core.auth import get_current_user
+from app.core.config import settings
+from app.middleware.compression import no_compression
 from app.schemas.expense import (
     ExpenseCreate, ExpenseUpdate, ExpenseResponse, 
-    ExpenseList, ExpenseType
+    ExpenseList, ExpenseType, ExpenseChanges, ExpenseSearchResults, AnomalyReport,
+    ExpenseBatchIds, ExpenseBatchUpdate, ExpenseBatchResult, ExpenseBatchResults
 )
 from app.models.expense import expense_service
+from app.models.idempotency import idempotency_service, request_fingerprint
+from app.services.anomalies import detect
+from app.services.events import get_event_broker
 from app.utils.exceptions import BadRequestException, NotFoundException
 from bson import ObjectId
 
@@ -16,13 +24,36 @@ router = APIRouter(prefix="/expenses", tags=["Expenses"])
 @router.post("/", response_model=ExpenseResponse, status_code=status.HTTP_201_CREATED)
 async def create_expense(
     expense_data: ExpenseCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, max_length=255, description="Client-generated key that makes retries safe"
+    ),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Create a new expense"""
-    created_expense = await expense_service.create_expense(
-        user_id=current_user["id"],
-        expense_data=expense_data
-    )
+    """Create a new expense. Retries with the same Idempotency-Key return the original expense."""
+    if not idempotency_key:
+        created_expense = await expense_service.create_expense(
+            user_id=current_user["id"],
+            expense_data=expense_data
+        )
+        return ExpenseResponse(**created_expense)
+    
+    fingerprint = request_fingerprint(expense_data.model_dump_json())
+    token, stored = await idempotency_service.claim(current_user["id"], idempotency_key, fingerprint)
+    if stored is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return ExpenseResponse(**stored)
+    
+    try:
+        created_expense = await expense_service.create_expense(
+            user_id=current_user["id"],
+            expense_data=expense_data
+        )
+    except Exception:
+        await idempotency_service.release(current_user["id"], idempotency_key, token)
+        raise
+    
+    await idempotency_service.complete(current_user["id"], idempotency_key, token, created_expense)
     return ExpenseResponse(**created_expense)
 
 
@@ -53,6 +84,151 @@ async def get_expenses(
     )
 
 
+@router.get("/search", response_model=ExpenseSearchResults)
+async def search_expenses(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in descriptions; the last may be partial"),
+    limit: int = Query(20, ge=1, le=100, description="Max number of results to return"),
+    cursor: Optional[str] = Query(None, description="Cursor returned by the previous page"),
+    category: Optional[ExpenseType] = Query(None, description="Filter by category"),
+    start_date: Optional[datetime] = Query(None, description="Filter by start date"),
+    end_date: Optional[datetime] = Query(None, description="Filter by end date"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Search user's expenses by description, best matches first"""
+    results = await expense_service.search_expenses(
+        user_id=current_user["id"],
+        q=q,
+        limit=limit,
+        cursor=cursor,
+        category=category,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    return ExpenseSearchResults(
+        expenses=[ExpenseResponse(**expense) for expense in results["expenses"]],
+        next_cursor=results["next_cursor"]
+    )
+
+
+@router.get("/anomalies", response_model=AnomalyReport)
+def get_expense_anomalies(
+    days: int = Query(365, ge=1, le=3650, description="How much history to analyse"),
+    window_days: int = Query(3, ge=0, le=30, description="Max days between duplicates"),
+    z_threshold: float = Query(3.0, gt=0, description="Z-score above which an expense is unusual"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Find likely duplicate expenses and unusually large expenses per category"""
+    return AnomalyReport(**detect(
+        current_user["id"],
+        start_date=datetime.utcnow() - timedelta(days=days),
+        window_days=window_days,
+        z_threshold=z_threshold
+    ))
+
+
+@router.get("/changes", response_model=ExpenseChanges)
+async def get_expense_changes(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous sync (0 for a full sync)"),
+    limit: int = Query(500, ge=1, le=1000, description="Max number of changes to return"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get expenses inserted, updated or deleted since the given sync cursor"""
+    changes = await expense_service.get_changes(
+        user_id=current_user["id"],
+        since=since,
+        limit=limit
+    )
+    
+    return ExpenseChanges(
+        changes=[ExpenseResponse(**expense) for expense in changes["changes"]],
+        deleted=changes["deleted"],
+        cursor=changes["cursor"],
+        has_more=changes["has_more"]
+    )
+
+
+def _parse_batch_ids(ids: List[str]):
+    """Split requested ids into unique valid ObjectIds and error results for invalid ones"""
+    valid, errors = {}, {}
+    for expense_id in ids:
+        if ObjectId.is_valid(expense_id):
+            valid.setdefault(expense_id, ObjectId(expense_id))
+        else:
+            errors[expense_id] = ExpenseBatchResult(
+                id=expense_id, status=status.HTTP_400_BAD_REQUEST, error="Invalid expense ID format"
+            )
+    return valid, errors
+
+
+def _batch_results(ids: List[str], errors: Dict[str, ExpenseBatchResult], results: Dict[str, ExpenseBatchResult]) -> ExpenseBatchResults:
+    """One result per requested id, in request order"""
+    ordered = {}
+    for expense_id in ids:
+        ordered.setdefault(expense_id, errors.get(expense_id) or results[expense_id])
+    return ExpenseBatchResults(results=list(ordered.values()))
+
+
+def _not_found(expense_id: str) -> ExpenseBatchResult:
+    return ExpenseBatchResult(id=expense_id, status=status.HTTP_404_NOT_FOUND, error="Expense not found")
+
+
+@router.post("/batch-get", response_model=ExpenseBatchResults)
+async def batch_get_expenses(
+    batch: ExpenseBatchIds,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get several expenses by ID, with a result per ID"""
+    valid, errors = _parse_batch_ids(batch.ids)
+    found = await expense_service.get_expenses_by_ids(current_user["id"], list(valid.values())) if valid else {}
+    results = {
+        expense_id: ExpenseBatchResult(id=expense_id, status=status.HTTP_200_OK, expense=ExpenseResponse(**found[object_id]))
+        if object_id in found else _not_found(expense_id)
+        for expense_id, object_id in valid.items()
+    }
+    return _batch_results(batch.ids, errors, results)
+
+
+@router.patch("/batch", response_model=ExpenseBatchResults)
+async def batch_update_expenses(
+    batch: ExpenseBatchUpdate,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Update several expenses, each with its own changes, with a result per ID"""
+    ids = [item.id for item in batch.items]
+    if len(set(ids)) != len(ids):
+        raise BadRequestException("Each expense may appear only once in a batch")
+    
+    valid, errors = _parse_batch_ids(ids)
+    updates = {
+        valid[item.id]: ExpenseUpdate(**item.model_dump(exclude={"id"}, exclude_unset=True))
+        for item in batch.items if item.id in valid
+    }
+    updated = await expense_service.update_expenses(current_user["id"], updates) if updates else {}
+    results = {
+        expense_id: ExpenseBatchResult(id=expense_id, status=status.HTTP_200_OK, expense=ExpenseResponse(**updated[object_id]))
+        if updated.get(object_id) else _not_found(expense_id)
+        for expense_id, object_id in valid.items()
+    }
+    return _batch_results(ids, errors, results)
+
+
+@router.post("/batch-delete", response_model=ExpenseBatchResults)
+async def batch_delete_expenses(
+    batch: ExpenseBatchIds,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Delete several expenses, with a result per ID"""
+    valid, errors = _parse_batch_ids(batch.ids)
+    deleted = await expense_service.delete_expenses(current_user["id"], list(valid.values())) if valid else {}
+    results = {
+        expense_id: ExpenseBatchResult(id=expense_id, status=status.HTTP_204_NO_CONTENT)
+        if deleted[object_id] else _not_found(expense_id)
+        for expense_id, object_id in valid.items()
+    }
+    return _batch_results(batch.ids, errors, results)
+
+
 @router.get("/{expense_id}", response_model=ExpenseResponse)
 async def get_expense(
     expense_id: str,
@@ -120,32 +296,62 @@ async def get_expense_summary(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Get expense summary statistics"""
-    total_amount = await expense_service.get_total_amount(current_user["id"])
-    total_count = await expense_service.get_expense_count(current_user["id"])
-    
-    # Get category breakdown
-    pipeline = [
-        {"$match": {"user_id": current_user["id"]}},
-        {"$group": {
-            "_id": "$category",
-            "total": {"$sum": "$amount"},
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"total": -1}}
-    ]
-    
-    category_stats = list(expense_service.collection.aggregate(pipeline))
-    
-    return {
-        "total_amount": total_amount,
-        "total_expenses": total_count,
-        "average_expense": total_amount / total_count if total_count > 0 else 0,
-        "categories": {
-            stat["_id"]: {
-                "total": stat["total"],
-                "count": stat["count"],
-                "percentage": (stat["total"] / total_amount * 100) if total_amount > 0 else 0
-            }
-            for stat in category_stats
-        }
-    }
\ No newline at end of file
+    return await expense_service.get_summary(current_user["id"])
+
+
+@router.get("/stats/stream")
+@no_compression
+async def stream_expense_summary(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Server-sent events with live summary totals.
+    
+    Sends a `snapshot` event (the same body as /stats/summary) on connect, then
+    a `delta` event with the change in totals after every write, and a comment
+    line as heartbeat when idle. A client too slow to keep up gets a new
+    `snapshot` instead of the deltas it missed. Snapshots and deltas carry the
+    `seq` of the last write they include; deltas at or below the snapshot's
+    seq are already in it and are not sent.
+    """
+    user_id = current_user["id"]
+    
+    def format_event(event_type: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+        lines = [f"event: {event_type}"]
+        if event_id:
+            lines.append(f"id: {event_id}")
+        lines.append(f"data: {json.dumps(data)}")
+        return "\n".join(lines) + "\n\n"
+    
+    async def events():
+        subscription = None
+        try:
+            # Subscribed before the snapshot is read, so no write falls in between
+            subscription = get_event_broker().subscribe(user_id)
+            snapshot = await expense_service.get_summary_snapshot(user_id)
+            yield format_event("snapshot", snapshot)
+            while True:
+                event = await subscription.get(settings.SSE_HEARTBEAT_SECONDS)
+                if subscription.lagging:
+                    # Deltas were dropped; start over from current totals
+                    subscription.lagging = False
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    snapshot = await expense_service.get_summary_snapshot(user_id)
+                    yield format_event("snapshot", snapshot)
+                elif event is None:
+                    yield ": heartbeat\n\n"
+                elif event.get("seq") is not None and event["seq"] <= snapshot["seq"]:
+                    continue
+                else:
+                    event = dict(event)
+                    yield format_event(event.pop("type"), event, event.pop("id", None))
+        finally:
+            if subscription is not None:
+                get_event_broker().unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,85 @@
+from typing import Dict, Any
+from fastapi import APIRouter, Depends, Query, status
+from app.core.auth import get_current_user
+from app.schemas.recurring import (
+    RecurringRuleCreate, RecurringRuleUpdate, RecurringRuleResponse, RecurringRuleList
+)
+from app.models.recurring import recurring_rule_service
+from app.utils.exceptions import BadRequestException, NotFoundException
+from bson import ObjectId
+
+router = APIRouter(prefix="/recurring-expenses", tags=["Recurring Expenses"])
+
+
+@router.post("/", response_model=RecurringRuleResponse, status_code=status.HTTP_201_CREATED)
+async def create_recurring_rule(
+    rule_data: RecurringRuleCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Create a recurring expense rule; due occurrences are added as expenses automatically"""
+    rule = await recurring_rule_service.create_rule(current_user["id"], rule_data)
+    return RecurringRuleResponse(**rule)
+
+
+@router.get("/", response_model=RecurringRuleList)
+async def get_recurring_rules(
+    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    limit: int = Query(10, ge=1, le=100, description="Max number of records to return"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get user's recurring expense rules"""
+    rules = await recurring_rule_service.get_user_rules(current_user["id"], skip=skip, limit=limit)
+    total = await recurring_rule_service.get_rule_count(current_user["id"])
+    return RecurringRuleList(
+        rules=[RecurringRuleResponse(**rule) for rule in rules],
+        total=total
+    )
+
+
+@router.get("/{rule_id}", response_model=RecurringRuleResponse)
+async def get_recurring_rule(
+    rule_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get a specific recurring expense rule"""
+    if not ObjectId.is_valid(rule_id):
+        raise BadRequestException("Invalid rule ID format")
+
+    rule = await recurring_rule_service.get_rule(rule_id, current_user["id"])
+    if not rule:
+        raise NotFoundException("Recurring rule")
+
+    return RecurringRuleResponse(**rule)
+
+
+@router.put("/{rule_id}", response_model=RecurringRuleResponse)
+async def update_recurring_rule(
+    rule_id: str,
+    rule_update: RecurringRuleUpdate,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Update a recurring expense rule (set active=false to pause it)"""
+    if not ObjectId.is_valid(rule_id):
+        raise BadRequestException("Invalid rule ID format")
+
+    rule = await recurring_rule_service.update_rule(rule_id, current_user["id"], rule_update)
+    if not rule:
+        raise NotFoundException("Recurring rule")
+
+    return RecurringRuleResponse(**rule)
+
+
+@router.delete("/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_recurring_rule(
+    rule_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Delete a recurring expense rule; expenses it already created are kept"""
+    if not ObjectId.is_valid(rule_id):
+        raise BadRequestException("Invalid rule ID format")
+
+    deleted = await recurring_rule_service.delete_rule(rule_id, current_user["id"])
+    if not deleted:
+        raise NotFoundException("Recurring rule")
+
+    return None
@@ -1,14 +1,28 @@
-from fastapi import APIRouter, Depends, Query, Response
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import FileResponse, StreamingResponse
 from datetime import datetime
 from io import StringIO
 import csv
 from app.core.auth import get_current_user
 from app.core.database import get_database
-from app.schemas.expense import DailyReport, WeeklyReport, MonthlyReport
+from app.middleware.compression import no_compression
+from app.models.expense_store import aggregate_expenses
+from app.schemas.expense import (
+    DailyReport, WeeklyReport, MonthlyReport, SpendingForecast,
+    ExportFormat, ExportJobCreate, ExportJobResponse
+)
+from app.services.forecast import forecast_service
+from app.services.exports import export_manager, parquet_supported, EXTENSIONS, MEDIA_TYPES
 from app.services.reports import get_daily_report, get_weekly_report, get_monthly_report
+from app.utils.money import format_minor
+from app.utils.exceptions import BadRequestException, ConflictException, NotFoundException
+from bson import ObjectId
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+# Rows per chunk of the streamed CSV export
+CSV_STREAM_BATCH = 1000
+
 @router.get("/daily", response_model=DailyReport)
 def daily_report(
     date: datetime = Query(default_factory=datetime.utcnow),
@@ -34,6 +48,14 @@ def monthly_report(
     report = get_monthly_report(current_user["id"], year, month)
     return MonthlyReport(**report)
 
+@router.get("/forecast", response_model=SpendingForecast)
+def spending_forecast(
+    days: int = Query(30, ge=1, le=90, description="Number of days to forecast"),
+    current_user=Depends(get_current_user)
+):
+    forecast = forecast_service.forecast(current_user["id"], days)
+    return SpendingForecast(**forecast)
+
 @router.get("/export/csv")
 def export_csv(
     start_date: datetime = None,
@@ -57,29 +79,90 @@ def export_csv(
             date_query["$lte"] = end_date
         query["date"] = date_query
     
-    expenses = list(db.expenses.find(query).sort("created_at", -1))
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow([
-        "Date", "Amount", "Category", "Description"
-    ])
+    # Sorted on the (user_id, date) index, like the expense list
+    expenses = aggregate_expenses([{"$match": query}, {"$sort": {"date": -1}}])
     
-    for expense in expenses:
+    def rows():
+        # Stream in batches so large exports are neither held in memory nor
+        # compressed in one piece
+        output = StringIO()
+        writer = csv.writer(output)
         writer.writerow([
-            expense["created_at"].strftime("%Y-%m-%d %H:%M:%S"),
-            expense["amount"],
-            expense["category"],
-            expense["description"],
+            "Date", "Amount", "Category", "Description"
         ])
+        for count, expense in enumerate(expenses, 1):
+            writer.writerow([
+                expense["date"].strftime("%Y-%m-%d %H:%M:%S"),
+                format_minor(expense["amount"], expense.get("currency")),
+                expense["category"],
+                expense["description"],
+            ])
+            if count % CSV_STREAM_BATCH == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
     
-    output.seek(0)
-    
-    return Response(
-        content=output.getvalue(),
+    return StreamingResponse(
+        rows(),
         media_type="text/csv",
         headers={
             "Content-Disposition": f"attachment; filename=expenses_{datetime.utcnow().strftime('%Y%m%d')}.csv"
         }
-    )
\ No newline at end of file
+    )
+
+
+@router.post("/exports", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_export(
+    export_request: ExportJobCreate,
+    current_user=Depends(get_current_user)
+):
+    """Start a background export job; poll its status and download it when completed"""
+    if export_request.format == ExportFormat.PARQUET and not parquet_supported():
+        raise BadRequestException("Parquet exports are not available on this server")
+    
+    job = export_manager.create_job(
+        user_id=current_user["id"],
+        export_format=export_request.format.value,
+        start_date=export_request.start_date,
+        end_date=export_request.end_date
+    )
+    return ExportJobResponse(**job)
+
+
+def _get_export_job(job_id: str, user_id: str):
+    if not ObjectId.is_valid(job_id):
+        raise BadRequestException("Invalid export job ID format")
+    job = export_manager.get_job(job_id, user_id)
+    if not job:
+        raise NotFoundException("Export job")
+    return job
+
+
+@router.get("/exports/{job_id}", response_model=ExportJobResponse)
+def get_export(
+    job_id: str,
+    current_user=Depends(get_current_user)
+):
+    """Get the status of an export job"""
+    return ExportJobResponse(**_get_export_job(job_id, current_user["id"]))
+
+
+@router.get("/exports/{job_id}/download")
+@no_compression
+def download_export(
+    job_id: str,
+    current_user=Depends(get_current_user)
+):
+    """Download a completed export. Supports HTTP Range requests for resumable downloads."""
+    job = _get_export_job(job_id, current_user["id"])
+    if job["status"] != "completed":
+        raise ConflictException(f"Export job is {job['status']}")
+    
+    path = export_manager.artifact_path(job)
+    created = job["created_at"].strftime("%Y%m%d")
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[job["format"]],
+        filename=f"expenses_{created}_{job_id}.{EXTENSIONS[job['format']]}"
+    )
@@ -0,0 +1,34 @@
+from typing import Optional, List
+from datetime import datetime
+from pydantic import BaseModel, Field
+from app.schemas.expense import ExpenseType
+
+
+class BudgetSet(BaseModel):
+    amount: float = Field(..., gt=0, description="Monthly spending limit for the category")
+    thresholds: List[float] = Field(
+        default_factory=lambda: [0.8, 1.0],
+        description="Fractions of the limit that trigger an alert when crossed"
+    )
+
+
+class BudgetResponse(BaseModel):
+    category: ExpenseType
+    amount: float
+    thresholds: List[float]
+    month: str
+    spent: float
+    remaining: float
+    percent_used: float
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+
+class BudgetAlertResponse(BaseModel):
+    id: str
+    category: ExpenseType
+    month: str
+    threshold: float
+    spent: float
+    limit: float
+    created_at: datetime
@@ -1,7 +1,8 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, model_validator
 from enum import Enum
+from app.core.config import settings
 
 
 class ExpenseType(str, Enum):
@@ -21,19 +22,33 @@ class ExpenseBase(BaseModel):
     date: datetime
 
 
+# ISO 4217 alphabetic code
+CURRENCY_PATTERN = r"^[A-Z]{3}$"
+
+
 class ExpenseCreate(ExpenseBase):
-    pass
+    currency: Optional[str] = Field(
+        None, pattern=CURRENCY_PATTERN, description="ISO 4217 code; defaults to your base currency"
+    )
 
 
 class ExpenseUpdate(BaseModel):
-    amount: Optional[float] = Field(None, gt=0)
+    amount: Optional[float] = Field(None, gt=0, description="In the expense's currency, or in `currency` if given")
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)
     category: Optional[ExpenseType] = None
     description: Optional[str] = Field(None, min_length=1, max_length=500)
     date: Optional[datetime] = None
+    
+    @model_validator(mode="after")
+    def currency_with_amount(self):
+        if self.currency is not None and self.amount is None:
+            raise ValueError("currency can only be changed together with amount")
+        return self
 
 
 class ExpenseResponse(ExpenseBase):
     id: str
+    currency: str = settings.DEFAULT_CURRENCY
     user_id: str
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -46,11 +61,74 @@ class ExpenseList(BaseModel):
     expenses: List[ExpenseResponse]
     total: int
 
+
+class ExpenseSearchResults(BaseModel):
+    expenses: List[ExpenseResponse]
+    next_cursor: Optional[str] = None
+
+
+class ExpenseBatchIds(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=settings.BATCH_MAX_IDS)
+
+
+class ExpenseBatchUpdateItem(ExpenseUpdate):
+    id: str
+
+
+class ExpenseBatchUpdate(BaseModel):
+    items: List[ExpenseBatchUpdateItem] = Field(..., min_length=1, max_length=settings.BATCH_MAX_IDS)
+
+
+class ExpenseBatchResult(BaseModel):
+    id: str
+    status: int
+    expense: Optional[ExpenseResponse] = None
+    error: Optional[str] = None
+
+
+class ExpenseBatchResults(BaseModel):
+    results: List[ExpenseBatchResult]
+
+
+class FlaggedExpense(BaseModel):
+    id: str
+    amount: float
+    category: ExpenseType
+    date: datetime
+    description: str
+
+
+class DuplicateGroup(BaseModel):
+    expenses: List[FlaggedExpense]
+
+
+class ExpenseAnomaly(BaseModel):
+    expense: FlaggedExpense
+    z_score: float
+    category_mean: float
+    upper_fence: float
+
+
+class AnomalyReport(BaseModel):
+    duplicates: List[DuplicateGroup]
+    anomalies: List[ExpenseAnomaly]
+    currency: Optional[str] = None
+
+
+class ExpenseChanges(BaseModel):
+    changes: List[ExpenseResponse]
+    deleted: List[str]
+    cursor: int
+    has_more: bool
+
 class DailyReport(BaseModel):
     date: str
     total_amount: float
     expenses_count: int
     categories: dict
+    currency: Optional[str] = None
+    # Totals in currencies without FX rates, left out of the totals above
+    unconverted: Dict[str, float] = Field(default_factory=dict)
 
 class WeeklyReport(BaseModel):
     week_start: str
@@ -59,6 +137,8 @@ class WeeklyReport(BaseModel):
     expenses_count: int
     daily_breakdown: List[DailyReport]
     categories: dict
+    currency: Optional[str] = None
+    unconverted: Dict[str, float] = Field(default_factory=dict)
 
 class MonthlyReport(BaseModel):
     month: str
@@ -67,6 +147,43 @@ class MonthlyReport(BaseModel):
     expenses_count: int
     categories: dict
     daily_average: float
+    currency: Optional[str] = None
+    unconverted: Dict[str, float] = Field(default_factory=dict)
+
+class ForecastPoint(BaseModel):
+    date: str
+    amount: float
+
+class SpendingForecast(BaseModel):
+    method: str
+    horizon_days: int
+    daily: List[ForecastPoint]
+    total: float
+    baseline_total: float
+    month_to_date: float
+    projected_month_total: float
+    currency: Optional[str] = None
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+class ExportJobCreate(BaseModel):
+    format: ExportFormat = ExportFormat.CSV
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+class ExportJobResponse(BaseModel):
+    id: str
+    format: ExportFormat
+    status: str
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    rows_written: int
+    size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
 
 class ExpenseInsightsRequest(BaseModel):
     period: str = "month"  # "week", "month", "quarter", "year"
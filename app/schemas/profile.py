@@ -0,0 +1,40 @@
+from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field
+
+
+class ProfileTriggerCreate(BaseModel):
+    email: EmailStr = Field(..., description="User whose next requests are profiled")
+    path_prefix: str = Field("/api/v1/", description="Only requests under this path are profiled")
+    count: int = Field(1, ge=1, le=20, description="Number of requests to profile")
+    ttl_minutes: int = Field(60, ge=1, le=1440, description="Minutes the trigger stays armed")
+
+
+class ProfileTriggerResponse(BaseModel):
+    id: str
+    email: str
+    path_prefix: str
+    remaining: int
+    created_by: str
+    created_at: datetime
+    expires_at: datetime
+
+
+class RequestProfileResponse(BaseModel):
+    id: str
+    method: str
+    path: str
+    route: Optional[str] = None
+    status_code: Optional[int] = None
+    user_email: str
+    requested_by: str
+    duration_ms: float
+    interval_ms: float
+    samples: int
+    created_at: datetime
+
+
+class RouteProfileResponse(BaseModel):
+    route: str
+    samples: int
+    updated_at: datetime
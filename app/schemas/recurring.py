@@ -0,0 +1,64 @@
+from typing import Optional, List
+from datetime import datetime
+from pydantic import BaseModel, Field, ConfigDict
+from enum import Enum
+from app.schemas.expense import ExpenseType
+
+
+class RecurrenceFrequency(str, Enum):
+    DAILY = "DAILY"
+    WEEKLY = "WEEKLY"
+    MONTHLY = "MONTHLY"
+    YEARLY = "YEARLY"
+
+
+class RecurringRuleBase(BaseModel):
+    amount: float = Field(..., gt=0, description="Amount of each occurrence")
+    category: ExpenseType
+    description: str = Field(..., min_length=1, max_length=500)
+    frequency: RecurrenceFrequency
+    interval: int = Field(1, ge=1, le=365, description="Repeat every `interval` periods")
+    by_weekday: Optional[List[int]] = Field(
+        None, description="WEEKLY only: weekdays to repeat on (0 = Monday ... 6 = Sunday)"
+    )
+    by_month_day: Optional[int] = Field(
+        None, ge=-1, le=31,
+        description="MONTHLY only: day of the month (-1 = last day); clamped to short months"
+    )
+    start_date: datetime = Field(..., description="First occurrence (its time of day is kept)")
+    until: Optional[datetime] = Field(None, description="No occurrences after this date")
+    count: Optional[int] = Field(None, ge=1, description="Total number of occurrences")
+
+
+class RecurringRuleCreate(RecurringRuleBase):
+    pass
+
+
+class RecurringRuleUpdate(BaseModel):
+    amount: Optional[float] = Field(None, gt=0)
+    category: Optional[ExpenseType] = None
+    description: Optional[str] = Field(None, min_length=1, max_length=500)
+    frequency: Optional[RecurrenceFrequency] = None
+    interval: Optional[int] = Field(None, ge=1, le=365)
+    by_weekday: Optional[List[int]] = None
+    by_month_day: Optional[int] = Field(None, ge=-1, le=31)
+    until: Optional[datetime] = None
+    count: Optional[int] = Field(None, ge=1)
+    active: Optional[bool] = None
+
+
+class RecurringRuleResponse(RecurringRuleBase):
+    id: str
+    user_id: str
+    active: bool
+    next_run: Optional[datetime] = None
+    last_occurrence: Optional[datetime] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class RecurringRuleList(BaseModel):
+    rules: List[RecurringRuleResponse]
+    total: int
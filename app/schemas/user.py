@@ -1,6 +1,7 @@
 from typing import Optional
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
 from datetime import datetime
+from app.core.config import settings
 
 
 class UserBase(BaseModel):
@@ -10,6 +11,9 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     password: str = Field(..., min_length=8)
+    base_currency: Optional[str] = Field(
+        None, pattern=r"^[A-Z]{3}$", description="ISO 4217 code reports are expressed in; defaults to the server's"
+    )
 
 
 class UserLogin(BaseModel):
@@ -20,6 +24,7 @@ class UserLogin(BaseModel):
 class UserResponse(UserBase):
     id: str
     is_active: bool = True
+    base_currency: str = settings.DEFAULT_CURRENCY
     created_at: datetime
     
     model_config = ConfigDict(from_attributes=True)
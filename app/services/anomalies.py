@@ -0,0 +1,182 @@
+"""
+Duplicate and anomaly detection over a user's expense history.
+
+A user's expenses are loaded once as NumPy columns and every check runs as
+array operations, so the cost per user is a sort and a few passes over the
+arrays rather than Python work per expense.
+
+- Duplicates: expenses with the same amount in the same currency and the
+  same normalized description (case, punctuation and word order ignored)
+  within a few days of each other, typically from a repeated import or a
+  retried submission.
+- Anomalies: expenses unusually large for their category, by z-score
+  against the category mean or above the category's upper IQR fence
+  (Q3 + 1.5 * IQR), compared in the user's base currency.
+
+Amounts are reported in the base currency; expenses in currencies without
+FX rates are left out.
+"""
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.models.expense_store import aggregate_expenses
+from app.services.fx import get_base_currency, to_base
+from app.utils.money import from_minor, to_minor
+from app.utils.search import tokenize
+
+# Categories with fewer expenses than this have no meaningful spread
+MIN_CATEGORY_SIZE = 8
+
+
+def description_hash(description: str) -> int:
+    """Stable hash of a description that ignores case, punctuation and word order"""
+    return zlib.crc32(" ".join(sorted(tokenize(description or ""))).encode())
+
+
+def load_expense_columns(user_id: str, start_date: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """
+    Load a user's expenses as column arrays, in date order. `amount` is in
+    minor units of the base currency; `source_amount` and `currency` are
+    the amount as entered and a code for its currency.
+    """
+    match: Dict[str, Any] = {"user_id": user_id}
+    if start_date:
+        match["date"] = {"$gte": start_date}
+    rows = list(aggregate_expenses([
+        {"$match": match},
+        {"$sort": {"date": 1}},
+        {"$project": {
+            "amount": 1, "currency": 1, "base_amount": 1, "date": 1, "category": 1, "description": 1
+        }}
+    ]))
+
+    # Legacy float amounts are in major units (of the base currency, as they
+    # predate currencies); everything else is minor units
+    base = get_base_currency(user_id)
+    for row in rows:
+        if isinstance(row["amount"], float):
+            row["amount"] = to_minor(row["amount"], base)
+        row["source_amount"] = row["amount"]
+        row["source_currency"] = row.get("currency") or base
+    rows = to_base(user_id, rows)
+    _, currency_codes = np.unique(
+        np.array([row["source_currency"] for row in rows], dtype=object), return_inverse=True
+    )
+    categories, category_codes = np.unique(
+        np.array([row["category"] for row in rows], dtype=object), return_inverse=True
+    )
+    return {
+        "id": np.array([str(row["_id"]) for row in rows], dtype=object),
+        "amount": np.array([row["amount"] for row in rows], dtype=np.int64),
+        "source_amount": np.array([row["source_amount"] for row in rows], dtype=np.int64),
+        "currency": currency_codes.astype(np.int64),
+        "date": np.array([row["date"] for row in rows], dtype="datetime64[s]"),
+        "category": category_codes.astype(np.int64),
+        "categories": categories,
+        "description": np.array([row.get("description") or "" for row in rows], dtype=object),
+        "description_hash": np.array(
+            [description_hash(row.get("description")) for row in rows], dtype=np.int64
+        )
+    }
+
+
+def find_duplicates(columns: Dict[str, np.ndarray], window_days: int = 3) -> List[np.ndarray]:
+    """Groups of row indices that look like the same expense entered more than once"""
+    if len(columns["amount"]) < 2:
+        return []
+
+    # Sort so candidate duplicates are adjacent: by description, amount as
+    # entered (converted amounts differ from day to day), then date
+    order = np.lexsort((
+        columns["date"], columns["source_amount"], columns["currency"], columns["description_hash"]
+    ))
+    hashes = columns["description_hash"][order]
+    currencies = columns["currency"][order]
+    amounts = columns["source_amount"][order]
+    dates = columns["date"][order]
+
+    window = np.timedelta64(window_days, "D")
+    linked = (
+        (hashes[1:] == hashes[:-1])
+        & (currencies[1:] == currencies[:-1])
+        & (amounts[1:] == amounts[:-1])
+        & (dates[1:] - dates[:-1] <= window)
+    )
+    if not linked.any():
+        return []
+
+    # Runs of linked neighbours form one group
+    group_ids = np.concatenate(([0], np.cumsum(~linked)))
+    in_group = np.concatenate(([False], linked)) | np.concatenate((linked, [False]))
+    members = order[in_group]
+    member_groups = group_ids[in_group]
+    boundaries = np.flatnonzero(np.diff(member_groups)) + 1
+    return np.split(members, boundaries)
+
+
+def score_anomalies(columns: Dict[str, np.ndarray], z_threshold: float = 3.0) -> Dict[str, np.ndarray]:
+    """Per-row z-score within its category, the category's upper IQR fence and an anomaly flag"""
+    amounts = columns["amount"].astype(np.float64)
+    codes = columns["category"]
+    size = len(columns["categories"])
+
+    counts = np.bincount(codes, minlength=size)
+    sums = np.bincount(codes, weights=amounts, minlength=size)
+    squares = np.bincount(codes, weights=amounts ** 2, minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = sums / counts
+        stds = np.sqrt(np.maximum(squares / counts - means ** 2, 0))
+        z_scores = (amounts - means[codes]) / stds[codes]
+    z_scores = np.nan_to_num(z_scores, nan=0.0, posinf=0.0, neginf=0.0)
+
+    fences = np.full(size, np.inf)
+    for code in np.flatnonzero(counts >= MIN_CATEGORY_SIZE):
+        q1, q3 = np.percentile(amounts[codes == code], [25, 75])
+        fences[code] = q3 + 1.5 * (q3 - q1)
+    row_fences = fences[codes]
+
+    large_enough = counts[codes] >= MIN_CATEGORY_SIZE
+    flagged = large_enough & ((z_scores > z_threshold) | (amounts > row_fences))
+    return {"z_score": z_scores, "mean": means[codes], "fence": row_fences, "flagged": flagged}
+
+
+def detect(
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    window_days: int = 3,
+    z_threshold: float = 3.0
+) -> Dict[str, Any]:
+    """Find duplicate groups and anomalous expenses of a user"""
+    columns = load_expense_columns(user_id, start_date)
+    currency = get_base_currency(user_id)
+    if not len(columns["amount"]):
+        return {"duplicates": [], "anomalies": [], "currency": currency}
+
+    def expense(index: int) -> Dict[str, Any]:
+        return {
+            "id": columns["id"][index],
+            "amount": from_minor(int(columns["amount"][index]), currency),
+            "category": columns["categories"][columns["category"][index]],
+            "date": columns["date"][index].astype(datetime),
+            "description": columns["description"][index]
+        }
+
+    duplicates = [
+        {"expenses": [expense(index) for index in group]}
+        for group in find_duplicates(columns, window_days)
+    ]
+
+    scores = score_anomalies(columns, z_threshold)
+    flagged = np.flatnonzero(scores["flagged"])
+    flagged = flagged[np.argsort(-scores["z_score"][flagged])]
+    anomalies = [
+        {
+            "expense": expense(index),
+            "z_score": round(float(scores["z_score"][index]), 2),
+            "category_mean": from_minor(int(round(scores["mean"][index])), currency),
+            "upper_fence": from_minor(int(round(scores["fence"][index])), currency)
+        }
+        for index in flagged
+    ]
+    return {"duplicates": duplicates, "anomalies": anomalies, "currency": currency}
@@ -0,0 +1,233 @@
+"""
+Hot/cold archival of old expenses.
+
+Expenses dated before the archive cutoff (a month boundary) are moved from
+`expenses` and `expense_buckets` into `expenses_archive`, a zstd-compressed
+collection of flat expense documents. Per-user monthly summaries of the
+archived data are frozen in `expense_monthly_summaries` so reports over old
+months don't need to touch the archive.
+
+Reads include the archive only when their date range starts before the
+cutoff (see app/models/expense_store.py).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+from app.core.cache import get_cache
+from app.core.database import get_database
+from app.core.sharding import user_collection
+from app.models.expense_store import ARCHIVE_COLLECTION, ARCHIVE_CUTOFF_KEY, ARCHIVE_STATE_ID, month_start
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def publish_archive_cutoff(cutoff: datetime) -> None:
+    """Publish the archive cutoff; it only ever moves forward"""
+    get_database().worker_state.update_one(
+        {"_id": ARCHIVE_STATE_ID},
+        {"$max": {"cutoff": cutoff}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    get_cache().delete(ARCHIVE_CUTOFF_KEY)
+
+
+def _write_archive(documents) -> None:
+    """
+    Copy expenses into the archive. A copy left by an interrupted run is
+    replaced unless it has a newer seq, so the archive holds the version
+    that was read and is about to be deleted.
+    """
+    if not documents:
+        return
+    try:
+        get_database().expenses_archive.bulk_write([
+            ReplaceOne({"_id": doc["_id"], "seq": {"$lte": doc.get("seq")}}, doc, upsert=True)
+            for doc in documents
+        ], ordered=False)
+    except BulkWriteError as exc:
+        # A newer copy made the upsert collide with it; it is kept
+        if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+            raise
+
+
+def _refresh_summaries(documents) -> None:
+    """Recompute the summaries of the months of archived expenses"""
+    for user_id, month in {(doc["user_id"], month_start(doc["date"])) for doc in documents}:
+        refresh_monthly_summary(user_id, month)
+
+
+def refresh_monthly_summary(user_id: str, month: datetime) -> None:
+    """Recompute the frozen summary of one user's archived month"""
+    db = get_database()
+    month = month_start(month)
+    pipeline = [
+        {"$match": {"user_id": user_id, "date": {"$gte": month, "$lt": _next_month(month)}}},
+        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+    ]
+    results = list(user_collection(ARCHIVE_COLLECTION).aggregate(pipeline))
+    if not results:
+        db.expense_monthly_summaries.delete_one({"user_id": user_id, "month": month})
+        return
+
+    db.expense_monthly_summaries.update_one(
+        {"user_id": user_id, "month": month},
+        {"$set": {
+            "total": sum(result["total"] for result in results),
+            "count": sum(result["count"] for result in results),
+            "categories": {
+                result["_id"]: {"total": result["total"], "count": result["count"]}
+                for result in results
+            }
+        }},
+        upsert=True
+    )
+
+
+def get_archived_summary(user_id: str, start_month: Optional[datetime] = None, end_month: Optional[datetime] = None) -> Dict[str, Any]:
+    """Frozen totals of a user's archived expenses, per category (months inclusive)"""
+    query: Dict[str, Any] = {"user_id": user_id}
+    if start_month or end_month:
+        query["month"] = {}
+        if start_month:
+            query["month"]["$gte"] = start_month
+        if end_month:
+            query["month"]["$lte"] = end_month
+
+    count = 0
+    total = 0
+    categories: Dict[str, Dict[str, int]] = defaultdict(lambda: {"total": 0, "count": 0})
+    for summary in get_database().expense_monthly_summaries.find(query):
+        count += summary["count"]
+        total += summary["total"]
+        for category, totals in summary["categories"].items():
+            categories[category]["total"] += totals["total"]
+            categories[category]["count"] += totals["count"]
+    return {"count": count, "total": total, "categories": dict(categories)}
+
+
+def restore_expense(user_id: str, expense_id: str) -> bool:
+    """Move an archived expense back to the hot collection so it can be modified"""
+    archive = user_collection(ARCHIVE_COLLECTION)
+    query = {"_id": ObjectId(expense_id), "user_id": user_id}
+    expense = archive.find_one(query)
+    if not expense:
+        return False
+    user_collection("expenses").replace_one(query, expense, upsert=True)
+    archive.delete_one(query)
+    refresh_monthly_summary(user_id, expense["date"])
+    return True
+
+
+def archive_cutoff_for(horizon_days: int) -> datetime:
+    """The month boundary before which expenses are older than the horizon"""
+    return month_start(datetime.utcnow() - timedelta(days=horizon_days))
+
+
+def _drop_stale_copies(ids) -> None:
+    """Remove archived copies of expenses that changed or were deleted while being archived"""
+    if ids:
+        get_database().expenses_archive.delete_many({"_id": {"$in": list(ids)}})
+
+
+def _archive_documents(batch) -> int:
+    """
+    Archive a batch of expense documents; returns how many moved.
+
+    The summaries of the batch's months are refreshed once the copies are
+    written, before the documents are deleted, so a crash never leaves
+    summaries behind the archived data. Each document is deleted only if
+    its seq is still the one that was copied. Documents changed since they
+    were read stay hot, without their stale copy, for the next batch to
+    archive again; the copies of documents deleted meanwhile (which leave a
+    tombstone) are removed.
+    """
+    db = get_database()
+    _write_archive(batch)
+    _refresh_summaries(batch)
+    ids = [doc["_id"] for doc in batch]
+    result = db.expenses.bulk_write(
+        [DeleteOne({"_id": doc["_id"], "user_id": doc["user_id"], "seq": doc.get("seq")}) for doc in batch],
+        ordered=False
+    )
+    if result.deleted_count == len(batch):
+        return len(batch)
+
+    changed = {doc["_id"] for doc in db.expenses.find({"_id": {"$in": ids}}, {"_id": 1})}
+    deleted = {
+        ObjectId(tombstone["expense_id"])
+        for tombstone in db.expense_tombstones.find(
+            {"expense_id": {"$in": [str(expense_id) for expense_id in ids if expense_id not in changed]}},
+            {"expense_id": 1}
+        )
+    }
+    stale = changed | deleted
+    _drop_stale_copies(stale)
+    _refresh_summaries([doc for doc in batch if doc["_id"] in stale])
+    return result.deleted_count
+
+
+def _archive_bucket(bucket) -> bool:
+    """
+    Archive one bucket; returns whether it moved.
+
+    The bucket is deleted only if no expense was added, changed or removed
+    since it was read (its count and max_seq are unchanged). Otherwise its
+    copies are dropped and it is read and archived again.
+    """
+    db = get_database()
+    while bucket is not None:
+        documents = [{**expense, "user_id": bucket["user_id"]} for expense in bucket.get("expenses", [])]
+        _write_archive(documents)
+        _refresh_summaries(documents)
+        result = db.expense_buckets.delete_one({
+            "_id": bucket["_id"], "user_id": bucket["user_id"],
+            "count": bucket.get("count"), "max_seq": bucket.get("max_seq")
+        })
+        if result.deleted_count:
+            return True
+        _drop_stale_copies(document["_id"] for document in documents)
+        _refresh_summaries(documents)
+        bucket = db.expense_buckets.find_one({"_id": bucket["_id"]})
+    return False
+
+
+def archive_expenses(cutoff: datetime, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Move expenses dated before the cutoff into the archive.
+
+    The cutoff must have been published (and cached copies expired) before
+    anything moves, so readers already merge the archive while documents are
+    in flight. Expenses written while they are copied are archived again.
+    Each month's summary is refreshed as its expenses move, so re-running
+    after an interruption is safe.
+    """
+    db = get_database()
+
+    touched: Set[Tuple[str, datetime]] = set()
+    moved_documents = 0
+    while True:
+        batch = list(
+            db.expenses.find({"date": {"$lt": cutoff}}).sort("_id", 1).limit(batch_size)
+        )
+        if not batch:
+            break
+        moved_documents += _archive_documents(batch)
+        touched.update((doc["user_id"], month_start(doc["date"])) for doc in batch)
+        print(f"  {moved_documents} expense documents archived")
+
+    moved_buckets = 0
+    for bucket in db.expense_buckets.find({"month": {"$lt": cutoff}}):
+        if _archive_bucket(bucket):
+            moved_buckets += 1
+        touched.add((bucket["user_id"], bucket["month"]))
+
+    return {
+        "documents": moved_documents,
+        "buckets": moved_buckets,
+        "months_summarized": len(touched)
+    }
@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+from pymongo.errors import OperationFailure, PyMongoError
+from app.core.config import settings
+from app.core.database import get_database
+from app.core.leases import Lease
+from app.services.reports import invalidate_user_reports
+from app.services.rollups import day_start, recompute_daily_rollup, rebuild_user_rollups
+
+logger = logging.getLogger(__name__)
+
+# Server error code for a resume token that has fallen off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+WATCHED_COLLECTIONS = ["expenses", "expense_buckets"]
+
+# Only the fields needed to locate the affected rollups are sent over the wire
+WATCH_PIPELINE = [
+    {"$match": {
+        "ns.coll": {"$in": WATCHED_COLLECTIONS},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+    }},
+    {"$project": {
+        "ns": 1,
+        "operationType": 1,
+        "documentKey": 1,
+        "fullDocument.user_id": 1,
+        "fullDocument.date": 1,
+        "fullDocument.month": 1,
+        "fullDocumentBeforeChange.user_id": 1,
+        "fullDocumentBeforeChange.date": 1,
+        "fullDocumentBeforeChange.month": 1
+    }}
+]
+
+
+class ExpenseChangeWorker:
+    """
+    Tails the change stream of the expense collections and maintains derived data.
+
+    For each batch of changes it recomputes the affected daily rollups (a
+    whole month for changes to expense buckets) and
+    invalidates the owners' cached reports. The resume token is persisted in
+    the worker_state collection after each batch, so a restarted worker picks
+    up where the previous one stopped; on first start, with no token yet, it
+    builds the rollups of every user. Every change is processed with
+    idempotent recomputation, so replaying a batch after a crash is harmless.
+
+    Every API process runs one in embedded mode, but only the holder of a
+    lease consumes the stream; the others wait to take over if it dies. The
+    holder renews the lease before saving each resume token, so two workers
+    never race on it.
+
+    Requires a replica set (a local single-node replica set is enough).
+    """
+
+    STATE_ID = "expenses-change-stream"
+
+    def __init__(self, batch_size: int = 500, max_await_ms: int = 1000):
+        self.batch_size = batch_size
+        self.max_await_ms = max_await_ms
+        self._stop = threading.Event()
+        self._needs_rebuild = False
+        self._lease = Lease(self.STATE_ID, settings.CHANGE_STREAM_LEASE_SECONDS)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self):
+        """Get worker state collection"""
+        return get_database()["worker_state"]
+
+    def _load_token(self) -> Optional[Dict[str, Any]]:
+        state = self.state.find_one({"_id": self.STATE_ID})
+        return state.get("resume_token") if state else None
+
+    def _save_token(self, token: Optional[Dict[str, Any]]) -> None:
+        self.state.update_one(
+            {"_id": self.STATE_ID},
+            {"$set": {"resume_token": token, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def _enable_pre_images(self) -> None:
+        """Ask the server to record pre-images so deletes still carry user_id and date"""
+        for collection in WATCHED_COLLECTIONS:
+            try:
+                get_database().command(
+                    "collMod", collection, changeStreamPreAndPostImages={"enabled": True}
+                )
+            except OperationFailure as exc:
+                logger.warning("Could not enable change stream pre-images on %s: %s", collection, exc)
+
+    def _collect(self, change: Dict[str, Any], ranges: Set[Tuple[str, datetime, str]], users: Set[str]) -> None:
+        """Record the (user, day) or (user, month) pairs touched by a change"""
+        for image in (change.get("fullDocument"), change.get("fullDocumentBeforeChange")):
+            if not image or not image.get("user_id"):
+                continue
+            if image.get("month"):
+                ranges.add((image["user_id"], image["month"], "month"))
+            elif image.get("date"):
+                ranges.add((image["user_id"], day_start(image["date"]), "day"))
+        
+        if change["ns"]["coll"] != "expenses":
+            return
+
+        if change["operationType"] == "delete" and not change.get("fullDocumentBeforeChange"):
+            # No pre-image: on a sharded collection the document key carries the
+            # owner; otherwise the tombstone written by ExpenseService names it
+            if change["documentKey"].get("user_id"):
+                users.add(change["documentKey"]["user_id"])
+                return
+            expense_id = str(change["documentKey"]["_id"])
+            tombstone = get_database().expense_tombstones.find_one(
+                {"expense_id": expense_id}, {"user_id": 1}
+            )
+            if tombstone:
+                users.add(tombstone["user_id"])
+            else:
+                logger.warning("Cannot attribute deleted expense %s to a user", expense_id)
+
+    def _apply(self, ranges: Set[Tuple[str, datetime, str]], users: Set[str]) -> None:
+        """Recompute derived data for a batch of changes"""
+        for user_id in users:
+            rebuild_user_rollups(user_id)
+        for user_id, start, unit in ranges:
+            if user_id in users:
+                continue
+            if unit == "month":
+                rebuild_user_rollups(user_id, start)
+            else:
+                recompute_daily_rollup(user_id, start)
+        for user_id in users | {user_id for user_id, _, _ in ranges}:
+            invalidate_user_reports(user_id)
+
+    def _rebuild_all(self) -> None:
+        """Rebuild rollups for every user, used when the stream history was lost"""
+        db = get_database()
+        user_ids = set(db.expenses.distinct("user_id")) | set(db.expense_buckets.distinct("user_id"))
+        for user_id in user_ids:
+            rebuild_user_rollups(user_id)
+            invalidate_user_reports(user_id)
+
+    def _consume(self) -> None:
+        token = self._load_token()
+        if token is None:
+            # First start (or history lost): expenses written before the
+            # stream opened have no rollups yet
+            self._needs_rebuild = True
+
+        with get_database().watch(
+            WATCH_PIPELINE,
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable",
+            resume_after=token,
+            max_await_time_ms=self.max_await_ms
+        ) as stream:
+            if self._needs_rebuild:
+                # The stream is open, so nothing written from here on can be missed
+                self._rebuild_all()
+                self._needs_rebuild = False
+            
+            renew_at = time.monotonic() + self._lease.seconds / 3
+            while not self._stop.is_set():
+                if time.monotonic() >= renew_at:
+                    if not self._lease.acquire():
+                        logger.warning("Lost the change stream lease")
+                        return
+                    renew_at = time.monotonic() + self._lease.seconds / 3
+
+                ranges: Set[Tuple[str, datetime, str]] = set()
+                users: Set[str] = set()
+                processed = 0
+
+                change = stream.try_next()
+                while change is not None:
+                    self._collect(change, ranges, users)
+                    processed += 1
+                    if processed >= self.batch_size:
+                        break
+                    change = stream.try_next()
+
+                if processed:
+                    self._apply(ranges, users)
+                if stream.resume_token and stream.resume_token != token:
+                    if not self._lease.acquire():
+                        # Another worker took over and saves its own tokens
+                        logger.warning("Lost the change stream lease")
+                        return
+                    token = stream.resume_token
+                    self._save_token(token)
+
+    def run(self) -> None:
+        """Consume the change stream while holding the lease until stop() is called, reconnecting on errors"""
+        pre_images = False
+        while not self._stop.is_set():
+            try:
+                if not self._lease.acquire():
+                    self._stop.wait(self._lease.seconds / 3)
+                    continue
+                if not pre_images:
+                    self._enable_pre_images()
+                    pre_images = True
+                self._consume()
+            except OperationFailure as exc:
+                if exc.code != CHANGE_STREAM_HISTORY_LOST:
+                    logger.exception("Change stream failed, retrying")
+                    self._stop.wait(5)
+                    continue
+                logger.warning("Resume token expired, rebuilding all rollups")
+                self._save_token(None)
+                self._needs_rebuild = True
+            except PyMongoError:
+                logger.exception("Change stream failed, retrying")
+                self._stop.wait(5)
+        try:
+            self._lease.release()
+        except PyMongoError:
+            logger.warning("Could not release the change stream lease", exc_info=True)
+
+    def start(self) -> None:
+        """Run the worker in a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="expense-change-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the worker and wait for the current batch to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def check_external_worker() -> None:
+    """
+    Refuse to run the worker outside the API processes without a shared cache:
+    its report invalidations would only reach its own in-process cache.
+    """
+    if settings.CACHE_BACKEND != "redis":
+        raise RuntimeError(
+            "CHANGE_STREAM_WORKER=external needs CACHE_BACKEND=redis, "
+            "or the API processes keep serving reports the worker invalidated"
+        )
+
+
+expense_change_worker = ExpenseChangeWorker()
@@ -0,0 +1,200 @@
+"""
+Live per-user summary events.
+
+Every expense write publishes a summary delta for its user: the change in
+total amount and count, overall and per category. Subscribers (the SSE
+stream in app/routes/expenses.py) receive the deltas of their own user.
+
+Brokers:
+- memory: delivers to subscribers in this process only
+- redis: publishes on a Redis-protocol channel that every worker listens
+  to, so writes handled by one worker reach streams held by another
+
+Each subscriber has a bounded queue. A subscriber that falls behind does
+not make the queue grow: further deltas are dropped and it is flagged as
+lagging, and the stream sends a fresh snapshot instead once it catches up.
+Publishing may happen from any thread; delivery is handed to each
+subscriber's event loop.
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from app.core.config import settings
+from app.utils.money import from_minor
+
+logger = logging.getLogger(__name__)
+
+
+def summary_delta(
+    added: Iterable[Dict[str, Any]] = (),
+    removed: Iterable[Dict[str, Any]] = (),
+    currency: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Change in a user's summary from written (added) and deleted or
+    overwritten (removed) expenses, all with amounts in `currency`
+    """
+    categories: Dict[str, Dict[str, int]] = defaultdict(lambda: {"total": 0, "count": 0})
+    for sign, expenses in ((1, added), (-1, removed)):
+        for expense in expenses:
+            category = categories[expense["category"]]
+            category["total"] += sign * expense["amount"]
+            category["count"] += sign
+    categories = {name: delta for name, delta in categories.items() if delta["total"] or delta["count"]}
+    if not categories:
+        return None
+    return {
+        "total_amount": from_minor(sum(delta["total"] for delta in categories.values()), currency),
+        "total_expenses": sum(delta["count"] for delta in categories.values()),
+        "categories": {
+            name: {"total": from_minor(delta["total"], currency), "count": delta["count"]}
+            for name, delta in categories.items()
+        }
+    }
+
+
+class Subscription:
+    """One stream's queue of events"""
+
+    def __init__(self, user_id: str, max_size: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(max_size)
+        self.lagging = False
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Queue an event; runs on the subscriber's loop"""
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagging = True
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next event, or None if there was none within `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class MemoryEventBroker:
+    """Delivers events to subscribers in this process"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def deliver(self, user_id: str, event: Dict[str, Any]) -> None:
+        """Hand an event to this process's subscribers of the user"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The subscriber's loop has closed; it is unsubscribing
+                pass
+
+    def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+        self.deliver(user_id, event)
+
+    def close(self) -> None:
+        pass
+
+
+class RedisEventBroker(MemoryEventBroker):
+    """Publishes events on a Redis-protocol channel shared by every worker"""
+
+    def __init__(self, url: str, queue_size: int = 100, channel: str = "events:expenses", client=None):
+        super().__init__(queue_size)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.channel = channel
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: self._on_message})
+        self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, message: dict) -> None:
+        payload = json.loads(message["data"])
+        self.deliver(payload["user_id"], payload["event"])
+
+    def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+        # Every worker, this one included, delivers it from the channel
+        self.client.publish(self.channel, json.dumps({"user_id": user_id, "event": event}))
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self.client.close()
+
+
+_broker: Optional[MemoryEventBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> MemoryEventBroker:
+    """Get the process-wide event broker selected by settings.EVENTS_BACKEND"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if settings.EVENTS_BACKEND == "redis":
+                    _broker = RedisEventBroker(settings.REDIS_URL, settings.SSE_QUEUE_SIZE)
+                elif settings.EVENTS_BACKEND == "memory":
+                    _broker = MemoryEventBroker(settings.SSE_QUEUE_SIZE)
+                else:
+                    raise ValueError(f"Unknown events backend: {settings.EVENTS_BACKEND}")
+    return _broker
+
+
+def close_event_broker() -> None:
+    """Close the event broker"""
+    global _broker
+    if _broker is not None:
+        _broker.close()
+        _broker = None
+
+
+def publish_summary_delta(
+    user_id: str,
+    added: Iterable[Dict[str, Any]] = (),
+    removed: Iterable[Dict[str, Any]] = (),
+    currency: Optional[str] = None,
+    seq: Optional[int] = None
+) -> None:
+    """
+    Publish the summary change of an expense write, tagged with the write's
+    (last) seq; failures never fail the write
+    """
+    delta = summary_delta(added, removed, currency)
+    if delta is None:
+        return
+    try:
+        get_event_broker().publish(user_id, {"id": uuid.uuid4().hex, "type": "delta", "seq": seq, **delta})
+    except Exception as exc:
+        logger.warning("Could not publish summary event: %s", exc)
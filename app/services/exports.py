@@ -0,0 +1,299 @@
+import csv
+import gzip
+import io
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.database import get_database
+from app.models.expense_store import aggregate_expenses
+from app.utils.money import format_minor, from_minor
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ["date", "amount", "currency", "category", "description"]
+CSV_HEADER = ["Date", "Amount", "Category", "Description"]
+
+MEDIA_TYPES = {
+    "csv": "application/gzip",
+    "parquet": "application/vnd.apache.parquet"
+}
+EXTENSIONS = {
+    "csv": "csv.gz",
+    "parquet": "parquet"
+}
+
+
+def _load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def parquet_supported() -> bool:
+    """Whether Parquet exports are available (pyarrow is installed)"""
+    return _load_pyarrow() is not None
+
+
+class ExportManager:
+    """
+    Runs expense exports as background jobs on a worker pool.
+
+    Jobs read the user's expenses in (date, _id) order in chunks. Each chunk is
+    written atomically as a part file and the job document records the last
+    exported key, so a job interrupted by a restart resumes from its last
+    completed chunk. When all chunks are written the parts are combined into
+    a single artifact: concatenated gzip members for CSV, one row group per
+    chunk for Parquet.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def collection(self):
+        """Get export jobs collection"""
+        return get_database()["export_jobs"]
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.EXPORT_WORKERS, thread_name_prefix="export"
+            )
+        return self._executor
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(settings.EXPORT_DIR, job_id)
+
+    def artifact_path(self, job: Dict[str, Any]) -> str:
+        return os.path.join(settings.EXPORT_DIR, f"{job['id']}.{EXTENSIONS[job['format']]}")
+
+    def create_job(
+        self,
+        user_id: str,
+        export_format: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Create an export job and schedule it on the worker pool"""
+        now = datetime.utcnow()
+        job = {
+            "user_id": user_id,
+            "format": export_format,
+            "start_date": start_date,
+            "end_date": end_date,
+            "status": "pending",
+            "rows_written": 0,
+            "parts": 0,
+            "last_key": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        result = self.collection.insert_one(job)
+        job_id = str(result.inserted_id)
+        self.executor.submit(self._run, job_id)
+        return self.get_job(job_id, user_id)
+
+    def get_job(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get an export job owned by the user"""
+        job = self.collection.find_one({"_id": ObjectId(job_id), "user_id": user_id})
+        if not job:
+            return None
+        job["id"] = str(job.pop("_id"))
+        return job
+
+    def resume_pending(self) -> None:
+        """Schedule jobs left unfinished by a previous process"""
+        stale = datetime.utcnow() - timedelta(seconds=settings.EXPORT_LEASE_SECONDS)
+        jobs = self.collection.find(
+            {"$or": [
+                {"status": "pending"},
+                {"status": "running", "updated_at": {"$lt": stale}}
+            ]},
+            {"_id": 1}
+        )
+        for job in jobs:
+            self.executor.submit(self._run, str(job["_id"]))
+
+    def shutdown(self) -> None:
+        """Stop accepting jobs; running jobs resume on the next start"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically take ownership of a job so only one worker runs it"""
+        stale = datetime.utcnow() - timedelta(seconds=settings.EXPORT_LEASE_SECONDS)
+        return self.collection.find_one_and_update(
+            {
+                "_id": ObjectId(job_id),
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "running", "updated_at": {"$lt": stale}}
+                ]
+            },
+            {"$set": {"status": "running", "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _query(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"user_id": job["user_id"]}
+        date_filter = {}
+        if job.get("start_date"):
+            date_filter["$gte"] = job["start_date"]
+        if job.get("end_date"):
+            date_filter["$lte"] = job["end_date"]
+        if date_filter:
+            query["date"] = date_filter
+
+        last_key = job.get("last_key")
+        if last_key:
+            # Keyset pagination on the (user_id, date) index
+            query["$or"] = [
+                {"date": {"$gt": last_key["date"]}},
+                {"date": last_key["date"], "_id": {"$gt": last_key["_id"]}}
+            ]
+        return query
+
+    def _fetch_chunk(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        projection = {field: 1 for field in EXPORT_FIELDS}
+        cursor = aggregate_expenses([
+            {"$match": self._query(job)},
+            {"$sort": {"date": 1, "_id": 1}},
+            {"$limit": settings.EXPORT_CHUNK_SIZE},
+            {"$project": projection}
+        ], batchSize=settings.EXPORT_CHUNK_SIZE)
+        return list(cursor)
+
+    def _write_part(self, job: Dict[str, Any], index: int, rows: List[Dict[str, Any]]) -> None:
+        """Write one chunk as a part file, atomically"""
+        job_dir = self._job_dir(str(job["_id"]))
+        os.makedirs(job_dir, exist_ok=True)
+        path = os.path.join(job_dir, f"part-{index:05d}.{EXTENSIONS[job['format']]}")
+        tmp_path = path + ".tmp"
+
+        if job["format"] == "parquet":
+            pa = _load_pyarrow()
+            table = pa.table({
+                "date": pa.array([row.get("date") for row in rows], pa.timestamp("ms")),
+                "amount": pa.array(
+                    [from_minor(row["amount"], row.get("currency")) for row in rows], pa.float64()
+                ),
+                "category": pa.array([row.get("category") for row in rows], pa.string()),
+                "description": pa.array([row.get("description") for row in rows], pa.string())
+            })
+            pa.parquet.write_table(table, tmp_path)
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if index == 0:
+                writer.writerow(CSV_HEADER)
+            for row in rows:
+                writer.writerow([
+                    row["date"].strftime("%Y-%m-%d %H:%M:%S"),
+                    format_minor(row["amount"], row.get("currency")),
+                    row.get("category"),
+                    row.get("description")
+                ])
+            with gzip.open(tmp_path, "wt", newline="") as part:
+                part.write(buffer.getvalue())
+
+        os.replace(tmp_path, path)
+
+    def _combine_parts(self, job: Dict[str, Any]) -> str:
+        """Combine part files into the final artifact and remove the parts"""
+        job_id = str(job["_id"])
+        job_dir = self._job_dir(job_id)
+        extension = EXTENSIONS[job["format"]]
+        parts = [os.path.join(job_dir, f"part-{i:05d}.{extension}") for i in range(job["parts"])]
+        path = os.path.join(settings.EXPORT_DIR, f"{job_id}.{extension}")
+        tmp_path = path + ".tmp"
+        if os.path.exists(path) and not os.path.exists(job_dir):
+            # Combined by a previous run that stopped before marking the job completed
+            return path
+
+        if job["format"] == "parquet":
+            pa = _load_pyarrow()
+            writer = None
+            for part in parts:
+                table = pa.parquet.read_table(part)
+                if writer is None:
+                    writer = pa.parquet.ParquetWriter(tmp_path, table.schema, compression="zstd")
+                writer.write_table(table)
+            if writer is None:
+                # Empty export: write a file with the schema and no rows
+                schema = pa.schema([
+                    ("date", pa.timestamp("ms")), ("amount", pa.float64()),
+                    ("category", pa.string()), ("description", pa.string())
+                ])
+                writer = pa.parquet.ParquetWriter(tmp_path, schema)
+            writer.close()
+        else:
+            # A sequence of gzip members is itself a valid gzip file
+            with open(tmp_path, "wb") as output:
+                if not parts:
+                    with gzip.open(output, "wt", newline="") as empty:
+                        csv.writer(empty).writerow(CSV_HEADER)
+                for part in parts:
+                    with open(part, "rb") as source:
+                        shutil.copyfileobj(source, output)
+
+        os.replace(tmp_path, path)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return path
+
+    def _run(self, job_id: str) -> None:
+        job = self._claim(job_id)
+        if job is None:
+            return
+
+        try:
+            while True:
+                rows = self._fetch_chunk(job)
+                if not rows:
+                    break
+
+                self._write_part(job, job["parts"], rows)
+                last = rows[-1]
+                job = self.collection.find_one_and_update(
+                    {"_id": job["_id"]},
+                    {
+                        "$set": {
+                            "last_key": {"date": last["date"], "_id": last["_id"]},
+                            "updated_at": datetime.utcnow()
+                        },
+                        "$inc": {"parts": 1, "rows_written": len(rows)}
+                    },
+                    return_document=ReturnDocument.AFTER
+                )
+                if len(rows) < settings.EXPORT_CHUNK_SIZE:
+                    break
+
+            path = self._combine_parts(job)
+            self.collection.update_one(
+                {"_id": job["_id"]},
+                {"$set": {
+                    "status": "completed",
+                    "size": os.path.getsize(path),
+                    "completed_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow()
+                }}
+            )
+        except Exception as exc:
+            logger.exception("Export job %s failed", job_id)
+            self.collection.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": "failed", "error": str(exc), "updated_at": datetime.utcnow()}}
+            )
+
+
+export_manager = ExportManager()
@@ -0,0 +1,191 @@
+"""
+Daily spending forecasts.
+
+A user's daily spend series is modelled with additive Holt-Winters
+exponential smoothing without trend (a level plus one seasonal offset per
+weekday). The fitted smoothing parameters and the final model state are
+stored in `forecast_models`; later requests only feed the days completed
+since then into the stored state, so serving a forecast costs a query over
+a few days rather than the full history. Parameters are refitted over the
+whole history every FORECAST_REFIT_DAYS. A seasonal naive forecast (the
+average of the same weekday over the last four weeks) is returned
+alongside as a baseline.
+"""
+from datetime import datetime, timedelta
+from itertools import product
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from app.core.cache import get_cache
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.fx import get_base_currency
+from app.services.reports import report_cache_key, aggregate_totals
+from app.services.rollups import day_start, get_daily_totals
+from app.utils.money import from_minor
+
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+GAMMAS = (0.05, 0.1, 0.2, 0.3)
+SEASON = 7
+MIN_HISTORY_DAYS = 2 * SEASON
+
+
+def daily_series(user_id: str, start: datetime, end: datetime) -> np.ndarray:
+    """Spend per day (minor units of the user's base currency) over [start, end), zero-filled"""
+    if settings.CHANGE_STREAM_WORKER != "off":
+        # Rollups are maintained by the change stream worker
+        days = [(row["day"], row["total"]) for row in get_daily_totals(user_id, start, end)]
+    else:
+        totals, _ = aggregate_totals(user_id, [
+            {"$match": {"user_id": user_id, "date": {"$gte": start, "$lt": end}}},
+            {"$project": {"date": 1, "amount": 1, "currency": 1}},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$date", "unit": "day"}},
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }}
+        ])
+        days = [(row["_id"], row["total"]) for row in totals]
+
+    series = np.zeros((end - start).days, dtype=np.float64)
+    if days:
+        offsets = np.array([(day - start).days for day, _ in days])
+        series[offsets] = [total for _, total in days]
+    return series
+
+
+def _smooth(series: np.ndarray, start: datetime, alpha: float, gamma: float,
+            level: float, season: np.ndarray) -> Tuple[float, np.ndarray, float]:
+    """Run the smoothing recursion over a series; returns final level, season and squared error"""
+    season = season.copy()
+    first_weekday = start.weekday()
+    sse = 0.0
+    for offset, value in enumerate(series):
+        weekday = (first_weekday + offset) % SEASON
+        error = value - (level + season[weekday])
+        sse += error * error
+        new_level = alpha * (value - season[weekday]) + (1 - alpha) * level
+        season[weekday] = gamma * (value - new_level) + (1 - gamma) * season[weekday]
+        level = new_level
+    return level, season, sse
+
+
+def _fit(series: np.ndarray, start: datetime) -> Dict[str, Any]:
+    """Choose smoothing parameters by one-step-ahead squared error"""
+    # Initial state from the first week
+    level = float(series[:SEASON].mean())
+    season = np.zeros(SEASON)
+    for offset in range(SEASON):
+        season[(start.weekday() + offset) % SEASON] = series[offset] - level
+
+    rest, rest_start = series[SEASON:], start + timedelta(days=SEASON)
+    best = None
+    for alpha, gamma in product(ALPHAS, GAMMAS):
+        fitted = _smooth(rest, rest_start, alpha, gamma, level, season)
+        if best is None or fitted[2] < best[0][2]:
+            best = (fitted, alpha, gamma)
+    (level, season, sse), alpha, gamma = best
+    return {"alpha": alpha, "gamma": gamma, "level": level, "season": season.tolist(),
+            "mse": sse / max(len(rest), 1)}
+
+
+class ForecastService:
+    @property
+    def collection(self):
+        """Get fitted forecast models collection"""
+        return get_database()["forecast_models"]
+
+    def _model(self, user_id: str, today: datetime) -> Optional[Dict[str, Any]]:
+        """The user's model brought up to date through yesterday, refitting when due"""
+        model = self.collection.find_one({"user_id": user_id})
+        if model and today - model["fitted_at"] < timedelta(days=settings.FORECAST_REFIT_DAYS):
+            if model["through"] < today:
+                # Feed only the days completed since the last update ("through" is exclusive)
+                series = daily_series(user_id, model["through"], today)
+                level, season, _ = _smooth(
+                    series, model["through"], model["alpha"], model["gamma"],
+                    model["level"], np.array(model["season"])
+                )
+                model.update({"level": level, "season": season.tolist(), "through": today})
+                self.collection.update_one(
+                    {"_id": model["_id"]},
+                    {"$set": {"level": level, "season": model["season"], "through": today}}
+                )
+            return model
+
+        start = today - timedelta(days=settings.FORECAST_HISTORY_DAYS)
+        series = daily_series(user_id, start, today)
+        active = np.flatnonzero(series)
+        if not len(active) or len(series) - active[0] < MIN_HISTORY_DAYS:
+            return None
+        # Leading days before the first expense are not real zero spend
+        start += timedelta(days=int(active[0]))
+        series = series[active[0]:]
+
+        model = {
+            "user_id": user_id,
+            **_fit(series, start),
+            "through": today,
+            "fitted_at": today,
+            "history_days": len(series)
+        }
+        self.collection.replace_one({"user_id": user_id}, model, upsert=True)
+        return model
+
+    def forecast(self, user_id: str, horizon_days: int = 30) -> Dict[str, Any]:
+        """Forecast daily spend from today for `horizon_days` days"""
+        now = datetime.utcnow()
+        today = day_start(now)
+        cache = get_cache()
+        cache_key = report_cache_key(user_id, "forecast", today.date(), horizon_days)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        model = self._model(user_id, today)
+        recent = daily_series(user_id, today - timedelta(days=4 * SEASON), today)
+        # Seasonal naive baseline: mean of the same weekday over the last four weeks
+        by_weekday = np.zeros(SEASON)
+        first_weekday = (today - timedelta(days=4 * SEASON)).weekday()
+        by_weekday[(first_weekday + np.arange(SEASON)) % SEASON] = recent.reshape(4, SEASON).mean(axis=0)
+
+        def predict(dates):
+            weekdays = np.array([date.weekday() for date in dates], dtype=np.int64)
+            if model is None:
+                return by_weekday[weekdays]
+            return np.maximum(model["level"] + np.array(model["season"])[weekdays], 0)
+
+        dates = [today + timedelta(days=offset) for offset in range(horizon_days)]
+        predicted = predict(dates)
+        baseline = by_weekday[np.array([date.weekday() for date in dates], dtype=np.int64)]
+        method = "seasonal_naive" if model is None else "holt_winters_additive"
+
+        month_start = datetime(today.year, today.month, 1)
+        elapsed = (today - month_start).days
+        if not elapsed:
+            month_to_date = 0.0
+        elif elapsed <= len(recent):
+            month_to_date = recent[-elapsed:].sum()
+        else:
+            month_to_date = daily_series(user_id, month_start, today).sum()
+        month_end = datetime(today.year + today.month // 12, today.month % 12 + 1, 1)
+        rest_of_month = predict([today + timedelta(days=offset) for offset in range((month_end - today).days)]).sum()
+
+        currency = get_base_currency(user_id)
+        result = {
+            "method": method,
+            "horizon_days": horizon_days,
+            "daily": [
+                {"date": date.strftime("%Y-%m-%d"), "amount": from_minor(int(round(value)), currency)}
+                for date, value in zip(dates, predicted)
+            ],
+            "total": from_minor(int(round(predicted.sum())), currency),
+            "baseline_total": from_minor(int(round(baseline.sum())), currency),
+            "month_to_date": from_minor(int(round(month_to_date)), currency),
+            "projected_month_total": from_minor(int(round(month_to_date + rest_of_month)), currency),
+            "currency": currency
+        }
+        cache.set(cache_key, result, ttl=settings.REPORT_CACHE_TTL)
+        return result
+
+
+forecast_service = ForecastService()
@@ -0,0 +1,278 @@
+"""
+Foreign exchange rates and conversion into users' base currencies.
+
+Rates are read from a local CSV file (FX_RATES_FILE) in the layout of the
+ECB's historical reference rates (eurofxref-hist.csv, kept up to date by
+scripts/update_fx_rates.py): a `Date` column, then one column per currency
+holding its units per one unit of FX_REFERENCE_CURRENCY. Any reference
+currency works, since conversions only use ratios of rates.
+
+The table is held in memory as a dense (days x currencies) NumPy array
+indexed by days since the first date, with days without a quote (weekends,
+holidays) carrying the previous quote forward. Dates outside the table use
+its first or last day. Converting many amounts is a handful of array
+operations, whatever their number; reports convert totals grouped by
+(day, currency) this way instead of converting expenses one by one.
+
+Each user has a base currency that reports are expressed in, chosen at
+registration (DEFAULT_CURRENCY if none). Users are flagged once they record
+an expense in another currency, so reports of everyone else skip conversion.
+"""
+import csv
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.cache import get_cache, get_shared_cache
+from app.core.config import settings
+from app.core.database import get_database
+from app.utils.money import currency_exponent
+
+logger = logging.getLogger(__name__)
+
+# How often the rates file is checked for changes
+FX_RELOAD_CHECK_SECONDS = 60
+
+
+class FxTable:
+    """Daily rates of each currency against a common reference currency"""
+
+    def __init__(self, start: np.datetime64, currencies: Sequence[str], rates: np.ndarray):
+        self.start = start
+        self.currencies = list(currencies)
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+        self.rates = rates
+
+    @classmethod
+    def empty(cls, reference: str) -> "FxTable":
+        return cls(np.datetime64("1970-01-01", "D"), [reference], np.ones((1, 1)))
+
+    @classmethod
+    def from_csv(cls, path: str, reference: str) -> "FxTable":
+        """Load a wide rates file: Date, then one column per currency (blank or N/A when not quoted)"""
+        with open(path, newline="", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            header = [column.strip() for column in next(reader)]
+            rows = [row for row in reader if row and row[0].strip()]
+        currencies = [currency for currency in header[1:] if currency]
+        if not rows or not currencies:
+            return cls.empty(reference)
+
+        days = np.array([row[0].strip() for row in rows], dtype="datetime64[D]")
+        values = np.full((len(rows), len(currencies)), np.nan)
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row[1:len(currencies) + 1]):
+                value = value.strip()
+                if value and value != "N/A":
+                    values[i, j] = float(value)
+
+        start = days.min()
+        rates = np.full(((days.max() - start).astype(int) + 1, len(currencies)), np.nan)
+        rates[(days - start).astype(int)] = values
+        # Carry each quote forward over the days without one, then back over
+        # the days before a currency's first quote
+        for column in rates.T:
+            quoted = ~np.isnan(column)
+            if not quoted.any():
+                continue
+            last = np.maximum.accumulate(np.where(quoted, np.arange(len(column)), 0))
+            column[:] = column[last]
+            column[:np.argmax(quoted)] = column[np.argmax(quoted)]
+        # Currencies never quoted have no rates at all
+        quoted = ~np.isnan(rates).all(axis=0)
+        currencies = [currency for currency, has_rates in zip(currencies, quoted) if has_rates]
+        rates = rates[:, quoted]
+
+        if reference not in currencies:
+            currencies.append(reference)
+            rates = np.hstack([rates, np.ones((len(rates), 1))])
+        return cls(start, currencies, rates)
+
+    def days(self, dates: Iterable[Any]) -> np.ndarray:
+        """Row of each date in the table, clamped to its first and last day"""
+        offsets = (np.array(list(dates), dtype="datetime64[D]") - self.start).astype(int)
+        return np.clip(offsets, 0, len(self.rates) - 1)
+
+    def convert(
+        self,
+        amounts: Sequence[int],
+        currencies: Sequence[str],
+        dates: Sequence[Any],
+        target: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert amounts in minor units of their currencies, on their dates,
+        to minor units of `target`. Returns the converted amounts and a mask
+        of those whose currency has no rates, which are left as they were.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        codes, inverse = np.unique(np.asarray(currencies, dtype=object).astype(str), return_inverse=True)
+        known = np.array([code in self.index for code in codes])
+        missing = ~known[inverse]
+        if target not in self.index:
+            same = codes[inverse] == target
+            return np.rint(amounts).astype(np.int64), ~same
+
+        source = np.array([self.index.get(code, 0) for code in codes])[inverse]
+        scale = np.array([10.0 ** (currency_exponent(target) - currency_exponent(code)) for code in codes])[inverse]
+        days = self.days(dates)
+        ratio = self.rates[days, self.index[target]] / self.rates[days, source]
+        converted = np.rint(amounts * ratio * scale)
+        converted[missing] = amounts[missing]
+        return converted.astype(np.int64), missing
+
+
+_table: Optional[FxTable] = None
+_table_mtime: Optional[float] = None
+_table_checked_at = float("-inf")
+_table_lock = threading.Lock()
+
+
+def get_fx_table() -> FxTable:
+    """The rates table, reloaded when FX_RATES_FILE changes"""
+    global _table, _table_mtime, _table_checked_at
+    if _table is not None and time.monotonic() - _table_checked_at < FX_RELOAD_CHECK_SECONDS:
+        return _table
+    with _table_lock:
+        if _table is not None and time.monotonic() - _table_checked_at < FX_RELOAD_CHECK_SECONDS:
+            return _table
+        _table_checked_at = time.monotonic()
+        try:
+            mtime = os.path.getmtime(settings.FX_RATES_FILE)
+        except OSError:
+            mtime = None
+        if _table is None or mtime != _table_mtime:
+            if mtime is None:
+                logger.warning("No FX rates file at %s; foreign amounts are not converted", settings.FX_RATES_FILE)
+                _table = FxTable.empty(settings.FX_REFERENCE_CURRENCY)
+            else:
+                _table = FxTable.from_csv(settings.FX_RATES_FILE, settings.FX_REFERENCE_CURRENCY)
+                logger.info("Loaded FX rates for %d currencies", len(_table.currencies))
+            _table_mtime = mtime
+    return _table
+
+
+def get_user_currency(user_id: str) -> Dict[str, Any]:
+    """A user's base currency, and whether they have expenses in any other currency"""
+    cache = get_shared_cache()
+    key = f"user:currency:{user_id}"
+    currency = cache.get(key)
+    if currency is None:
+        user = None
+        if ObjectId.is_valid(user_id):
+            user = get_database().users.find_one(
+                {"_id": ObjectId(user_id)}, {"base_currency": 1, "foreign_currency": 1}
+            )
+        user = user or {}
+        currency = {
+            "base": user.get("base_currency") or settings.DEFAULT_CURRENCY,
+            "foreign": bool(user.get("foreign_currency"))
+        }
+        cache.set(key, currency, ttl=settings.USER_CACHE_TTL)
+    return currency
+
+
+def get_base_currency(user_id: str) -> str:
+    return get_user_currency(user_id)["base"]
+
+
+def note_currencies(user_id: str, currencies: Iterable[str]) -> None:
+    """Flag a user as multi-currency the first time they record a foreign expense"""
+    currency = get_user_currency(user_id)
+    if currency["foreign"] or all(code == currency["base"] for code in currencies):
+        return
+    get_database().users.update_one({"_id": ObjectId(user_id)}, {"$set": {"foreign_currency": True}})
+    get_cache().delete(f"user:currency:{user_id}")
+
+
+def set_base_amounts(user_id: str, expenses: List[Dict[str, Any]]) -> None:
+    """
+    Set `base_amount` on foreign expenses about to be written: the amount in
+    the user's base currency at the rate of the expense's date, or None when
+    its currency has no rates. Expenses in the base currency carry none.
+    """
+    base = get_base_currency(user_id)
+    foreign = []
+    for expense in expenses:
+        if expense.get("currency", base) == base:
+            expense.pop("base_amount", None)
+        else:
+            foreign.append(expense)
+    if not foreign:
+        return
+    converted, missing = get_fx_table().convert(
+        [expense["amount"] for expense in foreign],
+        [expense["currency"] for expense in foreign],
+        [expense["date"] for expense in foreign],
+        base
+    )
+    for expense, amount, is_missing in zip(foreign, converted.tolist(), missing.tolist()):
+        expense["base_amount"] = None if is_missing else amount
+
+
+def to_base(user_id: str, expenses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Expenses with their amounts in the user's base currency. Foreign ones are
+    copied with the base amount stored when they were written, so totals
+    drop exactly what they once added whatever rates are loaded now; those
+    written without rates are left out. Foreign expenses from before base
+    amounts were stored are converted at the current rates.
+    """
+    base = get_base_currency(user_id)
+    legacy = [
+        expense for expense in expenses
+        if expense.get("currency", base) != base and "base_amount" not in expense
+    ]
+    amounts: Dict[int, Optional[int]] = {}
+    if legacy:
+        converted, missing = get_fx_table().convert(
+            [expense["amount"] for expense in legacy],
+            [expense["currency"] for expense in legacy],
+            [expense["date"] for expense in legacy],
+            base
+        )
+        amounts = {
+            id(expense): None if is_missing else amount
+            for expense, amount, is_missing in zip(legacy, converted.tolist(), missing.tolist())
+        }
+
+    result = []
+    for expense in expenses:
+        if expense.get("currency", base) == base:
+            result.append(expense)
+            continue
+        amount = expense["base_amount"] if "base_amount" in expense else amounts[id(expense)]
+        if amount is not None:
+            result.append({**expense, "amount": amount, "currency": base})
+    return result
+
+
+def convert_totals(user_id: str, rows: List[Dict[str, Any]], target: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Convert totals grouped by day and currency (rows with `day`, `currency`
+    and `total` in minor units) to the user's base currency, or `target`.
+    Returns the converted rows, and the totals per currency that could not
+    be converted for lack of rates, which are left out of the rows.
+    """
+    target = target or get_base_currency(user_id)
+    if all(row["currency"] == target for row in rows):
+        return rows, {}
+    converted, missing = get_fx_table().convert(
+        [row["total"] for row in rows],
+        [row["currency"] for row in rows],
+        [row["day"] for row in rows],
+        target
+    )
+    result = []
+    unconverted: Dict[str, int] = {}
+    for row, amount, is_missing in zip(rows, converted.tolist(), missing.tolist()):
+        if is_missing:
+            unconverted[row["currency"]] = unconverted.get(row["currency"], 0) + row["total"]
+        else:
+            result.append({**row, "total": amount, "currency": target})
+    return result, unconverted
@@ -0,0 +1,348 @@
+"""
+Sampling profiler for finding where slow requests spend their time.
+
+Samples are taken from a background thread with sys._current_frames(), so
+they see the event loop thread as well as the threadpool threads that sync
+routes (the reports among them) run in; cProfile or pyinstrument started in
+the request would only see the thread they were started on. A thread's
+stack is attributed to a route when it contains the route's endpoint
+function, and only the frames from the endpoint inwards are kept. Stacks
+are aggregated in the folded format ("a;b;c <count>") that flamegraph.pl,
+speedscope and inferno read.
+
+Two modes:
+- per request: an admin adds `X-Profile: 1` (or `?profile=1`) to a request,
+  or arms a trigger for another user's next requests. The request is sampled
+  every PROFILE_REQUEST_INTERVAL seconds and its profile is stored in
+  request_profiles for PROFILE_TTL_HOURS.
+- per route: with ROUTE_PROFILING on, requests of every route are sampled
+  every ROUTE_PROFILING_INTERVAL seconds and the stacks are merged per route
+  into route_profiles every ROUTE_PROFILING_FLUSH_SECONDS.
+"""
+import hashlib
+import logging
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.core.database import get_database
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per sample, counted from the endpoint inwards
+MAX_STACK_DEPTH = 96
+
+_labels: Dict[CodeType, str] = {}
+
+
+def frame_label(frame) -> str:
+    """module.qualified_name of the function a frame runs"""
+    code = frame.f_code
+    label = _labels.get(code)
+    if label is None:
+        label = f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}"
+        _labels[code] = label
+    return label
+
+
+def endpoint_stack(frame, is_endpoint: Callable[[Any], bool]) -> Optional[Tuple[Any, str]]:
+    """
+    The endpoint frame of a thread's stack and the folded stack from it to
+    the innermost frame, or None if the thread is not running an endpoint
+    """
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        if is_endpoint(frame):
+            return frame, ";".join(frame_label(f) for f in reversed(frames[-MAX_STACK_DEPTH:]))
+        frame = frame.f_back
+    return None
+
+
+def _with_id(document: Dict[str, Any]) -> Dict[str, Any]:
+    document["id"] = str(document.pop("_id"))
+    return document
+
+
+def folded(stacks: Dict[str, int]) -> str:
+    """Folded stack text, heaviest stacks first"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+class RequestProfile:
+    """
+    Samples a single request. Only the stacks running its endpoint for its
+    user object are counted; the middleware hands the request a private copy
+    of the user so that concurrent requests of the same user stay apart.
+    """
+
+    def __init__(self, scope, user: Dict[str, Any], interval: float):
+        self.id = str(ObjectId())
+        self.scope = scope
+        self.user = user
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _endpoint_matcher(self, code: CodeType) -> Callable[[Any], bool]:
+        # Whatever the endpoint names its user parameter (current_user, current_admin)
+        return lambda frame: frame.f_code is code and any(value is self.user for value in frame.f_locals.values())
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            code = getattr(self.scope.get("endpoint"), "__code__", None)
+            if code is None:
+                # Not routed yet
+                continue
+            is_endpoint = self._endpoint_matcher(code)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                found = endpoint_stack(frame, is_endpoint)
+                if found is not None:
+                    self.stacks[found[1]] += 1
+                    self.samples += 1
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self.run, name=f"profile-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self.started_at
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class RouteProfiler:
+    """Continuous low-rate sampling of every route, merged into route_profiles"""
+
+    def __init__(self):
+        self.endpoints: Dict[CodeType, str] = {}
+        self._stacks: Dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def collection(self):
+        return get_database()["route_profiles"]
+
+    def register(self, scope, route: str) -> None:
+        """Map the endpoint a request was routed to onto its route template"""
+        code = getattr(scope.get("endpoint"), "__code__", None)
+        if code is not None and code not in self.endpoints:
+            self.endpoints[code] = route
+
+    def _is_endpoint(self, frame) -> bool:
+        return frame.f_code in self.endpoints
+
+    def sample(self) -> None:
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            found = endpoint_stack(frame, self._is_endpoint)
+            if found is None:
+                continue
+            endpoint, stack = found
+            with self._lock:
+                self._stacks[self.endpoints[endpoint.f_code]][stack] += 1
+
+    def flush(self) -> None:
+        """Add the stacks sampled since the last flush to route_profiles"""
+        with self._lock:
+            stacks, self._stacks = self._stacks, defaultdict(Counter)
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"_id": hashlib.sha1(f"{route}\n{stack}".encode()).hexdigest()},
+                {"$inc": {"samples": count}, "$set": {"route": route, "stack": stack, "updated_at": now}},
+                upsert=True
+            )
+            for route, route_stacks in stacks.items()
+            for stack, count in route_stacks.items()
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def run(self) -> None:
+        """Sample every ROUTE_PROFILING_INTERVAL seconds until stop() is called"""
+        next_flush = time.monotonic() + settings.ROUTE_PROFILING_FLUSH_SECONDS
+        while not self._stop.wait(settings.ROUTE_PROFILING_INTERVAL):
+            self.sample()
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + settings.ROUTE_PROFILING_FLUSH_SECONDS
+                try:
+                    self.flush()
+                except PyMongoError:
+                    logger.exception("Could not store route profiles")
+
+    def start(self) -> None:
+        """Run the sampler in a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="route-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop sampling and store what has not been flushed yet"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except PyMongoError:
+            logger.exception("Could not store route profiles")
+
+
+class ProfileService:
+    """Stored request profiles, profiling triggers and per-route stacks"""
+
+    def __init__(self):
+        self._triggers: Dict[str, Dict[str, Any]] = {}
+        self._triggers_loaded_at = float("-inf")
+
+    @property
+    def db(self):
+        return get_database()
+
+    # Request profiles
+
+    def save_profile(self, profile: RequestProfile, requested_by: str, status_code: Optional[int], route: Optional[str]) -> None:
+        scope = profile.scope
+        self.db.request_profiles.insert_one({
+            "_id": ObjectId(profile.id),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status_code": status_code,
+            "user_email": profile.user["email"],
+            "requested_by": requested_by,
+            "duration_ms": round(profile.duration * 1000, 2),
+            "interval_ms": profile.interval * 1000,
+            "samples": profile.samples,
+            "stacks": folded(profile.stacks),
+            "created_at": datetime.utcnow()
+        })
+
+    def list_profiles(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent profiles, without their stacks"""
+        cursor = self.db.request_profiles.find({}, {"stacks": 0}).sort("created_at", -1).limit(limit)
+        return [_with_id(profile) for profile in cursor]
+
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            profile = self.db.request_profiles.find_one({"_id": ObjectId(profile_id)})
+        except InvalidId:
+            return None
+        return _with_id(profile) if profile is not None else None
+
+    # Triggers: profile a user's next requests
+
+    def create_trigger(self, email: str, path_prefix: str, count: int, ttl_minutes: int, created_by: str) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        trigger = {
+            "email": email,
+            "path_prefix": path_prefix,
+            "remaining": count,
+            "created_by": created_by,
+            "created_at": now,
+            "expires_at": now + timedelta(minutes=ttl_minutes)
+        }
+        trigger["_id"] = self.db.profile_triggers.insert_one(trigger).inserted_id
+        self._triggers_loaded_at = float("-inf")
+        return _with_id(trigger)
+
+    def list_triggers(self) -> List[Dict[str, Any]]:
+        cursor = self.db.profile_triggers.find(
+            {"remaining": {"$gt": 0}, "expires_at": {"$gt": datetime.utcnow()}}
+        ).sort("created_at", -1)
+        return [_with_id(trigger) for trigger in cursor]
+
+    def delete_trigger(self, trigger_id: str) -> bool:
+        try:
+            result = self.db.profile_triggers.delete_one({"_id": ObjectId(trigger_id)})
+        except InvalidId:
+            return False
+        self._triggers_loaded_at = float("-inf")
+        return result.deleted_count == 1
+
+    def triggers_due(self) -> bool:
+        """
+        Whether the armed triggers are due a reload, at most every
+        PROFILE_TRIGGER_REFRESH_SECONDS; only the caller told so reloads them
+        """
+        now = time.monotonic()
+        if now - self._triggers_loaded_at < settings.PROFILE_TRIGGER_REFRESH_SECONDS:
+            return False
+        self._triggers_loaded_at = now
+        return True
+
+    def load_triggers(self) -> None:
+        triggers: Dict[str, Dict[str, Any]] = {}
+        try:
+            for trigger in self.list_triggers():
+                triggers.setdefault(trigger["email"], trigger)
+        except (PyMongoError, RuntimeError) as exc:
+            logger.warning("Could not load profiling triggers: %s", exc)
+            return
+        self._triggers = triggers
+
+    def armed_trigger(self, email: str, path: str) -> Optional[Dict[str, Any]]:
+        """The loaded trigger armed for this user and path, if any; a dict lookup"""
+        trigger = self._triggers.get(email)
+        if trigger is None or not path.startswith(trigger["path_prefix"]):
+            return None
+        return trigger
+
+    def claim_trigger(self, email: str, trigger: Dict[str, Any]) -> Optional[str]:
+        """Use up one of an armed trigger's requests; returns who created it"""
+        claimed = self.db.profile_triggers.find_one_and_update(
+            {"_id": ObjectId(trigger["id"]), "remaining": {"$gt": 0}, "expires_at": {"$gt": datetime.utcnow()}},
+            {"$inc": {"remaining": -1}}
+        )
+        if claimed is None or claimed["remaining"] <= 1:
+            self._triggers.pop(email, None)
+        return claimed["created_by"] if claimed is not None else None
+
+    # Per-route stacks
+
+    def route_summaries(self) -> List[Dict[str, Any]]:
+        """Routes with sampled stacks, most sampled first"""
+        pipeline = [
+            {"$group": {"_id": "$route", "samples": {"$sum": "$samples"}, "updated_at": {"$max": "$updated_at"}}},
+            {"$sort": {"samples": -1}}
+        ]
+        return [
+            {"route": row["_id"], "samples": row["samples"], "updated_at": row["updated_at"]}
+            for row in self.db.route_profiles.aggregate(pipeline)
+        ]
+
+    def route_stacks(self, route: str) -> Optional[str]:
+        stacks = {row["stack"]: row["samples"] for row in self.db.route_profiles.find({"route": route})}
+        return folded(stacks) if stacks else None
+
+    def reset_route_stacks(self, route: Optional[str] = None) -> int:
+        return self.db.route_profiles.delete_many({"route": route} if route else {}).deleted_count
+
+
+profile_service = ProfileService()
+route_profiler = RouteProfiler()
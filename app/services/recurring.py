@@ -0,0 +1,176 @@
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError
+from app.core.config import settings
+from app.core.database import get_database
+from app.core.leases import Lease
+from app.models.expense import expense_service
+from app.models.expense_store import BUCKET, aggregate_expenses, get_storage_mode
+from app.utils.recurrence import iter_occurrences
+from app.utils.search import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def occurrence_key(rule_id, date: datetime) -> str:
+    """Identifies one occurrence of a rule, so it is never materialized twice"""
+    return f"{rule_id}:{date:%Y%m%d}"
+
+
+class RecurringScheduler:
+    """
+    Materializes due occurrences of recurring rules as expenses.
+
+    Due rules are claimed with a short lease, so several schedulers (API
+    processes or the CLI) can run at once. All occurrences since a rule's
+    `next_run` are created in one pass, which catches up after downtime, and
+    expenses for a whole batch of rules are written with one insert_many.
+    Each expense carries a unique `occurrence_key`, so re-running after a
+    crash between inserting and advancing a rule creates no duplicates.
+
+    Embedded in the API, only the process holding the scheduler's lease
+    runs it; the lease outlives two intervals, so another process takes
+    over soon after the holder dies.
+    """
+
+    LEASE_ID = "recurring-scheduler"
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._lease = Lease(self.LEASE_ID, 2 * settings.RECURRING_INTERVAL_SECONDS)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def rules(self):
+        """Get recurring rules collection"""
+        return get_database()["recurring_rules"]
+
+    def _claim_batch(self, now: datetime) -> List[Dict[str, Any]]:
+        """Lease up to RECURRING_BATCH_SIZE due rules"""
+        claimed = []
+        lease = now + timedelta(seconds=settings.RECURRING_LEASE_SECONDS)
+        for _ in range(settings.RECURRING_BATCH_SIZE):
+            rule = self.rules.find_one_and_update(
+                {
+                    "active": True,
+                    "next_run": {"$lte": now},
+                    "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}]
+                },
+                {"$set": {"locked_until": lease}},
+                return_document=ReturnDocument.AFTER
+            )
+            if rule is None:
+                break
+            claimed.append(rule)
+        return claimed
+
+    def _due_dates(self, rule: Dict[str, Any], now: datetime):
+        """Due occurrence dates of a rule (capped per pass) and the next one after them"""
+        dates = []
+        for date in iter_occurrences(rule):
+            if date < rule["next_run"]:
+                continue
+            if date > now or len(dates) == settings.RECURRING_MAX_CATCHUP:
+                return dates, date
+            dates.append(date)
+        return dates, None
+
+    def _existing_keys(self, user_id: str, keys: List[str]) -> set:
+        """Occurrence keys already materialized (buckets have no unique index to rely on)"""
+        return {
+            doc["occurrence_key"] for doc in aggregate_expenses([
+                {"$match": {"user_id": user_id, "occurrence_key": {"$in": keys}}},
+                {"$project": {"occurrence_key": 1}}
+            ])
+        }
+
+    def _materialize(self, rules: List[Dict[str, Any]], now: datetime) -> int:
+        """Create the due expenses of a batch of claimed rules and advance the rules"""
+        by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        operations = []
+        for rule in rules:
+            dates, next_run = self._due_dates(rule, now)
+            for date in dates:
+                by_user[rule["user_id"]].append({
+                    "amount": rule["amount"],
+                    "currency": rule.get("currency") or settings.DEFAULT_CURRENCY,
+                    "category": rule["category"],
+                    "description": rule["description"],
+                    "terms": tokenize(rule["description"]),
+                    "date": date,
+                    "created_at": now,
+                    "recurring_rule_id": str(rule["_id"]),
+                    "occurrence_key": occurrence_key(rule["_id"], date)
+                })
+            advance = {"next_run": next_run}
+            if dates:
+                advance["last_occurrence"] = dates[-1]
+            if next_run is None:
+                advance["active"] = False
+            # Skipped if the rule was edited meanwhile; the edit already set next_run
+            operations.append(UpdateOne(
+                {"_id": rule["_id"], "next_run": rule["next_run"]},
+                {"$set": advance}
+            ))
+            operations.append(UpdateOne({"_id": rule["_id"]}, {"$unset": {"locked_until": ""}}))
+
+        for user_id, expenses in by_user.items():
+            if get_storage_mode(user_id) == BUCKET:
+                existing = self._existing_keys(user_id, [expense["occurrence_key"] for expense in expenses])
+                by_user[user_id] = [expense for expense in expenses if expense["occurrence_key"] not in existing]
+        # Occurrences written by a run that crashed before advancing its rules
+        # hit the occurrence_key index and are skipped
+        created = expense_service.insert_expenses(by_user)
+
+        if operations:
+            self.rules.bulk_write(operations, ordered=True)
+        return created
+
+    def materialize_due(self, now: Optional[datetime] = None) -> int:
+        """Materialize every due occurrence; returns the number of expenses created"""
+        now = now or datetime.utcnow()
+        total = 0
+        while True:
+            rules = self._claim_batch(now)
+            if not rules:
+                return total
+            total += self._materialize(rules, now)
+
+    def run(self) -> None:
+        """
+        Materialize due occurrences every RECURRING_INTERVAL_SECONDS while
+        holding the lease, until stop() is called
+        """
+        while not self._stop.is_set():
+            try:
+                if self._lease.acquire():
+                    created = self.materialize_due()
+                    if created:
+                        logger.info("Materialized %d recurring expenses", created)
+            except PyMongoError:
+                logger.exception("Recurring expense run failed, retrying")
+            self._stop.wait(settings.RECURRING_INTERVAL_SECONDS)
+        try:
+            self._lease.release()
+        except PyMongoError:
+            logger.warning("Could not release the recurring scheduler lease", exc_info=True)
+
+    def start(self) -> None:
+        """Run the scheduler in a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="recurring-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the scheduler and wait for the current batch to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+recurring_scheduler = RecurringScheduler()
@@ -1,9 +1,88 @@
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 from collections import defaultdict
 from bson import ObjectId
+from app.core.cache import get_cache, get_generation, bump_generation
+from app.core.config import settings
 from app.core.database import get_database
+from app.core.sharding import user_collection
+from app.core.tracing import current_span, get_tracer, traced
+from app.models.expense_store import BUCKET, aggregate_expenses, bucket_store, get_archive_cutoff, get_storage_mode
+from app.services.archive import get_archived_summary
+from app.services.fx import convert_totals, get_user_currency
+from app.utils.money import from_minor
 
+
+def report_cache_key(user_id: str, kind: str, *parts) -> str:
+    """Build a cache key for a report, scoped to the user's current report generation"""
+    generation = get_generation(f"reports:{user_id}")
+    return f"report:{user_id}:{generation}:{kind}:" + ":".join(str(part) for part in parts)
+
+
+def invalidate_user_reports(user_id: str) -> None:
+    """Invalidate every cached report for a user (call after any expense write)"""
+    bump_generation(f"reports:{user_id}")
+
+
+def aggregate_totals(user_id: str, pipeline: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Run a report pipeline ending in a $group of `total` (sum of amount) and
+    `count`, with the totals in the user's base currency. Also returns the
+    totals of currencies without FX rates, which are left out.
+    
+    For users with expenses in more than one currency each group is split
+    further by day and currency. Foreign expenses count with the base amount
+    stored when they were written, like budgets and live totals; the totals
+    of the rest (legacy ones, and those written without rates) are converted
+    with the day's rates in one vectorized step, then merged back.
+    """
+    if not get_user_currency(user_id)["foreign"]:
+        return list(aggregate_expenses(pipeline)), {}
+    
+    *stages, group = pipeline
+    split_id = {
+        "group": group["$group"]["_id"],
+        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+        "currency": {"$ifNull": ["$currency", settings.DEFAULT_CURRENCY]},
+        "stored": {"$gt": ["$base_amount", None]}
+    }
+    split_group = {
+        **group["$group"],
+        "_id": split_id,
+        "total": {"$sum": {"$ifNull": ["$base_amount", "$amount"]}}
+    }
+    stored, rows = [], []
+    for row in aggregate_expenses([*stages, {"$group": split_group}]):
+        totals = {**row["_id"], "total": row["total"], "count": row["count"]}
+        if totals.pop("stored", False):
+            stored.append(totals)
+        else:
+            rows.append(totals)
+    converted, unconverted = convert_totals(user_id, rows)
+    
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for row in stored + converted:
+        key = tuple(sorted(row["group"].items())) if isinstance(row["group"], dict) else row["group"]
+        totals = merged.setdefault(key, {"_id": row["group"], "total": 0, "count": 0})
+        totals["total"] += row["total"]
+        totals["count"] += row["count"]
+    return list(merged.values()), unconverted
+
+
+def _currency_fields(user_id: str, unconverted: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "currency": get_user_currency(user_id)["base"],
+        "unconverted": {currency: from_minor(total, currency) for currency, total in unconverted.items()}
+    }
+
+
+def _record_cache_hit(hit: bool) -> None:
+    span = current_span()
+    if span is not None:
+        span.set_attribute("cache.hit", hit)
+
+
+@traced("reports.daily")
 def get_daily_report(user_id: str, date: datetime) -> Dict:
     """
     Get expense summary for a single day.
@@ -20,6 +99,13 @@ def get_daily_report(user_id: str, date: datetime) -> Dict:
     start_date = datetime(date.year, date.month, date.day)
     end_date = start_date + timedelta(days=1)
     
+    cache = get_cache()
+    cache_key = report_cache_key(user_id, "daily", start_date.date())
+    cached = cache.get(cache_key)
+    _record_cache_hit(cached is not None)
+    if cached is not None:
+        return cached
+    
     pipeline = [
         {
             "$match": {
@@ -36,21 +122,26 @@ def get_daily_report(user_id: str, date: datetime) -> Dict:
         }
     ]
     print("Pipeline:", pipeline)
-    results = list(db.expenses.aggregate(pipeline))
+    results, unconverted = aggregate_totals(user_id, pipeline)
     print("Raw aggregation results:", results)
-    categories = {result["_id"]: result["total"] for result in results}
-    total_amount = sum(result["total"] for result in results)
-    expenses_count = sum(result["count"] for result in results)
-    final_result = {
-        "date": start_date.strftime("%Y-%m-%d"),
-        "total_amount": total_amount,
-        "expenses_count": expenses_count,
-        "categories": categories
-    }
+    with get_tracer().start_as_current_span("reports.postprocess"):
+        currency = get_user_currency(user_id)["base"]
+        categories = {result["_id"]: from_minor(result["total"], currency) for result in results}
+        total_amount = from_minor(sum(result["total"] for result in results), currency)
+        expenses_count = sum(result["count"] for result in results)
+        final_result = {
+            "date": start_date.strftime("%Y-%m-%d"),
+            "total_amount": total_amount,
+            "expenses_count": expenses_count,
+            "categories": categories,
+            **_currency_fields(user_id, unconverted)
+        }
     print("Final return value:", final_result)
+    cache.set(cache_key, final_result, ttl=settings.REPORT_CACHE_TTL)
     return final_result
 
 
+@traced("reports.weekly")
 def get_weekly_report(user_id: str, date: datetime) -> Dict:
     """
     Get expense summary for a week with daily breakdown.
@@ -61,6 +152,12 @@ def get_weekly_report(user_id: str, date: datetime) -> Dict:
     start_of_week = date - timedelta(days=date.weekday())
     start_of_week = datetime(start_of_week.year, start_of_week.month, start_of_week.day)
     end_of_week = start_of_week + timedelta(days=7)
+    cache = get_cache()
+    cache_key = report_cache_key(user_id, "weekly", start_of_week.date())
+    cached = cache.get(cache_key)
+    _record_cache_hit(cached is not None)
+    if cached is not None:
+        return cached
     pipeline = [
         {
             "$match": {
@@ -79,46 +176,57 @@ def get_weekly_report(user_id: str, date: datetime) -> Dict:
             }
         }
     ]
-    results = list(db.expenses.aggregate(pipeline))
-    daily_data = defaultdict(lambda: {"total_amount": 0, "expenses_count": 0, "categories": {}})
-    overall_categories = defaultdict(float)
-    for result in results:
-        date_str = result["_id"]["date"]
-        category = result["_id"]["category"]
-        amount = result["total"]
-        count = result["count"]
-        daily_data[date_str]["total_amount"] += amount
-        daily_data[date_str]["expenses_count"] += count
-        daily_data[date_str]["categories"][category] = amount
-        overall_categories[category] += amount
-    daily_breakdown = []
-    for i in range(7):
-        current_date = start_of_week + timedelta(days=i)
-        date_str = current_date.strftime("%Y-%m-%d")
-        if date_str in daily_data:
-            daily_breakdown.append({
-                "date": date_str,
-                **daily_data[date_str]
-            })
-        else:
-            daily_breakdown.append({
-                "date": date_str,
-                "total_amount": 0,
-                "expenses_count": 0,
-                "categories": {}
-            })
-    total_amount = sum(data["total_amount"] for data in daily_breakdown)
-    expenses_count = sum(data["expenses_count"] for data in daily_breakdown)
-    return {
-        "week_start": start_of_week.strftime("%Y-%m-%d"),
-        "week_end": (end_of_week - timedelta(days=1)).strftime("%Y-%m-%d"),
-        "total_amount": total_amount,
-        "expenses_count": expenses_count,
-        "daily_breakdown": daily_breakdown,
-        "categories": dict(overall_categories)
-    }
+    results, unconverted = aggregate_totals(user_id, pipeline)
+    with get_tracer().start_as_current_span("reports.postprocess"):
+        currency = get_user_currency(user_id)["base"]
+        daily_data = defaultdict(lambda: {"total_amount": 0, "expenses_count": 0, "categories": {}})
+        overall_categories = defaultdict(int)
+        for result in results:
+            date_str = result["_id"]["date"]
+            category = result["_id"]["category"]
+            amount = result["total"]
+            count = result["count"]
+            daily_data[date_str]["total_amount"] += amount
+            daily_data[date_str]["expenses_count"] += count
+            daily_data[date_str]["categories"][category] = amount
+            overall_categories[category] += amount
+        daily_breakdown = []
+        for i in range(7):
+            current_date = start_of_week + timedelta(days=i)
+            date_str = current_date.strftime("%Y-%m-%d")
+            if date_str in daily_data:
+                day = daily_data[date_str]
+                daily_breakdown.append({
+                    "date": date_str,
+                    "total_amount": from_minor(day["total_amount"], currency),
+                    "expenses_count": day["expenses_count"],
+                    "categories": {
+                        category: from_minor(amount, currency) for category, amount in day["categories"].items()
+                    }
+                })
+            else:
+                daily_breakdown.append({
+                    "date": date_str,
+                    "total_amount": 0,
+                    "expenses_count": 0,
+                    "categories": {}
+                })
+        total_amount = from_minor(sum(day["total_amount"] for day in daily_data.values()), currency)
+        expenses_count = sum(data["expenses_count"] for data in daily_breakdown)
+        report = {
+            "week_start": start_of_week.strftime("%Y-%m-%d"),
+            "week_end": (end_of_week - timedelta(days=1)).strftime("%Y-%m-%d"),
+            "total_amount": total_amount,
+            "expenses_count": expenses_count,
+            "daily_breakdown": daily_breakdown,
+            "categories": {category: from_minor(amount, currency) for category, amount in overall_categories.items()},
+            **_currency_fields(user_id, unconverted)
+        }
+    cache.set(cache_key, report, ttl=settings.REPORT_CACHE_TTL)
+    return report
 
 
+@traced("reports.monthly")
 def get_monthly_report(user_id: str, year: int, month: int) -> Dict:
     """
     Get expense summary for a month.
@@ -130,6 +238,12 @@ def get_monthly_report(user_id: str, year: int, month: int) -> Dict:
         end_date = datetime(year + 1, 1, 1)
     else:
         end_date = datetime(year, month + 1, 1)
+    cache = get_cache()
+    cache_key = report_cache_key(user_id, "monthly", year, month)
+    cached = cache.get(cache_key)
+    _record_cache_hit(cached is not None)
+    if cached is not None:
+        return cached
     pipeline = [
         {
             "$match": {
@@ -145,20 +259,50 @@ def get_monthly_report(user_id: str, year: int, month: int) -> Dict:
             }
         }
     ]
-    results = list(db.expenses.aggregate(pipeline))
-    categories = {result["_id"]: result["total"] for result in results}
-    total_amount = sum(result["total"] for result in results)
-    expenses_count = sum(result["count"] for result in results)
-    days_in_month = (end_date - start_date).days
-    daily_average = total_amount / days_in_month if days_in_month > 0 else 0
-    return {
-        "month": start_date.strftime("%B"),
-        "year": year,
-        "total_amount": total_amount,
-        "expenses_count": expenses_count,
-        "categories": categories,
-        "daily_average": daily_average
-    }
+    cutoff = get_archive_cutoff()
+    archived = cutoff is not None and start_date < cutoff
+    unconverted: Dict[str, int] = {}
+    # The precomputed totals do not tell currencies apart, so they are only
+    # used for users whose expenses are all in their base currency
+    multi_currency = get_user_currency(user_id)["foreign"]
+    if (archived or get_storage_mode(user_id) == BUCKET) and not multi_currency:
+        # Whole-month totals are precomputed for archived months and in the
+        # user's buckets; only expenses still in the expenses collection need
+        # aggregating
+        summaries = []
+        if archived:
+            summaries.append(get_archived_summary(user_id, start_date, start_date))
+        if get_storage_mode(user_id) == BUCKET:
+            summaries.append(bucket_store.summary(user_id, start_date, start_date))
+        totals = defaultdict(lambda: {"total": 0, "count": 0})
+        for summary in summaries:
+            for category, category_totals in summary["categories"].items():
+                totals[category]["total"] += category_totals["total"]
+                totals[category]["count"] += category_totals["count"]
+        for result in user_collection("expenses").aggregate(pipeline):
+            totals[result["_id"]]["total"] += result["total"]
+            totals[result["_id"]]["count"] += result["count"]
+        results = [{"_id": category, **category_totals} for category, category_totals in totals.items()]
+    else:
+        results, unconverted = aggregate_totals(user_id, pipeline)
+    with get_tracer().start_as_current_span("reports.postprocess"):
+        currency = get_user_currency(user_id)["base"]
+        categories = {result["_id"]: from_minor(result["total"], currency) for result in results}
+        total_amount = from_minor(sum(result["total"] for result in results), currency)
+        expenses_count = sum(result["count"] for result in results)
+        days_in_month = (end_date - start_date).days
+        daily_average = total_amount / days_in_month if days_in_month > 0 else 0
+        report = {
+            "month": start_date.strftime("%B"),
+            "year": year,
+            "total_amount": total_amount,
+            "expenses_count": expenses_count,
+            "categories": categories,
+            "daily_average": daily_average,
+            **_currency_fields(user_id, unconverted)
+        }
+    cache.set(cache_key, report, ttl=settings.REPORT_CACHE_TTL)
+    return report
 
 
 # Helper function to simplify date range queries
@@ -189,14 +333,16 @@ def get_expenses_summary(user_id: str, start_date: datetime, end_date: datetime)
         }
     ]
     
-    results = list(db.expenses.aggregate(pipeline))
+    results, unconverted = aggregate_totals(user_id, pipeline)
+    currency = get_user_currency(user_id)["base"]
     
-    categories = {result["_id"]: result["total"] for result in results}
-    total_amount = sum(result["total"] for result in results)
+    categories = {result["_id"]: from_minor(result["total"], currency) for result in results}
+    total_amount = from_minor(sum(result["total"] for result in results), currency)
     expenses_count = sum(result["count"] for result in results)
     
     return {
         "total_amount": total_amount,
         "expenses_count": expenses_count,
-        "categories": categories
+        "categories": categories,
+        **_currency_fields(user_id, unconverted)
     }
\ No newline at end of file
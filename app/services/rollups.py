@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from app.core.database import get_database
+from app.services.reports import aggregate_totals
+
+
+def day_start(value: datetime) -> datetime:
+    """Truncate a datetime to the start of its day"""
+    return datetime(value.year, value.month, value.day)
+
+
+def recompute_daily_rollup(user_id: str, day: datetime) -> None:
+    """
+    Rebuild a user's per-category totals for one day from the expenses collection.
+
+    Recomputing (rather than applying $inc deltas) keeps the rollup correct when
+    the same change is processed twice, e.g. after resuming a change stream.
+    """
+    db = get_database()
+    start = day_start(day)
+    end = start + timedelta(days=1)
+
+    pipeline = [
+        {"$match": {"user_id": user_id, "date": {"$gte": start, "$lt": end}}},
+        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+    ]
+    # In the user's base currency; amounts without FX rates are left out
+    results, _ = aggregate_totals(user_id, pipeline)
+
+    operations = [
+        UpdateOne(
+            {"user_id": user_id, "day": start, "category": result["_id"]},
+            {"$set": {"total": result["total"], "count": result["count"]}},
+            upsert=True
+        )
+        for result in results
+    ]
+    if operations:
+        db.expense_daily_rollups.bulk_write(operations, ordered=False)
+
+    db.expense_daily_rollups.delete_many({
+        "user_id": user_id,
+        "day": start,
+        "category": {"$nin": [result["_id"] for result in results]}
+    })
+
+
+def rebuild_user_rollups(user_id: str, month: Optional[datetime] = None) -> None:
+    """Rebuild every daily rollup for a user, or only those of one month"""
+    db = get_database()
+    match = {"user_id": user_id}
+    if month is not None:
+        next_month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        match["date"] = {"$gte": month, "$lt": next_month}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "day": {"$dateTrunc": {"date": "$date", "unit": "day"}},
+                "category": "$category"
+            },
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    results, _ = aggregate_totals(user_id, pipeline)
+
+    rollup_filter = {"user_id": user_id}
+    if month is not None:
+        rollup_filter["day"] = match["date"]
+    db.expense_daily_rollups.delete_many(rollup_filter)
+    if results:
+        db.expense_daily_rollups.insert_many([
+            {
+                "user_id": user_id,
+                "day": result["_id"]["day"],
+                "category": result["_id"]["category"],
+                "total": result["total"],
+                "count": result["count"]
+            }
+            for result in results
+        ])
+
+
+def get_daily_totals(user_id: str, start_date: datetime, end_date: datetime) -> List[Dict]:
+    """Get per-day totals (in minor units of the base currency) for a user from the rollups, ordered by day"""
+    db = get_database()
+    pipeline = [
+        {"$match": {"user_id": user_id, "day": {"$gte": start_date, "$lt": end_date}}},
+        {"$group": {"_id": "$day", "total": {"$sum": "$total"}, "count": {"$sum": "$count"}}},
+        {"$sort": {"_id": 1}}
+    ]
+    return [
+        {"day": result["_id"], "total": result["total"], "count": result["count"]}
+        for result in db.expense_daily_rollups.aggregate(pipeline)
+    ]
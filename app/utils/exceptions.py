@@ -65,6 +65,15 @@ class ConflictException(AppException):
         )
 
 
+class UnprocessableEntityException(AppException):
+    """Unprocessable entity exception"""
+    def __init__(self, detail: str):
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=detail
+        )
+
+
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """Handle HTTP exceptions"""
     return JSONResponse(
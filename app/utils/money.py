@@ -0,0 +1,44 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Union
+from app.core.config import settings
+
+# ISO 4217 minor unit exponents that differ from the usual 2
+CURRENCY_EXPONENTS = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0,
+    "KRW": 0, "PYG": 0, "RWF": 0, "UGX": 0, "VND": 0, "VUV": 0, "XAF": 0,
+    "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+
+
+def currency_exponent(currency: str = None) -> int:
+    """Number of decimal digits in the currency's minor unit"""
+    return CURRENCY_EXPONENTS.get(currency or settings.DEFAULT_CURRENCY, 2)
+
+
+def to_minor(amount: Union[float, Decimal, str], currency: str = None) -> int:
+    """Convert an amount in major units (e.g. 12.34 USD) to integer minor units (1234)"""
+    exponent = currency_exponent(currency)
+    scaled = Decimal(str(amount)).scaleb(exponent)
+    return int(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(amount: Union[int, float], currency: str = None) -> float:
+    """
+    Convert integer minor units to major units for API responses.
+
+    Floats are returned unchanged: they are amounts stored before the
+    migration to minor units (see scripts/migrate_money.py), which the API
+    does not start without (see check_money_migrated).
+    """
+    if isinstance(amount, float):
+        return amount
+    return float(Decimal(amount).scaleb(-currency_exponent(currency)))
+
+
+def format_minor(amount: Union[int, float], currency: str = None) -> str:
+    """Format minor units as an exact decimal string, e.g. 1234 -> "12.34" """
+    if isinstance(amount, float):
+        return str(amount)
+    exponent = currency_exponent(currency)
+    return str(Decimal(amount).scaleb(-exponent).quantize(Decimal(1).scaleb(-exponent)))
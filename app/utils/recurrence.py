@@ -0,0 +1,65 @@
+"""
+Occurrence dates of recurring expense rules.
+
+A small subset of RFC 5545 RRULE: FREQ (DAILY/WEEKLY/MONTHLY/YEARLY) with
+INTERVAL, BYDAY for weekly rules, BYMONTHDAY for monthly rules, UNTIL and
+COUNT. Unlike RRULE, days past the end of a month are clamped to its last
+day instead of being skipped, so "the 31st" falls on Feb 28/29 and rent
+due on the 31st is never silently dropped.
+"""
+import calendar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+# Bounds the search for the next occurrence of a rule that can never match again
+MAX_PERIODS = 100000
+
+
+def _clamped(year: int, month: int, day: int, template: datetime) -> datetime:
+    last_day = calendar.monthrange(year, month)[1]
+    day = last_day if day == -1 else min(day, last_day)
+    return template.replace(year=year, month=month, day=day)
+
+
+def _period_dates(rule: Dict[str, Any], period: int) -> List[datetime]:
+    """Candidate dates of the rule's nth period, in order"""
+    start = rule["start_date"]
+    step = period * rule.get("interval", 1)
+    frequency = rule["frequency"]
+
+    if frequency == "DAILY":
+        return [start + timedelta(days=step)]
+    if frequency == "WEEKLY":
+        week_start = start - timedelta(days=start.weekday()) + timedelta(weeks=step)
+        weekdays = sorted(set(rule.get("by_weekday") or [start.weekday()]))
+        return [week_start + timedelta(days=weekday) for weekday in weekdays]
+    if frequency == "MONTHLY":
+        month_index = start.month - 1 + step
+        day = rule.get("by_month_day") or start.day
+        return [_clamped(start.year + month_index // 12, month_index % 12 + 1, day, start)]
+    if frequency == "YEARLY":
+        return [_clamped(start.year + step, start.month, start.day, start)]
+    raise ValueError(f"Unknown frequency: {frequency}")
+
+
+def iter_occurrences(rule: Dict[str, Any]) -> Iterator[datetime]:
+    """All occurrences of a rule in order, honouring until and count"""
+    until = rule.get("until")
+    count = rule.get("count")
+    produced = 0
+    for period in range(MAX_PERIODS):
+        for date in _period_dates(rule, period):
+            if date < rule["start_date"]:
+                continue
+            if (until is not None and date > until) or (count is not None and produced >= count):
+                return
+            produced += 1
+            yield date
+
+
+def next_occurrence(rule: Dict[str, Any], after: Optional[datetime] = None) -> Optional[datetime]:
+    """The first occurrence strictly after `after` (the first one if None), or None"""
+    for date in iter_occurrences(rule):
+        if after is None or date > after:
+            return date
+    return None
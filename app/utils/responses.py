@@ -1,6 +1,9 @@
 from typing import Any, Dict, Optional, List
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+from app.core.tracing import get_tracer
+
 
 class StandardResponse(BaseModel):
     """Standard API response format"""
@@ -59,4 +62,14 @@ class ErrorResponse(BaseModel):
                     }
                 ]
             }
-        }
\ No newline at end of file
+        }
+
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse whose encoding is recorded as a span of the request's trace"""
+
+    def render(self, content: Any) -> bytes:
+        with get_tracer().start_as_current_span("http.serialize") as span:
+            body = super().render(content)
+            if span is not None:
+                span.set_attribute("http.response.body.size", len(body))
+            return body
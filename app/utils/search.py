@@ -0,0 +1,41 @@
+import base64
+import re
+from datetime import datetime
+from typing import List, Tuple
+from bson import ObjectId
+from app.utils.exceptions import BadRequestException
+
+# Keeps the stored term list (and query fan-out) bounded for long descriptions
+MAX_TERMS = 64
+MAX_QUERY_TERMS = 8
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str, limit: int = MAX_TERMS) -> List[str]:
+    """Split text into unique lowercase word tokens, in order of first appearance"""
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token not in terms:
+            terms.append(token)
+            if len(terms) == limit:
+                break
+    return terms
+
+
+def encode_cursor(score: int, date: datetime, expense_id: str) -> str:
+    """Opaque pagination cursor for a search result position"""
+    raw = f"{score}|{date.isoformat()}|{expense_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, datetime, str]:
+    """Decode a cursor from encode_cursor, rejecting anything else"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        score, date, expense_id = raw.split("|")
+        if not ObjectId.is_valid(expense_id):
+            raise ValueError(expense_id)
+        return int(score), datetime.fromisoformat(date), expense_id
+    except ValueError:
+        raise BadRequestException("Invalid search cursor")
@@ -0,0 +1,36 @@
+"""
+Gunicorn configuration for production:
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master and workers are forked from it
+(preload), so workers start fast and share the imported code's memory.
+Nothing connects to MongoDB or Redis at import time; each worker opens its
+own connections after fork, in its lifespan. On SIGTERM, workers stop
+accepting connections and finish in-flight requests for up to
+GRACEFUL_TIMEOUT_SECONDS before exiting.
+"""
+from app.core.config import settings
+from app.core.server import worker_count
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = worker_count()
+worker_class = "app.core.gunicorn_worker.UvicornWorker"
+preload_app = True
+keepalive = settings.KEEPALIVE_SECONDS
+# The master kills workers still running this long after SIGTERM
+graceful_timeout = settings.GRACEFUL_TIMEOUT_SECONDS + 5
+timeout = 60
+forwarded_allow_ips = settings.FORWARDED_ALLOW_IPS
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # PyMongo clients and Redis connections are not fork-safe. None should
+    # exist in the master, but never let a worker inherit one.
+    from app.core import cache, database, tracing
+    from app.services import events
+    database.client = None
+    database.database = None
+    cache._cache = None
+    events._broker = None
+    tracing._tracer = None
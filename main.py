@@ -1,24 +1,50 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import uvicorn
 
 from app.core.config import settings
-from app.core.database import connect_to_mongo, close_mongo_connection
-from app.routes import auth, expenses, reports
+from app.core.lifecycle import lifecycle
+from app.middleware import (
+    AuthMiddleware, CompressionMiddleware, ProfilingMiddleware, RateLimitMiddleware, TracingMiddleware
+)
+from app.routes import admin, auth, budgets, expenses, recurring, reports
+from app.utils.responses import TracedJSONResponse
 from app.utils.exceptions import (
     http_exception_handler, 
     validation_exception_handler, 
     general_exception_handler
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connecting and warmup continue in the background; see /readyz
+    await lifecycle.startup()
+    yield
+    await lifecycle.shutdown()
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     description="RESTful API for tracking personal expenses with AI-powered insights",
-    version=settings.VERSION
+    version=settings.VERSION,
+    lifespan=lifespan,
+    # JSON encoding of responses is traced as its own span
+    default_response_class=TracedJSONResponse
 )
 
+# On-demand profiling, inside authentication so it knows who asked for it
+app.add_middleware(ProfilingMiddleware)
+
+# Authentication
+app.add_middleware(AuthMiddleware)
+
+# Rate limiting, outside authentication so requests it rejects still count,
+# and inside CORS so browsers can read 401 and 429 responses
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,24 +54,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression, so every response passes through it
+app.add_middleware(CompressionMiddleware)
+
+# Tracing, outermost so the request span covers every other middleware
+app.add_middleware(TracingMiddleware)
+
 # Exception handlers
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 
-# Startup and shutdown events
-@app.on_event("startup")
-async def startup_event():
-    connect_to_mongo()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    close_mongo_connection()
-
 # Include routers
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(expenses.router, prefix="/api/v1")
 app.include_router(reports.router, prefix="/api/v1")
+app.include_router(recurring.router, prefix="/api/v1")
+app.include_router(budgets.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
 
 
 
@@ -67,6 +93,23 @@ async def health_check():
         "service": "expense-tracker-api",
         "version": settings.VERSION
     }
+
+
+@app.get("/livez", tags=["Health"])
+async def liveness():
+    """Liveness probe: the process is up and serving"""
+    return {"status": "alive"}
+
+
+@app.get("/readyz", tags=["Health"])
+async def readiness(response: Response):
+    """Readiness probe: connected, warmed up and MongoDB answering pings"""
+    report = await lifecycle.readiness()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
     
 if __name__ == "__main__":
-    uvicorn.run("main:app", port=8000, reload=True)
\ No newline at end of file
+    # Development server; use serve.py or gunicorn.conf.py in production
+    uvicorn.run("main:app", port=settings.PORT, reload=settings.DEBUG)
\ No newline at end of file
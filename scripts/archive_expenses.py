@@ -0,0 +1,46 @@
+"""
+Move expenses older than ARCHIVE_AFTER_DAYS into the compressed archive.
+
+The new cutoff is published first; after one cache TTL every API process
+reads through to the archive for ranges before it, and only then are
+expenses moved. Archived months get frozen summaries used by reports.
+Meant to run periodically (e.g. monthly from cron); re-running is safe.
+
+Usage:
+    python -m scripts.archive_expenses [--days 730] [--batch-size 1000]
+"""
+import argparse
+import time
+
+from app.core.config import settings
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.services.archive import archive_cutoff_for, archive_expenses, publish_archive_cutoff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                        help="Archive expenses older than this many days (rounded down to a month)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-wait", action="store_true",
+                        help="Skip waiting for API processes to pick up the new cutoff")
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    cutoff = archive_cutoff_for(args.days)
+    publish_archive_cutoff(cutoff)
+    if not args.no_wait:
+        print(f"Waiting {settings.USER_CACHE_TTL}s for API processes to pick up the archive cutoff...")
+        time.sleep(settings.USER_CACHE_TTL)
+
+    print(f"Archiving expenses dated before {cutoff:%Y-%m-%d}")
+    stats = archive_expenses(cutoff, args.batch_size)
+    print(
+        f"Archived {stats['documents']} expense documents and {stats['buckets']} buckets, "
+        f"{stats['months_summarized']} monthly summaries refreshed"
+    )
+    close_mongo_connection()
+
+
+if __name__ == "__main__":
+    main()
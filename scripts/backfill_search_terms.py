@@ -0,0 +1,72 @@
+"""
+Add search terms to expenses written before description search existed.
+
+Expense documents (hot and archived) and bucketed expenses without a
+`terms` field get one derived from their description, in batches, so the
+backfill can be stopped and re-run at any time. Until it has run, older
+expenses don't appear in search results.
+
+Usage:
+    python -m scripts.backfill_search_terms [--batch-size 1000]
+"""
+import argparse
+from pymongo import UpdateOne
+
+from app.core.database import connect_to_mongo, close_mongo_connection, get_database
+from app.utils.search import tokenize
+
+
+def backfill_documents(collection_name: str, batch_size: int) -> int:
+    """Add terms to flat expense documents, one _id-ordered batch at a time"""
+    collection = get_database()[collection_name]
+    updated = 0
+    last_id = None
+    while True:
+        query = {"terms": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(collection.find(query, {"description": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return updated
+        collection.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"terms": tokenize(doc.get("description") or "")}})
+            for doc in batch
+        ], ordered=False)
+        last_id = batch[-1]["_id"]
+        updated += len(batch)
+        print(f"  {collection_name}: {updated} expenses updated")
+
+
+def backfill_buckets() -> int:
+    """Add terms to bucketed expenses, one bucket at a time"""
+    buckets = get_database().expense_buckets
+    updated = 0
+    for bucket in buckets.find({"expenses": {"$elemMatch": {"terms": {"$exists": False}}}}):
+        operations = [
+            UpdateOne(
+                {"_id": bucket["_id"], "expenses._id": expense["_id"]},
+                {"$set": {"expenses.$.terms": tokenize(expense.get("description") or "")}}
+            )
+            for expense in bucket["expenses"] if "terms" not in expense
+        ]
+        if operations:
+            buckets.bulk_write(operations, ordered=False)
+            updated += len(operations)
+    print(f"  expense_buckets: {updated} expenses updated")
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    backfill_documents("expenses", args.batch_size)
+    backfill_documents("expenses_archive", args.batch_size)
+    backfill_buckets()
+    close_mongo_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Measure per-request authentication overhead.
+
+Calls minimal apps in-process over ASGI (no sockets), so the numbers are
+framework and auth cost only:
+
+- none: the route without authentication, as a baseline
+- dependency: `get_current_user` resolving the token on every request
+- middleware: AuthMiddleware resolving the user once into the request
+  state, with `get_current_user` reusing it
+
+The user lookup goes through the configured cache, so run with the
+cache backend used in production for representative numbers.
+
+Usage:
+    python -m scripts.bench_auth --email user@example.com [--requests 20000]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import Depends, FastAPI
+
+from app.core.auth import get_current_user
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.security import create_access_token
+from app.middleware import AuthMiddleware
+from app.models.user import user_service
+
+PATH = "/api/v1/ping"
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI()
+    if mode == "none":
+        @app.get(PATH)
+        async def ping():
+            return {"ok": True}
+    else:
+        @app.get(PATH)
+        async def ping(current_user=Depends(get_current_user)):
+            return {"ok": True}
+    if mode == "middleware":
+        app.add_middleware(AuthMiddleware)
+    return app
+
+
+async def run(app, token: str, requests: int) -> float:
+    """Mean microseconds per request"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": PATH,
+        "raw_path": PATH.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    status = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    # Warm up caches and lazily built route state
+    for _ in range(100):
+        await app(dict(scope, state={}), receive, send)
+    if status[-1] != 200:
+        raise SystemExit(f"Request failed with status {status[-1]}")
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope, state={}), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", required=True, help="Existing user to authenticate as")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    if asyncio.run(user_service.get_user_for_auth(args.email)) is None:
+        raise SystemExit(f"No user with email {args.email}")
+    token = create_access_token({"sub": args.email})
+
+    results = {}
+    for mode in ("none", "dependency", "middleware"):
+        results[mode] = asyncio.run(run(build_app(mode), token, args.requests))
+    close_mongo_connection()
+
+    for mode, micros in results.items():
+        overhead = micros - results["none"]
+        print(f"{mode:<12} {micros:8.1f} us/request  (+{overhead:.1f} us auth)")
+
+
+if __name__ == "__main__":
+    main()
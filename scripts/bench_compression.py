@@ -0,0 +1,117 @@
+"""
+Measure compressed size and CPU time of each encoding on representative payloads.
+
+Payloads are generated locally in the shape the API returns them:
+
+- expense_list: a GET /expenses page of 100 expenses (JSON)
+- weekly_report: a GET /reports/weekly response (JSON)
+- csv_export: a 5000-row GET /reports/export/csv download, compressed in
+  1000-row chunks with a flush after each, as the streaming middleware does
+
+brotli and zstd are measured only when the `brotli` and `zstandard`
+packages are installed.
+
+Usage:
+    python -m scripts.bench_compression [--repeat 20]
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.middleware.compression import (
+    BrotliEncoder, GzipEncoder, ZstdEncoder, _load_brotli, _load_zstandard
+)
+from app.schemas.expense import ExpenseType
+
+WORDS = ["coffee", "lunch", "groceries", "uber", "train", "rent", "electricity",
+         "pharmacy", "cinema", "books", "amazon", "dinner", "gym", "internet"]
+
+
+def expense(rng: random.Random, index: int, now: datetime) -> dict:
+    return {
+        "id": f"{0x650000000000000000000000 + index:024x}",
+        "user_id": "6500000000000000000000aa",
+        "amount": round(rng.uniform(1, 200), 2),
+        "category": rng.choice(list(ExpenseType)).value,
+        "description": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))),
+        "date": (now - timedelta(hours=index * 7)).isoformat(),
+        "created_at": (now - timedelta(hours=index * 7)).isoformat(),
+        "updated_at": None
+    }
+
+
+def payloads(rng: random.Random):
+    now = datetime(2024, 6, 1, 12)
+    expenses = [expense(rng, index, now) for index in range(100)]
+    yield "expense_list", [json.dumps({"expenses": expenses, "total": 2345}).encode()]
+
+    categories = {category.value: round(rng.uniform(10, 500), 2) for category in ExpenseType}
+    days = [
+        {"date": (now - timedelta(days=day)).strftime("%Y-%m-%d"), "total_amount": rng.uniform(10, 200),
+         "expenses_count": rng.randint(0, 10), "categories": categories}
+        for day in range(7)
+    ]
+    yield "weekly_report", [json.dumps({
+        "week_start": days[-1]["date"], "week_end": days[0]["date"], "total_amount": 812.4,
+        "expenses_count": 31, "daily_breakdown": days, "categories": categories
+    }).encode()]
+
+    chunks = []
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Date", "Amount", "Category", "Description"])
+    for index in range(5000):
+        row = expense(rng, index, now)
+        writer.writerow([row["created_at"], f"{row['amount']:.2f} USD", row["category"], row["description"]])
+        if (index + 1) % 1000 == 0:
+            chunks.append(output.getvalue().encode())
+            output.seek(0)
+            output.truncate()
+    yield "csv_export", chunks
+
+
+def encoders():
+    yield "gzip-1", lambda: GzipEncoder(1)
+    yield "gzip-6", lambda: GzipEncoder(6)
+    yield "gzip-9", lambda: GzipEncoder(9)
+    brotli = _load_brotli()
+    if brotli is not None:
+        for quality in (1, 5, 11):
+            yield f"br-{quality}", lambda quality=quality: BrotliEncoder(brotli, quality)
+    zstandard = _load_zstandard()
+    if zstandard is not None:
+        for level in (1, 3, 9):
+            yield f"zstd-{level}", lambda level=level: ZstdEncoder(zstandard, level)
+
+
+def compress(make_encoder, chunks) -> bytes:
+    encoder = make_encoder()
+    parts = [encoder.compress(chunk) for chunk in chunks[:-1]]
+    parts.append(encoder.finish(chunks[-1]))
+    return b"".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    for name, chunks in payloads(rng):
+        size = sum(len(chunk) for chunk in chunks)
+        print(f"{name}: {size} bytes in {len(chunks)} chunk(s)")
+        for encoding, make_encoder in encoders():
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                compressed = compress(make_encoder, chunks)
+            elapsed = (time.perf_counter() - started) / args.repeat
+            print(f"  {encoding:<8} {len(compressed):>8} bytes  {len(compressed) / size:6.1%}"
+                  f"  {elapsed * 1e3:8.3f} ms  {size / elapsed / 1e6:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compare API throughput with different worker counts.
+
+For each worker count, starts `serve.py` on a local port, waits for
+/readyz, then drives it for a fixed duration from several load generator
+processes (so the client is not the bottleneck) and reports requests per
+second and latency percentiles. The server needs a reachable MongoDB, and
+more than one worker needs the Redis cache, rate limit and events backends.
+
+Usage:
+    python -m scripts.bench_server [--workers 1 4] [--path /livez] [--token JWT]
+                                   [--duration 15] [--concurrency 64] [--clients 4]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+
+async def _drive(url: str, token: Optional[str], duration: float, concurrency: int) -> List[float]:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: List[float] = []
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+        async def loop():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get(url)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return latencies
+
+
+def drive(url: str, token: Optional[str], duration: float, concurrency: int) -> List[float]:
+    """Load generator process: latencies of successful requests"""
+    return asyncio.run(_drive(url, token, duration, concurrency))
+
+
+def wait_ready(base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit("Server did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--path", default="/livez")
+    parser.add_argument("--token", help="Bearer token for authenticated paths")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--concurrency", type=int, default=64, help="Connections per client process")
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    for workers in args.workers:
+        env = {
+            **os.environ,
+            "WEB_CONCURRENCY": str(workers),
+            "HOST": "127.0.0.1",
+            "PORT": str(args.port),
+            # Disable request limits so they do not cap the measurement
+            "RATE_LIMIT_AUTH": "", "RATE_LIMIT_CRUD": "", "RATE_LIMIT_REPORTS": "", "RATE_LIMIT_EXPORT": "",
+        }
+        server = subprocess.Popen([sys.executable, "serve.py"], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(base_url)
+            with ProcessPoolExecutor(max_workers=args.clients) as pool:
+                futures = [
+                    pool.submit(drive, base_url + args.path, args.token, args.duration, args.concurrency)
+                    for _ in range(args.clients)
+                ]
+                latencies = np.concatenate([future.result() for future in futures])
+        finally:
+            server.terminate()
+            server.wait()
+
+        if not len(latencies):
+            print(f"{workers:>3} workers: no successful requests")
+            continue
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{workers:>3} workers: {len(latencies) / args.duration:9.0f} req/s"
+              f"  p50 {p50:6.1f} ms  p99 {p99:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Check that serving requests never scatters queries over every shard.
+
+The script starts a throwaway sharded cluster from local binaries: a config
+server, --shards single-node shard replica sets and a mongos, all on
+localhost ports under a temporary directory. Pass --mongos-url to use an
+existing cluster instead.
+
+It shards the expense collections with scripts/setup_sharding.py, then
+exercises the expense, report and export endpoints for one user per storage
+layout. Every command sent to a sharded collection is recorded. Each
+recorded read, update and delete is then explained through mongos. The
+check fails if any of them would run on more than one shard
+(scatter-gather) or if any inserted document has no user_id.
+
+Needs mongod and mongos on PATH, or in --bin-dir.
+
+Usage:
+    python -m scripts.check_shard_targeting [--shards 2] [--bin-dir DIR] [--mongos-url URL]
+"""
+import argparse
+import copy
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.core.sharding import SHARDED_COLLECTIONS
+
+# Commands mongos can explain; inserts are routed by each document's shard key
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Command fields explain does not accept
+NOT_EXPLAINED = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern", "apiVersion"}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Records the commands sent to the sharded collections"""
+
+    def __init__(self):
+        self.recording = False
+        self.commands: List[Tuple[str, Dict[str, Any]]] = []
+
+    def started(self, event):
+        if not self.recording or event.command_name not in EXPLAINABLE | {"insert"}:
+            return
+        if event.command.get(event.command_name) not in SHARDED_COLLECTIONS:
+            return
+        command = {
+            key: copy.deepcopy(value) for key, value in event.command.items()
+            if not key.startswith("$") and key not in NOT_EXPLAINED
+        }
+        self.commands.append((event.command_name, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class LocalCluster:
+    """A sharded cluster of local mongod/mongos processes, removed on stop()"""
+
+    def __init__(self, bin_dir: Optional[str], shards: int, base_port: int):
+        self.bin_dir = bin_dir
+        self.shards = shards
+        self.base_port = base_port
+        self.directory = ""
+        self.processes: List[subprocess.Popen] = []
+
+    def _binary(self, name: str) -> str:
+        path = os.path.join(self.bin_dir, name) if self.bin_dir else shutil.which(name)
+        if not path or not os.path.exists(path):
+            raise SystemExit(f"{name} not found; install MongoDB or pass --bin-dir")
+        return path
+
+    def _spawn(self, name: str, args: List[str]) -> None:
+        log = open(os.path.join(self.directory, f"{name}.log"), "w")
+        self.processes.append(subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT))
+
+    def _mongod(self, name: str, port: int, role: str) -> None:
+        dbpath = os.path.join(self.directory, name)
+        os.makedirs(dbpath)
+        self._spawn(name, [
+            self._binary("mongod"), role, "--replSet", name, "--port", str(port),
+            "--dbpath", dbpath, "--bind_ip", "localhost"
+        ])
+        client = _connect(f"mongodb://localhost:{port}/?directConnection=true")
+        client.admin.command("replSetInitiate", {
+            "_id": name,
+            "configsvr": role == "--configsvr",
+            "members": [{"_id": 0, "host": f"localhost:{port}"}]
+        })
+        _wait(lambda: client.admin.command("hello").get("isWritablePrimary"), f"{name} primary")
+        client.close()
+
+    def start(self) -> str:
+        """Start the cluster; returns the mongos connection string"""
+        self.directory = tempfile.mkdtemp(prefix="shard-check-")
+        config_port = self.base_port
+        self._mongod("config", config_port, "--configsvr")
+        shard_ports = [self.base_port + 1 + i for i in range(self.shards)]
+        for i, port in enumerate(shard_ports):
+            self._mongod(f"shard{i}", port, "--shardsvr")
+
+        mongos_port = self.base_port + 1 + self.shards
+        self._spawn("mongos", [
+            self._binary("mongos"), "--configdb", f"config/localhost:{config_port}",
+            "--port", str(mongos_port), "--bind_ip", "localhost"
+        ])
+        url = f"mongodb://localhost:{mongos_port}"
+        client = _connect(url)
+        for i, port in enumerate(shard_ports):
+            client.admin.command("addShard", f"shard{i}/localhost:{port}")
+        client.close()
+        return url
+
+    def stop(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _wait(ready, what: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if ready():
+                return
+        except PyMongoError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Timed out waiting for {what}")
+
+
+def _connect(url: str) -> MongoClient:
+    client = MongoClient(url, serverSelectionTimeoutMS=2000)
+    _wait(lambda: client.admin.command("ping"), url)
+    return client
+
+
+def exercise(user_ids: List[str]) -> None:
+    """Call the expense, report and export endpoints as each user"""
+    from fastapi.testclient import TestClient
+    from app.core.security import create_access_token
+    from main import app
+
+    client = TestClient(app)
+    today = datetime.utcnow()
+    for user_id in user_ids:
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': f'{user_id}@shard-check.example.com'})}"}
+
+        def call(method: str, path: str, **kwargs):
+            response = client.request(method, f"/api/v1{path}", headers=headers, **kwargs)
+            if response.status_code >= 400:
+                raise SystemExit(f"{method} {path} failed: {response.status_code} {response.text}")
+            return response
+
+        ids = [
+            call("POST", "/expenses/", json={
+                "amount": 4.5 + i, "category": "FOOD", "description": f"coffee {i}",
+                "date": (today - timedelta(days=20 * i)).isoformat()
+            }).json()["id"]
+            for i in range(4)
+        ]
+        call("GET", "/expenses/", params={"limit": 10})
+        call("GET", "/expenses/search", params={"q": "coff"})
+        call("GET", "/expenses/changes", params={"since": 0})
+        call("GET", f"/expenses/{ids[0]}")
+        call("PUT", f"/expenses/{ids[0]}", json={"amount": 5})
+        call("POST", "/expenses/batch-get", json={"ids": ids})
+        call("PATCH", "/expenses/batch", json={"items": [{"id": ids[1], "description": "lunch"}, {"id": ids[2], "amount": 7}]})
+        call("GET", "/expenses/stats/summary")
+        call("GET", "/reports/daily")
+        call("GET", "/reports/weekly")
+        call("GET", "/reports/monthly")
+        call("GET", "/reports/export/csv")
+        call("POST", "/expenses/batch-delete", json={"ids": ids[2:]})
+        call("DELETE", f"/expenses/{ids[0]}")
+
+
+def explain_targets(db, name: str, command: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The shards each statement of a recorded command would run on"""
+    if name == "update":
+        statements = [{**command, "updates": [update]} for update in command["updates"]]
+    elif name == "delete":
+        statements = [{**command, "deletes": [delete]} for delete in command["deletes"]]
+    else:
+        statements = [command]
+
+    targets = []
+    for statement in statements:
+        explain = db.command("explain", statement, verbosity="queryPlanner")
+        if isinstance(explain.get("shards"), dict):
+            # Aggregations list the shards their pipeline was sent to
+            shards = sorted(explain["shards"])
+        else:
+            plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+            shards = sorted(shard["shardName"] for shard in plan.get("shards", []))
+        targets.append({"statement": statement, "shards": shards})
+    return targets
+
+
+def describe(name: str, command: Dict[str, Any]) -> str:
+    """Short form of a command for the report"""
+    if name == "aggregate":
+        first = command["pipeline"][0] if command["pipeline"] else {}
+        return f"aggregate {command['aggregate']} {first}"
+    if name in ("update", "delete"):
+        statement = command[f"{name}s"][0]
+        return f"{name} {command[name]} {statement.get('q')}"
+    return f"{name} {command[name]} {command.get('filter', command.get('query'))}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongos-url", help="Use an existing sharded cluster")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--bin-dir", help="Directory holding mongod and mongos")
+    parser.add_argument("--base-port", type=int, default=27100)
+    parser.add_argument("--database", default="expense_tracker_shard_check")
+    args = parser.parse_args()
+
+    cluster = None
+    url = args.mongos_url
+    if url is None:
+        cluster = LocalCluster(args.bin_dir, args.shards, args.base_port)
+        print(f"Starting a local cluster with {args.shards} shards")
+        url = cluster.start()
+
+    recorder = CommandRecorder()
+    monitoring.register(recorder)
+    settings.MONGODB_URL = url
+    settings.DATABASE_NAME = args.database
+
+    from app.core.database import connect_to_mongo, close_mongo_connection, get_database
+    from app.models.expense_store import BUCKET, DOCUMENT
+    from scripts.setup_sharding import shard_collections
+
+    failures = 0
+    try:
+        connect_to_mongo()
+        db = get_database()
+        for name, outcome in shard_collections(db):
+            print(f"  {name}: {outcome}")
+
+        user_ids = []
+        for storage in (DOCUMENT, BUCKET):
+            user_id = ObjectId()
+            db.users.insert_one({
+                "_id": user_id, "email": f"{user_id}@shard-check.example.com", "full_name": storage,
+                "is_active": True, "expense_storage": storage, "created_at": datetime.utcnow()
+            })
+            user_ids.append(str(user_id))
+
+        recorder.recording = True
+        exercise(user_ids)
+        recorder.recording = False
+
+        seen = set()
+        for name, command in recorder.commands:
+            if name == "insert":
+                missing = [document for document in command["documents"] if "user_id" not in document]
+                if missing:
+                    failures += 1
+                    print(f"FAIL insert {command['insert']}: {len(missing)} documents without user_id")
+                continue
+            for target in explain_targets(db, name, command):
+                line = describe(name, target["statement"])
+                if line in seen:
+                    continue
+                seen.add(line)
+                if len(target["shards"]) == 1:
+                    print(f"ok   {line}")
+                else:
+                    failures += 1
+                    print(f"FAIL {line}: runs on {len(target['shards'])} shards {target['shards']}")
+        print(f"{len(recorder.commands)} commands recorded, {len(seen)} distinct statements explained, "
+              f"{failures} not targeted")
+        db.client.drop_database(args.database)
+    finally:
+        close_mongo_connection()
+        if cluster is not None:
+            cluster.stop()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Run duplicate and anomaly detection for every user.
+
+Users are split into chunks processed by a pool of worker processes, each
+with its own MongoDB connection. Results replace each user's document in
+the `expense_anomalies` collection.
+
+Usage:
+    python -m scripts.detect_anomalies [--workers 4] [--days 365] [--chunk-size 200]
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List
+
+from app.core.database import connect_to_mongo, close_mongo_connection, get_database
+from app.services.anomalies import detect
+
+
+def process_users(user_ids: List[str], days: int, window_days: int, z_threshold: float) -> int:
+    """Worker: detect and store results for a chunk of users"""
+    db = get_database()
+    start_date = datetime.utcnow() - timedelta(days=days)
+    flagged = 0
+    for user_id in user_ids:
+        result = detect(user_id, start_date, window_days, z_threshold)
+        db.expense_anomalies.replace_one(
+            {"user_id": user_id},
+            {"user_id": user_id, **result, "computed_at": datetime.utcnow()},
+            upsert=True
+        )
+        flagged += len(result["duplicates"]) + len(result["anomalies"])
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--window-days", type=int, default=3)
+    parser.add_argument("--z-threshold", type=float, default=3.0)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    user_ids = [str(user["_id"]) for user in get_database().users.find({}, {"_id": 1})]
+    close_mongo_connection()
+    chunks = [user_ids[i:i + args.chunk_size] for i in range(0, len(user_ids), args.chunk_size)]
+
+    # MongoClient must not be shared across fork, so each worker connects itself
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=connect_to_mongo) as pool:
+        futures = [
+            pool.submit(process_users, chunk, args.days, args.window_days, args.z_threshold)
+            for chunk in chunks
+        ]
+        flagged = sum(future.result() for future in futures)
+
+    print(f"Analysed {len(user_ids)} users, {flagged} duplicate groups and anomalies found")
+
+
+if __name__ == "__main__":
+    main()
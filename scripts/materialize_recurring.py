@@ -0,0 +1,42 @@
+"""
+Create the expenses of due recurring rules.
+
+Runs once and exits, catching up every occurrence missed since each rule
+last ran. Safe to run alongside API processes with RECURRING_SCHEDULER=embedded
+or other copies of itself: rules are leased, and occurrences are never
+created twice.
+
+Usage:
+    python -m scripts.materialize_recurring [--loop]
+"""
+import argparse
+import logging
+import signal
+
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.services.recurring import recurring_scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loop", action="store_true",
+                        help="Keep running every RECURRING_INTERVAL_SECONDS until interrupted")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    connect_to_mongo()
+    if args.loop:
+        def handle_signal(signum, frame):
+            recurring_scheduler.stop()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+        recurring_scheduler.run()
+    else:
+        created = recurring_scheduler.materialize_due()
+        print(f"Created {created} recurring expenses")
+    close_mongo_connection()
+
+
+if __name__ == "__main__":
+    main()
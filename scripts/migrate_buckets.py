@@ -0,0 +1,143 @@
+"""
+Move users' expenses between document and bucket storage.
+
+Moving to buckets first switches the user's storage mode, so new writes go
+to buckets, then moves existing expense documents into their monthly buckets
+in batches. Reads of bucket users merge both collections, so the user can
+keep using the API while the migration runs. Moving back to documents copies
+the buckets out first and switches the mode afterwards. In both directions a
+final sweep after one cache TTL picks up expenses written by workers that
+had not seen the new mode yet.
+
+Usage:
+    python -m scripts.migrate_buckets --user-id <id> [--user-id <id> ...]
+    python -m scripts.migrate_buckets --min-expenses 10000
+    python -m scripts.migrate_buckets --user-id <id> --to document
+"""
+import argparse
+import time
+from contextlib import ExitStack
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.core.database import check_money_migrated, connect_to_mongo, close_mongo_connection, get_database
+from app.models.expense import expense_service
+from app.models.expense_store import BUCKET, DOCUMENT, bucket_store, set_storage_mode
+from app.services.reports import invalidate_user_reports
+
+
+def heavy_users(min_expenses: int):
+    """Users with at least `min_expenses` expense documents"""
+    pipeline = [
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gte": min_expenses}}}
+    ]
+    return [result["_id"] for result in get_database().expenses.aggregate(pipeline, allowDiskUse=True)]
+
+
+def move_to_buckets(user_id: str, batch_size: int) -> int:
+    """Move a user's expense documents into buckets; safe to re-run after interruption"""
+    db = get_database()
+    moved = 0
+    while True:
+        batch = list(db.expenses.find({"user_id": user_id}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return moved
+
+        ids = [doc["_id"] for doc in batch]
+        # Skip documents already copied by an interrupted run
+        already_moved = {
+            result["_id"] for result in db.expense_buckets.aggregate([
+                {"$match": {"user_id": user_id, "expenses._id": {"$in": ids}}},
+                {"$unwind": "$expenses"},
+                {"$match": {"expenses._id": {"$in": ids}}},
+                {"$project": {"_id": "$expenses._id"}}
+            ])
+        }
+
+        # A null base_amount marks an expense written without rates; keep it
+        expenses = [
+            {key: value for key, value in doc.items() if key != "user_id" and (value is not None or key == "base_amount")}
+            for doc in batch if doc["_id"] not in already_moved
+        ]
+        missing_seq = [expense for expense in expenses if expense.get("seq") is None]
+        with ExitStack() as seq_range:
+            if missing_seq:
+                last = seq_range.enter_context(expense_service._seq_range(user_id, len(missing_seq)))
+                for offset, expense in enumerate(missing_seq):
+                    expense["seq"] = last - len(missing_seq) + 1 + offset
+            if expenses:
+                bucket_store.insert_many(user_id, expenses)
+        db.expenses.delete_many({"_id": {"$in": ids}, "user_id": user_id})
+        moved += len(batch)
+        print(f"  {user_id}: {moved} expenses moved to buckets")
+
+
+def move_to_documents(user_id: str) -> int:
+    """Move a user's bucketed expenses back to one document per expense"""
+    db = get_database()
+    moved = 0
+    for bucket in db.expense_buckets.find({"user_id": user_id}):
+        documents = [{**expense, "user_id": user_id} for expense in bucket.get("expenses", [])]
+        if documents:
+            try:
+                db.expenses.insert_many(documents, ordered=False)
+            except BulkWriteError as exc:
+                # Duplicate keys are documents inserted by an interrupted run
+                if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+                    raise
+        db.expense_buckets.delete_one({"_id": bucket["_id"]})
+        moved += len(documents)
+        print(f"  {user_id}: {moved} expenses moved to documents")
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", action="append", default=[])
+    parser.add_argument("--min-expenses", type=int,
+                        help="Migrate every user with at least this many expense documents")
+    parser.add_argument("--to", choices=[BUCKET, DOCUMENT], default=BUCKET)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-wait", action="store_true",
+                        help="Skip the final sweep after the user cache TTL")
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    # Buckets are only read with integer amounts in mind
+    check_money_migrated()
+    user_ids = list(args.user_id)
+    if args.min_expenses:
+        user_ids += heavy_users(args.min_expenses)
+    user_ids = [user_id for user_id in user_ids if ObjectId.is_valid(user_id)]
+    if not user_ids:
+        parser.error("no users to migrate")
+
+    def move(user_id: str) -> None:
+        if args.to == BUCKET:
+            move_to_buckets(user_id, args.batch_size)
+        else:
+            move_to_documents(user_id)
+        invalidate_user_reports(user_id)
+
+    for user_id in user_ids:
+        if args.to == BUCKET:
+            set_storage_mode(user_id, BUCKET)
+            move(user_id)
+        else:
+            move(user_id)
+            set_storage_mode(user_id, DOCUMENT)
+
+    if not args.no_wait:
+        print(f"Waiting {settings.USER_CACHE_TTL}s for workers to pick up the new storage mode...")
+        time.sleep(settings.USER_CACHE_TTL)
+        for user_id in user_ids:
+            move(user_id)
+
+    print(f"Migrated {len(user_ids)} users to {args.to} storage")
+    close_mongo_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Migrate stored expenses to the compact money schema.
+
+- `amount` doubles in major units become integer minor units (12.34 -> 1234)
+  with an explicit `currency` field, in live and archived expenses
+- null `updated_at` fields are removed
+- daily rollups (which hold summed amounts) are rebuilt
+
+Documents are rewritten in batches by _id, so the migration can be stopped
+and re-run at any time. Collection statistics are printed before and after
+to measure the storage and cache footprint reduction. Once no amount in
+major units is left, the migration is recorded; the API and the change
+stream worker refuse to start until then.
+
+Usage:
+    python -m scripts.migrate_money [--batch-size 1000] [--currency USD] [--compact]
+"""
+import argparse
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.database import (
+    AMOUNT_COLLECTIONS, check_money_migrated, connect_to_mongo, close_mongo_connection, get_database
+)
+from app.services.rollups import rebuild_user_rollups
+from app.utils.money import to_minor
+
+
+def collection_stats(name: str) -> dict:
+    """Size statistics relevant to the working set of a collection"""
+    stats = get_database().command("collStats", name)
+    cache = stats.get("wiredTiger", {}).get("cache", {})
+    return {
+        "count": stats.get("count", 0),
+        "avg_obj_size": stats.get("avgObjSize", 0),
+        "data_size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+        "cache_bytes": cache.get("bytes currently in the cache", 0)
+    }
+
+
+def print_stats(before: dict, after: dict) -> None:
+    print(f"{'metric':<14}{'before':>16}{'after':>16}{'change':>10}")
+    for metric, old in before.items():
+        new = after[metric]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        print(f"{metric:<14}{old:>16,}{new:>16,}{change:>10}")
+
+
+def migrate_amounts(name: str, batch_size: int, currency: str) -> int:
+    """Convert double amounts to integer minor units, one _id-ordered batch at a time"""
+    expenses = get_database()[name]
+    migrated = 0
+    last_id = None
+    while True:
+        query = {"amount": {"$type": "double"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(
+            expenses.find(query, {"amount": 1, "currency": 1}).sort("_id", 1).limit(batch_size)
+        )
+        if not batch:
+            return migrated
+
+        operations = []
+        for doc in batch:
+            doc_currency = doc.get("currency") or currency
+            operations.append(UpdateOne(
+                # Matching on the old amount skips documents changed concurrently
+                {"_id": doc["_id"], "amount": doc["amount"]},
+                {"$set": {"amount": to_minor(doc["amount"], doc_currency), "currency": doc_currency}}
+            ))
+        migrated += expenses.bulk_write(operations, ordered=False).modified_count
+        last_id = batch[-1]["_id"]
+        print(f"  {name} amounts migrated: {migrated}")
+
+
+def remove_null_fields(batch_size: int) -> int:
+    """Drop `updated_at: null` from documents that were never updated"""
+    expenses = get_database().expenses
+    cleaned = 0
+    while True:
+        ids = [
+            doc["_id"]
+            for doc in expenses.find({"updated_at": {"$type": "null"}}, {"_id": 1}).limit(batch_size)
+        ]
+        if not ids:
+            return cleaned
+        cleaned += expenses.update_many(
+            {"_id": {"$in": ids}, "updated_at": {"$type": "null"}},
+            {"$unset": {"updated_at": ""}}
+        ).modified_count
+        print(f"  null fields removed: {cleaned}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--currency", default=settings.DEFAULT_CURRENCY,
+                        help="Currency of existing amounts without a currency field")
+    parser.add_argument("--compact", action="store_true",
+                        help="Run compact afterwards so freed space is returned to the storage engine")
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    db = get_database()
+    before = collection_stats("expenses")
+
+    print("Migrating amounts to integer minor units...")
+    migrated = sum(migrate_amounts(name, args.batch_size, args.currency) for name in AMOUNT_COLLECTIONS)
+    print("Removing null fields...")
+    cleaned = remove_null_fields(args.batch_size)
+
+    print("Rebuilding daily rollups...")
+    for user_id in db.expense_daily_rollups.distinct("user_id"):
+        rebuild_user_rollups(user_id)
+
+    if args.compact:
+        print("Compacting expenses collection...")
+        db.command("compact", "expenses")
+
+    # Raises if a write in major units slipped in meanwhile; re-run to finish
+    check_money_migrated()
+
+    after = collection_stats("expenses")
+    print(f"\nMigrated {migrated} amounts, removed {cleaned} null fields\n")
+    print_stats(before, after)
+    close_mongo_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Generate monthly statements for every user.
+
+Users are split into user-id ranges of similar size, and each range is
+processed by a worker process with a single aggregation that groups the
+month's expenses by (user_id, category). Document-stored expenses, bucket
+totals and frozen archive summaries are merged into the same $group, so
+every storage layout is covered without per-user queries. Results stream
+back sorted by user and are upserted into `monthly_statements` in batches.
+
+Usage:
+    python -m scripts.monthly_statements [--year 2024 --month 5] [--workers 8] [--partitions 32]
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.database import connect_to_mongo, close_mongo_connection, get_database
+
+
+def month_bounds(year: int, month: int) -> Tuple[datetime, datetime]:
+    start = datetime(year, month, 1)
+    return start, datetime(year + month // 12, month % 12 + 1, 1)
+
+
+def user_ranges(partitions: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Split the user-id space into ranges holding roughly equal numbers of users"""
+    buckets = list(get_database().users.aggregate([
+        {"$bucketAuto": {"groupBy": "$_id", "buckets": partitions}}
+    ]))
+    starts = [str(bucket["_id"]["min"]) for bucket in buckets]
+    if not starts:
+        return []
+    # The first range is open below and the last open above, so no user falls outside
+    return [(None if i == 0 else start, starts[i + 1] if i + 1 < len(starts) else None)
+            for i, start in enumerate(starts)]
+
+
+def statement_pipeline(start: datetime, end: datetime, id_range: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Per-(user, category) totals of one month for users in a range, sorted by user"""
+    user_match = {"user_id": id_range} if id_range else {}
+    category_totals = [
+        {"$project": {"user_id": 1, "categories": {"$objectToArray": "$categories"}}},
+        {"$unwind": "$categories"},
+        {"$project": {
+            "user_id": 1,
+            "category": "$categories.k",
+            "total": "$categories.v.total",
+            "count": "$categories.v.count"
+        }}
+    ]
+    return [
+        {"$match": {**user_match, "date": {"$gte": start, "$lt": end}}},
+        {"$project": {"user_id": 1, "category": 1, "total": "$amount", "count": {"$literal": 1}}},
+        {"$unionWith": {"coll": "expense_buckets", "pipeline": [
+            {"$match": {**user_match, "month": start}}, *category_totals
+        ]}},
+        {"$unionWith": {"coll": "expense_monthly_summaries", "pipeline": [
+            {"$match": {**user_match, "month": start}}, *category_totals
+        ]}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "category": "$category"},
+            "total": {"$sum": "$total"},
+            "count": {"$sum": "$count"}
+        }},
+        {"$sort": {"_id.user_id": 1}}
+    ]
+
+
+def generate_range(year: int, month: int, low: Optional[str], high: Optional[str], batch_size: int) -> int:
+    """Worker: build and store the statements of users in [low, high)"""
+    db = get_database()
+    start, end = month_bounds(year, month)
+    id_range = {}
+    if low is not None:
+        id_range["$gte"] = low
+    if high is not None:
+        id_range["$lt"] = high
+
+    now = datetime.utcnow()
+    days = (end - start).days
+    operations = []
+    written = 0
+
+    def flush_user(user_id: str, categories: Dict[str, Dict[str, int]]) -> None:
+        total = sum(category["total"] for category in categories.values())
+        operations.append(UpdateOne(
+            {"user_id": user_id, "year": year, "month": month},
+            {"$set": {
+                "total_amount": total,
+                "currency": settings.DEFAULT_CURRENCY,
+                "expenses_count": sum(category["count"] for category in categories.values()),
+                "categories": categories,
+                "daily_average": total / days,
+                "generated_at": now
+            }},
+            upsert=True
+        ))
+
+    current_user = None
+    categories: Dict[str, Dict[str, int]] = {}
+    cursor = db.expenses.aggregate(statement_pipeline(start, end, id_range), allowDiskUse=True, batchSize=batch_size)
+    for row in cursor:
+        user_id = row["_id"]["user_id"]
+        if user_id != current_user:
+            if current_user is not None:
+                flush_user(current_user, categories)
+            current_user, categories = user_id, {}
+        if row["count"]:
+            categories[row["_id"]["category"]] = {"total": row["total"], "count": row["count"]}
+        if len(operations) >= batch_size:
+            db.monthly_statements.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations.clear()
+    if current_user is not None:
+        flush_user(current_user, categories)
+    if operations:
+        db.monthly_statements.bulk_write(operations, ordered=False)
+        written += len(operations)
+    return written
+
+
+def main():
+    today = datetime.utcnow()
+    last_month = datetime(today.year, today.month, 1) - timedelta(days=1)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=last_month.year)
+    parser.add_argument("--month", type=int, default=last_month.month, choices=range(1, 13))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--partitions", type=int, help="User-id ranges (default: 4 per worker)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    ranges = user_ranges(args.partitions or args.workers * 4)
+    close_mongo_connection()
+    print(f"Generating statements for {args.year}-{args.month:02d} over {len(ranges)} user ranges")
+
+    # MongoClient must not be shared across fork, so each worker connects itself
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=connect_to_mongo) as pool:
+        futures = [
+            pool.submit(generate_range, args.year, args.month, low, high, args.batch_size)
+            for low, high in ranges
+        ]
+        for future in as_completed(futures):
+            written += future.result()
+            print(f"  {written} statements written")
+
+    print(f"Wrote {written} statements")
+
+
+if __name__ == "__main__":
+    main()
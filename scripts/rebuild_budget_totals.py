@@ -0,0 +1,105 @@
+"""
+Rebuild the per-(user, category, month) spending totals used by budgets.
+
+Totals are maintained incrementally on every expense write; run this once
+after deploying budgets to cover expenses written before, or to repair
+totals. Expenses written while a user is being rebuilt may be counted
+twice or not at all, so prefer a quiet period. Alerts already sent are kept.
+
+Totals are in each user's base currency. Foreign expenses count with the
+base amount stored when they were written, as budgets counted them.
+
+Usage:
+    python -m scripts.rebuild_budget_totals [--user-id <id> ...]
+"""
+import argparse
+from collections import defaultdict
+from itertools import islice
+from typing import Any, Dict, List
+from pymongo import UpdateOne
+
+from app.core.database import connect_to_mongo, close_mongo_connection, get_database
+from app.models.expense_store import aggregate_expenses, month_start
+from app.services.fx import get_user_currency, to_base
+
+# Expenses of a multi-currency user converted at a time
+CONVERT_BATCH_SIZE = 10000
+
+
+def converted_totals(user_id: str) -> List[Dict[str, Any]]:
+    """Monthly category totals of a multi-currency user, each expense converted as budgets saw it"""
+    expenses = aggregate_expenses([
+        {"$match": {"user_id": user_id}},
+        {"$project": {"amount": 1, "currency": 1, "base_amount": 1, "category": 1, "date": 1}}
+    ])
+    totals: Dict[Any, Dict[str, int]] = defaultdict(lambda: {"total": 0, "count": 0})
+    while True:
+        batch = list(islice(expenses, CONVERT_BATCH_SIZE))
+        if not batch:
+            break
+        for expense in to_base(user_id, batch):
+            total = totals[(expense["category"], month_start(expense["date"]))]
+            total["total"] += expense["amount"]
+            total["count"] += 1
+    return [
+        {"_id": {"category": category, "month": month}, **total}
+        for (category, month), total in totals.items()
+    ]
+
+
+def rebuild_user_totals(user_id: str) -> int:
+    """Recompute every monthly category total of one user"""
+    db = get_database()
+    if get_user_currency(user_id)["foreign"]:
+        results = converted_totals(user_id)
+    else:
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": {
+                    "category": "$category",
+                    "month": {"$dateTrunc": {"date": "$date", "unit": "month"}}
+                },
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        results = list(aggregate_expenses(pipeline))
+    if results:
+        db.budget_totals.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "category": result["_id"]["category"], "month": result["_id"]["month"]},
+                {"$set": {"total": result["total"], "count": result["count"]}},
+                upsert=True
+            )
+            for result in results
+        ], ordered=False)
+
+    # Months and categories without expenses any more
+    kept = [
+        {"category": result["_id"]["category"], "month": result["_id"]["month"]}
+        for result in results
+    ]
+    stale = {"user_id": user_id}
+    if kept:
+        stale["$nor"] = kept
+    db.budget_totals.delete_many(stale)
+    return len(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", action="append", default=[])
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    user_ids = args.user_id or [str(user["_id"]) for user in get_database().users.find({}, {"_id": 1})]
+    for user_id in user_ids:
+        months = rebuild_user_totals(user_id)
+        print(f"  {user_id}: {months} monthly category totals")
+    print(f"Rebuilt budget totals for {len(user_ids)} users")
+    close_mongo_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Shard the expense collections on user_id.
+
+Run once against a mongos. Missing collections and indexes are created
+first. Collections that are already sharded are left alone, so the script
+is safe to re-run.
+
+Strategies (see app/core/sharding.py):
+- hashed (default): {user_id: "hashed"}. Empty collections are pre-split,
+  so users spread over every shard from the first write.
+- ranged: {user_id: 1}. Suits zone sharding, e.g. pinning users to a region.
+
+MongoDB only allows unique indexes on a sharded collection when they start
+with the shard key. So the old unique index on occurrence_key alone is
+dropped; ensure_indexes creates its (user_id, occurrence_key) replacement.
+
+Usage:
+    python -m scripts.setup_sharding [--strategy hashed|ranged]
+"""
+import argparse
+from typing import List, Tuple
+
+from app.core.config import settings
+from app.core.database import connect_to_mongo, close_mongo_connection, get_database
+from app.core.sharding import SHARD_KEY, SHARD_KEYS, SHARDED_COLLECTIONS
+
+# Unique indexes from before sharding that do not start with the shard key
+LEGACY_INDEXES = {"expenses": ["occurrence_key_1"]}
+
+
+def shard_collections(db, strategy: str = "hashed") -> List[Tuple[str, str]]:
+    """Shard every collection in SHARDED_COLLECTIONS; returns (collection, outcome) pairs"""
+    admin = db.client.admin
+    admin.command("enableSharding", db.name)
+    namespaces = [f"{db.name}.{name}" for name in SHARDED_COLLECTIONS]
+    sharded = {
+        collection["_id"]
+        for collection in db.client.config.collections.find({"_id": {"$in": namespaces}, "dropped": {"$ne": True}})
+    }
+
+    key = SHARD_KEYS[strategy]
+    outcomes = []
+    for name in SHARDED_COLLECTIONS:
+        namespace = f"{db.name}.{name}"
+        if namespace in sharded:
+            outcomes.append((name, "already sharded"))
+            continue
+        indexes = db[name].index_information()
+        for index in LEGACY_INDEXES.get(name, []):
+            if index in indexes:
+                db[name].drop_index(index)
+        if key[SHARD_KEY] == "hashed":
+            # Ranged keys use the existing (user_id, ...) indexes
+            db[name].create_index([(SHARD_KEY, "hashed")])
+        admin.command("shardCollection", namespace, key=key)
+        outcomes.append((name, f"sharded on {key}"))
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategy", choices=sorted(SHARD_KEYS), default="hashed")
+    args = parser.parse_args()
+
+    connect_to_mongo()
+    try:
+        print(f"Sharding {settings.DATABASE_NAME} ({args.strategy})")
+        for name, outcome in shard_collections(get_database(), args.strategy):
+            print(f"  {name}: {outcome}")
+    finally:
+        close_mongo_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Download the ECB's historical euro reference rates into FX_RATES_FILE.
+
+The file is replaced atomically, so running servers never read a partial
+file; they pick up the new rates within a minute. Run it daily, after the
+ECB publishes the day's rates (around 16:00 CET).
+
+Usage:
+    python -m scripts.update_fx_rates [--url URL] [--output PATH]
+"""
+import argparse
+import io
+import os
+import tempfile
+import urllib.request
+import zipfile
+
+from app.core.config import settings
+from app.services.fx import FxTable
+
+ECB_HISTORY_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist.zip"
+
+
+def download(url: str) -> bytes:
+    """The rates CSV, unzipped if the URL serves a zip archive"""
+    with urllib.request.urlopen(url, timeout=60) as response:
+        data = response.read()
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            name = next(name for name in archive.namelist() if name.endswith(".csv"))
+            data = archive.read(name)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=ECB_HISTORY_URL)
+    parser.add_argument("--output", default=settings.FX_RATES_FILE)
+    args = parser.parse_args()
+
+    data = download(args.url)
+    directory = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        # Refuse to replace good rates with a file that does not parse
+        table = FxTable.from_csv(path, settings.FX_REFERENCE_CURRENCY)
+        os.replace(path, args.output)
+    except BaseException:
+        os.unlink(path)
+        raise
+    last = table.start + len(table.rates) - 1
+    print(f"Wrote rates for {len(table.currencies)} currencies, {table.start} to {last}, to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
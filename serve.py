@@ -0,0 +1,26 @@
+"""
+Run the API with uvicorn's own process manager and the production options.
+
+Use this where gunicorn is not wanted; it starts WEB_CONCURRENCY workers
+(default: one per available CPU, or one with in-memory backends), each
+importing the app in a fresh process:
+    python serve.py
+"""
+import uvicorn
+
+from app.core.config import settings
+from app.core.server import uvicorn_options, worker_count
+
+
+def main():
+    uvicorn.run(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=worker_count(),
+        **uvicorn_options()
+    )
+
+
+if __name__ == "__main__":
+    main()
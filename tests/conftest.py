@@ -0,0 +1,192 @@
+"""
+Test fixtures: every test runs against a fresh in-memory mongomock database.
+
+mongomock lacks a few features the app relies on; they are filled in here,
+only as far as the app uses them. Tests needing behaviour mongomock cannot
+emulate (change streams, transactions, sharding) belong in the scripts that
+run against a real cluster, such as scripts/check_shard_targeting.py.
+"""
+import asyncio
+import copy
+import datetime
+import itertools
+
+import mongomock
+import mongomock.aggregate
+import mongomock.collection
+import mongomock.database
+import mongomock.filtering
+import pytest
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.core import cache, database
+from app.core.config import settings
+from app.schemas.expense import ExpenseCreate
+
+
+class BulkWriteResult:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def bulk_write(self, requests, ordered=True, **kwargs):
+    """mongomock's bulk_write does not understand current pymongo operation classes"""
+    counts = {"inserted": 0, "matched": 0, "modified": 0, "deleted": 0}
+    upserted = {}
+    errors = []
+    for index, request in enumerate(requests):
+        try:
+            if isinstance(request, InsertOne):
+                self.insert_one(request._doc)
+                counts["inserted"] += 1
+            elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                if isinstance(request, ReplaceOne):
+                    result = self.replace_one(request._filter, request._doc, upsert=request._upsert)
+                else:
+                    update = self.update_one if isinstance(request, UpdateOne) else self.update_many
+                    result = update(request._filter, request._doc, upsert=request._upsert)
+                counts["matched"] += result.matched_count
+                counts["modified"] += result.modified_count
+                if result.upserted_id is not None:
+                    upserted[index] = result.upserted_id
+            elif isinstance(request, DeleteOne):
+                counts["deleted"] += self.delete_one(request._filter).deleted_count
+            elif isinstance(request, DeleteMany):
+                counts["deleted"] += self.delete_many(request._filter).deleted_count
+        except DuplicateKeyError as exc:
+            errors.append({"index": index, "code": 11000, "errmsg": str(exc)})
+            if ordered:
+                break
+    if errors:
+        raise BulkWriteError({"writeErrors": errors, "nInserted": counts["inserted"]})
+    return BulkWriteResult(
+        inserted_count=counts["inserted"], matched_count=counts["matched"],
+        modified_count=counts["modified"], deleted_count=counts["deleted"],
+        upserted_count=len(upserted), upserted_ids=upserted, acknowledged=True
+    )
+
+
+def union_with(in_collection, db, options):
+    other = db[options["coll"]]
+    return list(in_collection) + list(other.aggregate(options.get("pipeline", [])))
+
+
+_all_op = mongomock.filtering._Filterer._all_op
+
+
+def all_op(self, doc_val, search_val):
+    """Regexes inside $all (prefix search)"""
+    if not any(hasattr(value, "pattern") for value in search_val):
+        return _all_op(self, doc_val, search_val)
+    if isinstance(doc_val, list) and doc_val and isinstance(doc_val[0], list):
+        doc_val = list(itertools.chain.from_iterable(doc_val))
+    words = [value for value in mongomock.filtering._force_list(doc_val) if isinstance(value, str)]
+    return all(
+        any(pattern.search(word) for word in words) if hasattr(pattern, "pattern") else pattern in words
+        for pattern in search_val
+    )
+
+
+_parse_basic_expression = mongomock.aggregate._Parser._parse_basic_expression
+
+
+def parse_basic_expression(self, expression):
+    """Expressions inside array literals"""
+    if isinstance(expression, list):
+        return [self.parse(item) for item in expression]
+    return _parse_basic_expression(self, expression)
+
+
+_handle_date_operator = mongomock.aggregate._Parser._handle_date_operator
+
+
+def handle_date_operator(self, operator, values):
+    """$dateTrunc, by day and month"""
+    if operator != "$dateTrunc":
+        return _handle_date_operator(self, operator, values)
+    value = self.parse(values["date"])
+    if values["unit"] == "month":
+        return datetime.datetime(value.year, value.month, 1)
+    return datetime.datetime(value.year, value.month, value.day)
+
+
+_create_collection = mongomock.database.Database.create_collection
+
+
+def create_collection(self, name, **options):
+    """Storage engine options have no in-memory equivalent"""
+    options.pop("storageEngine", None)
+    return _create_collection(self, name, **options)
+
+
+mongomock.collection.Collection.bulk_write = bulk_write
+mongomock.database.Database.create_collection = create_collection
+mongomock.aggregate._PIPELINE_HANDLERS["$unionWith"] = union_with
+mongomock.filtering._Filterer._all_op = all_op
+mongomock.filtering.filter_applies = mongomock.filtering._Filterer().apply
+mongomock.aggregate._Parser._parse_basic_expression = parse_basic_expression
+mongomock.aggregate.date_operators.append("$dateTrunc")
+mongomock.aggregate._Parser._handle_date_operator = handle_date_operator
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    """A fresh database with the app's indexes, and fresh process-wide caches"""
+    from app.models.expense_store import BucketStore
+
+    # pymongo decodes a fresh document for every read; mongomock can hand
+    # out live references for $elemMatch projections
+    find = BucketStore.find
+    monkeypatch.setattr(BucketStore, "find", lambda self, *args: copy.deepcopy(find(self, *args)))
+
+    monkeypatch.setattr(database, "client", mongomock.MongoClient())
+    monkeypatch.setattr(database, "database", database.client[settings.DATABASE_NAME])
+    database.ensure_indexes()
+    yield database.database
+    cache.close_cache()
+
+
+@pytest.fixture
+def make_user(db):
+    """Create users directly in the database; returns their id"""
+    def make(storage=None, **fields):
+        user_id = ObjectId()
+        user = {"_id": user_id, "email": f"{user_id}@example.com", "full_name": "Test", "is_active": True}
+        if storage is not None:
+            user["expense_storage"] = storage
+        db.users.insert_one({**user, **fields})
+        return str(user_id)
+    return make
+
+
+@pytest.fixture
+def add_expense():
+    """Create an expense through the expense service; returns it as the API does"""
+    from app.models.expense import expense_service
+
+    def add(user_id, amount=1, date=None, category="FOOD", description="coffee", **fields):
+        expense = ExpenseCreate(
+            amount=amount, category=category, description=description,
+            date=date or datetime.datetime.utcnow(), **fields
+        )
+        return asyncio.run(expense_service.create_expense(user_id, expense))
+    return add
+
+
+class InlineExecutor:
+    """Runs submitted jobs immediately, in the calling thread"""
+
+    def submit(self, function, *args):
+        function(*args)
+
+
+@pytest.fixture
+def export_manager(tmp_path, monkeypatch):
+    """The export manager, writing under a temporary directory and running jobs inline"""
+    from app.services.exports import export_manager
+
+    monkeypatch.setattr(settings, "EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_manager, "_executor", InlineExecutor())
+    return export_manager
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.models.expense import expense_service
+from app.models.expense_store import BUCKET, bucket_store
+from app.schemas.expense import ExpenseUpdate
+from app.services import archive
+
+OLD = datetime(2020, 3, 5)
+CUTOFF = datetime(2021, 1, 1)
+
+
+def archived(db):
+    return {doc["_id"]: doc["amount"] for doc in db.expenses_archive.find()}
+
+
+def test_old_expenses_move_to_the_archive_with_month_summaries(make_user, add_expense, db):
+    user_id = make_user()
+    bucket_user = make_user(storage=BUCKET)
+    old = add_expense(user_id, amount=2, date=OLD)
+    recent = add_expense(user_id, amount=3, date=datetime(2021, 2, 1))
+    old_bucketed = add_expense(bucket_user, amount=4, date=OLD)
+
+    result = archive.archive_expenses(CUTOFF)
+
+    assert result == {"documents": 1, "buckets": 1, "months_summarized": 2}
+    assert archived(db) == {ObjectId(old["id"]): 200, ObjectId(old_bucketed["id"]): 400}
+    assert [doc["_id"] for doc in db.expenses.find()] == [ObjectId(recent["id"])]
+    assert db.expense_buckets.count_documents({}) == 0
+    summary = db.expense_monthly_summaries.find_one({"user_id": user_id})
+    assert (summary["month"], summary["total"], summary["count"]) == (datetime(2020, 3, 1), 200, 1)
+
+
+def test_archived_expense_is_restored_when_edited(make_user, add_expense, db):
+    user_id = make_user()
+    expense = add_expense(user_id, amount=2, date=OLD)
+    archive.archive_expenses(CUTOFF)
+
+    asyncio.run(expense_service.update_expense(expense["id"], user_id, ExpenseUpdate(amount=5)))
+
+    assert archived(db) == {}
+    assert db.expenses.find_one({"_id": ObjectId(expense["id"])})["amount"] == 500
+    assert db.expense_monthly_summaries.count_documents({}) == 0
+
+
+def test_expenses_written_while_copied_are_not_lost(make_user, add_expense, db, monkeypatch):
+    user_id = make_user()
+    bucket_user = make_user(storage=BUCKET)
+    edited = add_expense(user_id, amount=1, date=OLD)
+    deleted = add_expense(user_id, amount=2, date=OLD)
+    untouched = add_expense(user_id, amount=3, date=OLD)
+    edited_bucketed = add_expense(bucket_user, amount=4, date=OLD)
+    untouched_bucketed = add_expense(bucket_user, amount=5, date=OLD)
+
+    write_archive = archive._write_archive
+    raced = set()
+
+    def racing_write(documents):
+        # Requests land between the copy into the archive and the delete
+        write_archive(documents)
+        owner = documents[0]["user_id"]
+        if owner in raced:
+            return
+        raced.add(owner)
+        if owner == user_id:
+            db.expenses.update_one({"_id": ObjectId(edited["id"])}, {"$set": {"amount": 100, "seq": 99}})
+            asyncio.run(expense_service.delete_expense(deleted["id"], user_id))
+        else:
+            bucket_store.update(bucket_user, ObjectId(edited_bucketed["id"]), {"amount": 400, "seq": 99})
+
+    monkeypatch.setattr(archive, "_write_archive", racing_write)
+    archive.archive_expenses(CUTOFF)
+
+    assert archived(db) == {
+        ObjectId(edited["id"]): 100,
+        ObjectId(untouched["id"]): 300,
+        ObjectId(edited_bucketed["id"]): 400,
+        ObjectId(untouched_bucketed["id"]): 500,
+    }
+    assert db.expenses.count_documents({}) == 0
+    assert db.expense_buckets.count_documents({}) == 0
+
+
+def test_copy_left_by_an_interrupted_run_is_replaced(make_user, add_expense, db):
+    user_id = make_user()
+    expense = add_expense(user_id, amount=2, date=OLD)
+    stale = db.expenses.find_one({"_id": ObjectId(expense["id"])})
+    db.expenses_archive.insert_one(stale)
+    db.expenses.update_one({"_id": stale["_id"]}, {"$set": {"amount": 700, "seq": stale["seq"] + 1}})
+
+    archive.archive_expenses(CUTOFF)
+
+    assert archived(db) == {stale["_id"]: 700}
+    assert db.expense_monthly_summaries.find_one({"user_id": user_id})["total"] == 700
+
+
+def test_months_are_summarized_as_their_batch_moves(make_user, add_expense, db, monkeypatch):
+    user_id = make_user()
+    add_expense(user_id, amount=2, date=OLD)
+    add_expense(user_id, amount=3, date=datetime(2020, 4, 5))
+    write_archive = archive._write_archive
+    batches = []
+
+    def crashing_write(documents):
+        batches.append(documents)
+        if len(batches) == 2:
+            raise RuntimeError("worker killed")
+        write_archive(documents)
+
+    monkeypatch.setattr(archive, "_write_archive", crashing_write)
+    with pytest.raises(RuntimeError):
+        archive.archive_expenses(CUTOFF, batch_size=1)
+
+    summaries = list(db.expense_monthly_summaries.find({"user_id": user_id}))
+    assert [(summary["month"], summary["total"]) for summary in summaries] == [(datetime(2020, 3, 1), 200)]
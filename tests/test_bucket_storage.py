@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.models.expense import expense_service
+from app.models.expense_store import BUCKET, bucket_store
+from app.schemas.expense import ExpenseType, ExpenseUpdate
+
+
+def buckets(db, user_id):
+    return list(db.expense_buckets.find({"user_id": user_id}).sort([("month", 1), ("_id", 1)]))
+
+
+def test_full_bucket_starts_a_new_one_for_the_month(make_user, add_expense, db, monkeypatch):
+    monkeypatch.setattr(settings, "BUCKET_MAX_EXPENSES", 2)
+    user_id = make_user(storage=BUCKET)
+    for day in (1, 2, 3):
+        add_expense(user_id, amount=day, date=datetime(2025, 5, day))
+
+    stored = buckets(db, user_id)
+
+    assert [bucket["count"] for bucket in stored] == [2, 1]
+    assert {bucket["month"] for bucket in stored} == {datetime(2025, 5, 1)}
+    assert sum(bucket["total"] for bucket in stored) == 600
+    assert db.expenses.count_documents({}) == 0
+
+
+def test_bucket_totals_follow_updates_and_deletes(make_user, add_expense, db):
+    user_id = make_user(storage=BUCKET)
+    kept = add_expense(user_id, amount=5, date=datetime(2025, 5, 3))
+    moved = add_expense(user_id, amount=7, date=datetime(2025, 5, 4), category="SHOPPING")
+
+    asyncio.run(expense_service.update_expense(kept["id"], user_id, ExpenseUpdate(amount=6)))
+    asyncio.run(expense_service.update_expense(moved["id"], user_id, ExpenseUpdate(date=datetime(2025, 6, 1))))
+    may, june = buckets(db, user_id)
+    assert (may["count"], may["total"], may["categories"]["FOOD"]["total"]) == (1, 600, 600)
+    assert may["categories"]["SHOPPING"] == {"total": 0, "count": 0}
+    assert (june["month"], june["count"], june["total"]) == (datetime(2025, 6, 1), 1, 700)
+
+    assert asyncio.run(expense_service.delete_expense(kept["id"], user_id))
+    summary = bucket_store.summary(user_id)
+    assert (summary["count"], summary["total"]) == (1, 700)
+    assert summary["categories"]["SHOPPING"] == {"total": 700, "count": 1}
+
+
+def test_stale_update_does_not_overwrite_a_newer_one(make_user, add_expense, db):
+    user_id = make_user(storage=BUCKET)
+    expense = add_expense(user_id, amount=5, date=datetime(2025, 5, 3))
+    bucket_id, current = bucket_store.find(user_id, ObjectId(expense["id"]))
+    asyncio.run(expense_service.update_expense(expense["id"], user_id, ExpenseUpdate(amount=9)))
+
+    # A write guarded by the seq read before the update matches nothing
+    result = db.expense_buckets.update_one(
+        bucket_store._guard(user_id, bucket_id, current), {"$set": {"expenses.$.amount": 1}}
+    )
+
+    assert result.modified_count == 0
+    assert bucket_store.find(user_id, ObjectId(expense["id"]))[1]["amount"] == 900
+
+
+def test_newest_first_listing_matches_a_full_sort(make_user, add_expense):
+    user_id = make_user(storage=BUCKET)
+    for index in range(24):
+        add_expense(
+            user_id, amount=index + 1, date=datetime(2024 + index // 12, index % 12 + 1, 10 + index % 5),
+            category="FOOD" if index % 3 else "SHOPPING"
+        )
+    everything = asyncio.run(expense_service.get_user_expenses(user_id, limit=1000))
+    assert len(everything) == 24
+
+    for skip, limit, category in [(0, 5, None), (7, 4, None), (0, 3, ExpenseType.SHOPPING), (5, 100, None)]:
+        page = asyncio.run(expense_service.get_user_expenses(user_id, skip=skip, limit=limit, category=category))
+        expected = [
+            expense for expense in everything if category is None or expense["category"] == category.value
+        ][skip:skip + limit]
+        assert [expense["id"] for expense in page] == [expense["id"] for expense in expected]
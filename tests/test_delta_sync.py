@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.models.expense import expense_service
+
+
+def changes(user_id, since=0):
+    return asyncio.run(expense_service.get_changes(user_id, since))
+
+
+def test_changes_return_writes_in_seq_order(make_user, add_expense):
+    user_id = make_user()
+    first = add_expense(user_id, amount=1)
+    second = add_expense(user_id, amount=2)
+
+    result = changes(user_id)
+
+    assert [expense["id"] for expense in result["changes"]] == [first["id"], second["id"]]
+    assert result["cursor"] == 2
+    assert changes(user_id, result["cursor"])["changes"] == []
+
+
+def test_changes_are_held_back_while_a_lower_seq_is_in_flight(make_user, add_expense):
+    user_id = make_user()
+    add_expense(user_id)
+    cursor = changes(user_id)["cursor"]
+
+    with expense_service._seq_range(user_id) as held:
+        # A later write commits while the held seq is still unwritten
+        add_expense(user_id)
+        blocked = changes(user_id, cursor)
+        assert blocked["changes"] == [] and blocked["cursor"] == cursor
+
+    released = changes(user_id, cursor)
+    assert held == 2
+    assert released["cursor"] == 3
+    assert len(released["changes"]) == 1
+
+
+def test_abandoned_seq_stops_holding_back(make_user, add_expense, db):
+    user_id = make_user()
+    expense_service._next_seq(user_id)
+    db.counters.update_one(
+        {"_id": f"expenses:{user_id}"},
+        {"$set": {"in_flight.0.at": datetime.utcnow() - timedelta(minutes=5)}}
+    )
+    add_expense(user_id)
+
+    assert changes(user_id)["cursor"] == 2
+
+
+def test_deleted_expenses_are_reported_after_their_writes(make_user, add_expense):
+    user_id = make_user()
+    kept = add_expense(user_id)
+    removed = add_expense(user_id)
+    asyncio.run(expense_service.delete_expense(removed["id"], user_id))
+
+    result = changes(user_id)
+
+    assert [expense["id"] for expense in result["changes"]] == [kept["id"]]
+    assert result["deleted"] == [removed["id"]]
+    assert result["cursor"] == 3
@@ -0,0 +1,72 @@
+import csv
+import gzip
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+
+
+class Crash(BaseException):
+    """A process dying mid-job: not caught as a job failure"""
+
+
+@pytest.fixture
+def manager(export_manager, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 2)
+    return export_manager
+
+
+def rows(path):
+    with gzip.open(path, "rt", newline="") as artifact:
+        return list(csv.reader(artifact))
+
+
+def test_export_is_written_in_chunks(manager, make_user, add_expense):
+    user_id = make_user()
+    for day in range(1, 6):
+        add_expense(user_id, amount=day, date=datetime(2025, 5, day))
+
+    job = manager.create_job(user_id, "csv")
+
+    assert (job["status"], job["parts"], job["rows_written"]) == ("completed", 3, 5)
+    written = rows(manager.artifact_path(job))
+    assert written[0] == ["Date", "Amount", "Category", "Description"]
+    assert [row[1] for row in written[1:]] == ["1.00", "2.00", "3.00", "4.00", "5.00"]
+
+
+def test_interrupted_export_resumes_from_its_last_chunk(manager, make_user, add_expense, db, monkeypatch):
+    user_id = make_user()
+    for day in range(1, 6):
+        add_expense(user_id, amount=day, date=datetime(2025, 5, day))
+
+    write_part = manager._write_part
+    written_parts = []
+    crashed = []
+
+    def crash_once_on_second_part(job, index, chunk):
+        if index == 1 and not crashed:
+            crashed.append(index)
+            raise Crash()
+        written_parts.append(index)
+        write_part(job, index, chunk)
+
+    monkeypatch.setattr(manager, "_write_part", crash_once_on_second_part)
+    with pytest.raises(Crash):
+        manager.create_job(user_id, "csv")
+    job = db.export_jobs.find_one()
+    assert (job["status"], job["parts"], job["rows_written"]) == ("running", 1, 2)
+
+    # A running job is only taken over once its lease has expired
+    manager.resume_pending()
+    assert db.export_jobs.find_one()["status"] == "running"
+    db.export_jobs.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"updated_at": datetime.utcnow() - timedelta(seconds=settings.EXPORT_LEASE_SECONDS + 1)}}
+    )
+    manager.resume_pending()
+
+    job = manager.get_job(str(job["_id"]), user_id)
+    assert (job["status"], job["rows_written"]) == ("completed", 5)
+    assert written_parts == [0, 1, 2]
+    assert [row[1] for row in rows(manager.artifact_path(job))[1:]] == ["1.00", "2.00", "3.00", "4.00", "5.00"]
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.idempotency import idempotency_service
+from app.utils.exceptions import ConflictException, UnprocessableEntityException
+
+USER = "user-1"
+KEY = "key-1"
+
+
+def claim(fingerprint="body"):
+    return asyncio.run(idempotency_service.claim(USER, KEY, fingerprint))
+
+
+def test_completed_request_returns_the_stored_response():
+    token, stored = claim()
+    assert token is not None and stored is None
+    asyncio.run(idempotency_service.complete(USER, KEY, token, {"id": "expense-1"}))
+
+    assert claim() == (None, {"id": "expense-1"})
+
+
+def test_reused_key_with_another_payload_is_rejected():
+    claim()
+
+    with pytest.raises(UnprocessableEntityException):
+        claim("other body")
+
+
+def test_request_in_progress_makes_repeats_wait_then_conflict(monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    claim()
+
+    with pytest.raises(ConflictException):
+        claim()
+
+
+def test_released_claim_can_be_retried():
+    token, _ = claim()
+    asyncio.run(idempotency_service.release(USER, KEY, token))
+
+    assert claim()[0] is not None
+
+
+def test_stale_lock_is_taken_over(db):
+    claim()
+    stale = datetime.utcnow() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS + 1)
+    db.idempotency_keys.update_one({"user_id": USER, "key": KEY}, {"$set": {"locked_at": stale}})
+
+    assert claim()[0] is not None
+    assert db.idempotency_keys.find_one({"user_id": USER, "key": KEY})["locked_at"] > stale
+
+
+def test_request_whose_claim_was_taken_over_cannot_complete_or_release_it(db):
+    first, _ = claim()
+    stale = datetime.utcnow() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS + 1)
+    db.idempotency_keys.update_one({"user_id": USER, "key": KEY}, {"$set": {"locked_at": stale}})
+    second, _ = claim()
+
+    asyncio.run(idempotency_service.release(USER, KEY, first))
+    asyncio.run(idempotency_service.complete(USER, KEY, first, {"id": "expense-1"}))
+    assert db.idempotency_keys.find_one({"user_id": USER, "key": KEY})["status"] == "in_progress"
+
+    asyncio.run(idempotency_service.complete(USER, KEY, second, {"id": "expense-2"}))
+    assert claim() == (None, {"id": "expense-2"})
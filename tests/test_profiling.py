@@ -0,0 +1,21 @@
+import sys
+
+from app.services.profiling import RequestProfile
+
+
+def user_endpoint(current_user):
+    return sys._getframe()
+
+
+def admin_endpoint(current_admin):
+    return sys._getframe()
+
+
+def test_endpoint_frames_match_whatever_names_the_user():
+    user = {"id": "admin-1"}
+    profile = RequestProfile({}, user, interval=0.01)
+
+    for endpoint in (user_endpoint, admin_endpoint):
+        assert profile._endpoint_matcher(endpoint.__code__)(endpoint(user))
+    # Another request of the same user holds its own copy
+    assert not profile._endpoint_matcher(admin_endpoint.__code__)(admin_endpoint(dict(user)))
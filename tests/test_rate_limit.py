@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app.core import database
+from app.core.config import settings
+from app.core.security import create_access_token, decode_access_token
+from app.middleware.rate_limit import MemoryRateLimitStore, RateLimitMiddleware, parse_rate, route_class
+
+
+@pytest.mark.parametrize("method, path, expected", [
+    ("POST", "/api/v1/auth/login", "auth"),
+    ("POST", "/api/v1/auth/token", "auth"),
+    ("POST", "/api/v1/auth/register", "auth"),
+    ("GET", "/api/v1/auth/me", "crud"),
+    ("GET", "/api/v1/expenses/", "crud"),
+    ("GET", "/api/v1/expenses/anomalies", "reports"),
+    ("GET", "/api/v1/reports/weekly", "reports"),
+    ("GET", "/api/v1/reports/export/csv", "export"),
+    ("POST", "/api/v1/reports/exports", "export"),
+    ("POST", "/api/v1/reports/exports/", "export"),
+    ("GET", "/api/v1/reports/exports/abc", "crud"),
+    ("GET", "/api/v1/reports/exports/abc/download", "crud"),
+    ("GET", "/health", None),
+])
+def test_route_class(method, path, expected):
+    assert route_class(path, method) == expected
+
+
+def test_bucket_refills_at_its_rate():
+    store = MemoryRateLimitStore()
+    capacity, rate = parse_rate("2/60")
+
+    assert store.take("client", capacity, rate) == 0
+    assert store.take("client", capacity, rate) == 0
+    assert store.take("client", capacity, rate) == pytest.approx(30, abs=0.1)
+    assert store.take("other", capacity, rate) == 0
+
+
+def request(path, headers=(), client="10.0.0.1", method="GET"):
+    return {"type": "http", "method": method, "path": path, "headers": list(headers), "client": (client, 1234)}
+
+
+def call(middleware, scope):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    return sent[0]["status"] if sent else 200
+
+
+async def ok(scope, receive, send):
+    pass
+
+
+def test_clients_are_keyed_by_token_user_or_ip():
+    middleware = RateLimitMiddleware(ok, store=MemoryRateLimitStore(), limits={"crud": "1/60", "auth": "1/60"})
+    token = create_access_token({"sub": "someone@example.com"})
+    authorized = [(b"authorization", f"Bearer {token}".encode())]
+
+    assert call(middleware, request("/api/v1/expenses/")) == 200
+    assert call(middleware, request("/api/v1/expenses/")) == 429
+    # The same IP with a token has a bucket of its own
+    assert call(middleware, request("/api/v1/expenses/", authorized)) == 200
+    assert call(middleware, request("/api/v1/expenses/", authorized, client="10.0.0.2")) == 429
+    # Login is keyed by IP even with a token
+    assert call(middleware, request("/api/v1/auth/login", authorized, client="10.0.0.3", method="POST")) == 200
+    assert call(middleware, request("/api/v1/auth/login", client="10.0.0.3", method="POST")) == 429
+
+
+def test_polling_an_export_job_does_not_spend_the_export_budget(make_user, export_manager):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    user_id = make_user()
+    email = database.get_database().users.find_one({"_id": ObjectId(user_id)})["email"]
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+    client = TestClient(app)
+    capacity, _ = parse_rate(settings.RATE_LIMIT_EXPORT)
+
+    job = client.post("/api/v1/reports/exports", json={"format": "csv"}, headers=headers)
+    assert job.status_code == 202
+    for _ in range(capacity + 3):
+        assert client.get(f"/api/v1/reports/exports/{job.json()['id']}", headers=headers).status_code == 200
+
+    # Starting jobs is still limited
+    statuses = [
+        client.post("/api/v1/reports/exports", json={"format": "csv"}, headers=headers).status_code
+        for _ in range(capacity)
+    ]
+    assert statuses == [202] * (capacity - 1) + [429]
+
+
+def test_token_is_decoded_once_per_request(make_user, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.middleware import auth, rate_limit
+    from main import app
+
+    decoded = []
+
+    def counting_decode(token):
+        decoded.append(token)
+        return decode_access_token(token)
+
+    monkeypatch.setattr(rate_limit, "decode_access_token", counting_decode)
+    monkeypatch.setattr(auth, "decode_access_token", counting_decode)
+    user_id = make_user()
+    token = create_access_token({"sub": f"{user_id}@example.com"})
+
+    response = TestClient(app).get("/api/v1/expenses/", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert decoded == [token]
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.models.expense_store import BUCKET, aggregate_expenses
+from app.models.recurring import recurring_rule_service
+from app.schemas.recurring import RecurringRuleCreate
+from app.services.recurring import recurring_scheduler
+
+START = datetime(2024, 1, 1, 9)
+NOW = datetime(2024, 1, 3, 12)
+
+
+def occurrences(user_id):
+    return sorted(
+        (doc["date"], doc["seq"])
+        for doc in aggregate_expenses([{"$match": {"user_id": user_id}}, {"$project": {"date": 1, "seq": 1}}])
+    )
+
+
+@pytest.mark.parametrize("storage", [None, BUCKET])
+def test_occurrences_are_written_once_with_seqs(make_user, db, storage):
+    user_id = make_user(storage=storage)
+    rule = RecurringRuleCreate(amount=4, category="FOOD", description="lunch", frequency="DAILY", start_date=START)
+    asyncio.run(recurring_rule_service.create_rule(user_id, rule))
+
+    assert recurring_scheduler.materialize_due(NOW) == 3
+    # A run that crashed before advancing the rule is repeated
+    db.recurring_rules.update_many({}, {"$set": {"next_run": START}})
+    assert recurring_scheduler.materialize_due(NOW) == 0
+
+    assert occurrences(user_id) == [(datetime(2024, 1, day, 9), day) for day in (1, 2, 3)]
+    assert db.recurring_rules.find_one()["next_run"] == datetime(2024, 1, 4, 9)
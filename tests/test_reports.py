@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+
+from app.services import fx
+from app.services.reports import get_daily_report
+
+DAY = datetime(2024, 1, 4, 12)
+
+
+def rates(gbp_per_eur):
+    return fx.FxTable(np.datetime64("2024-01-01", "D"), ["EUR", "USD", "GBP"], np.array([[1.0, 1.0, gbp_per_eur]]))
+
+
+def test_reports_use_the_base_amount_stored_at_write_time(make_user, add_expense, db, monkeypatch):
+    user_id = make_user()
+    monkeypatch.setattr(fx, "get_fx_table", lambda: rates(0.5))
+    add_expense(user_id, amount=3, date=DAY)
+    add_expense(user_id, amount=10, date=DAY, currency="GBP")
+    legacy = add_expense(user_id, amount=1, date=DAY, currency="GBP")
+    db.expenses.update_one({"_id": ObjectId(legacy["id"])}, {"$unset": {"base_amount": ""}})
+
+    # Rates are updated after the expenses were written
+    monkeypatch.setattr(fx, "get_fx_table", lambda: rates(0.25))
+    report = get_daily_report(user_id, DAY)
+
+    # 3 USD, 10 GBP at the rate of the write (20 USD), and 1 GBP from before
+    # base amounts were stored at today's rate (4 USD)
+    assert report["total_amount"] == 27
+    assert report["expenses_count"] == 3
+    assert report["unconverted"] == {}
@@ -0,0 +1,37 @@
+"""
+Background worker that maintains derived expense data from the MongoDB change stream.
+
+Run it alongside the API with CHANGE_STREAM_WORKER=external and
+CACHE_BACKEND=redis:
+    python worker.py
+
+Several can run at once; one consumes the stream and the others stand by.
+"""
+import logging
+import signal
+
+from app.core.cache import close_cache
+from app.core.database import check_money_migrated, connect_to_mongo, close_mongo_connection
+from app.services.change_stream import check_external_worker, expense_change_worker
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    check_external_worker()
+    connect_to_mongo()
+    check_money_migrated()
+
+    def handle_signal(signum, frame):
+        expense_change_worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    expense_change_worker.run()
+
+    close_mongo_connection()
+    close_cache()
+
+
+if __name__ == "__main__":
+    main()